@@ -0,0 +1,163 @@
+"""
+Local stand-ins for the upstream services, each on its own port in a background thread:
+
+* FakeYNAB: the YNAB v1 endpoints the YNAB tool calls, serving one synthetic budget (delta requests return no changes)
+* FakeFirecrawl: Firecrawl v1 `/search` and `/scrape` (POST) plus a SearXNG-style `/searxng/search` (GET)
+
+Every server counts requests and body bytes in and out so the runner can report bytes transferred per scenario.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import hashlib
+import json
+import re
+import threading
+import time
+
+from synthetic import web_page
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.thread = None
+        self.reset_stats()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "FakeServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def count(self, bytesIn: int, bytesOut: int):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += bytesIn
+            self.stats["bytes_out"] += bytesOut
+
+    def respond(self, method: str, path: str, query: dict, body: dict) -> tuple:
+        """
+        Returns (status, JSON-serializable payload or pre-encoded bytes).
+        """
+        raise NotImplementedError
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle_method(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        try:
+            status, payload = self.server.respond(method, parts.path, query, json.loads(raw) if raw else {})
+        except Exception as e:
+            status, payload = 500, {"error": {"id": "500", "name": "internal_error", "detail": str(e)}}
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count(len(raw), len(body))
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
+
+
+class FakeYNAB(FakeServer):
+    """
+    Serves `budget` (from `synthetic.ynab_budget`) under /v1/budgets/<any id>/...
+    """
+
+    ROUTE = re.compile(r"/v1/budgets/[^/]+/(?P<resource>[a-z_]+)(?:/(?P<id>[^/]+))?(?P<tx>/transactions)?$")
+    SCOPE_FIELDS = {"accounts": "account_id", "categories": "category_id", "payees": "payee_id", "months": None}
+
+    def __init__(self, budget: dict, latency: float = 0.0):
+        super().__init__(latency)
+        self.budget = budget
+        self.encoded = {}
+
+    def respond(self, method, path, query, body):
+        match = self.ROUTE.match(path)
+        if not match or method != "GET":
+            return 404, {"error": {"id": "404.2", "name": "resource_not_found", "detail": path}}
+        key = (path, tuple(sorted(query.items())))
+        if key not in self.encoded:
+            # Responses are deterministic, so encode each distinct request once
+            data = self.data(match.group("resource"), match.group("id"), bool(match.group("tx")), query)
+            self.encoded[key] = json.dumps({"data": data}).encode("utf-8")
+        return 200, self.encoded[key]
+
+    def data(self, resource: str, itemId: str, transactions: bool, query: dict) -> dict:
+        knowledge = self.budget["server_knowledge"]
+        # The synthetic budget never changes, so every delta request is empty
+        delta = "last_knowledge_of_server" in query
+        if resource in {"accounts", "category_groups", "categories", "payees"} and not transactions:
+            if resource == "categories":
+                return {"category_groups": [] if delta else self.budget["category_groups"], "server_knowledge": knowledge}
+            return {resource: [] if delta else self.budget[resource], "server_knowledge": knowledge}
+        rows = [] if delta else self.budget["transactions"]
+        if resource == "months":
+            rows = [tx for tx in rows if tx["date"][:7] == itemId[:7]]
+        elif resource != "transactions":
+            field = self.SCOPE_FIELDS[resource]
+            rows = [tx for tx in rows if tx[field] == itemId]
+        if query.get("since_date"):
+            rows = [tx for tx in rows if tx["date"] >= query["since_date"]]
+        return {"transactions": rows, "server_knowledge": knowledge}
+
+
+class FakeFirecrawl(FakeServer):
+    """
+    Pages are synthesized per URL (`page_size` bytes of Markdown) and search results are derived from the query,
+    so the same query always returns the same URLs.
+    """
+
+    def __init__(self, page_size: int = 20000, latency: float = 0.0):
+        super().__init__(latency)
+        self.page_size = page_size
+
+    def hits(self, query: str, limit: int) -> list:
+        digest = hashlib.sha256(query.encode("utf-8")).hexdigest()[:10]
+        return [f"https://site{n}.example.com/{digest}/article-{n}" for n in range(limit)]
+
+    def respond(self, method, path, query, body):
+        if method == "GET" and path == "/searxng/search":
+            results = [
+                {"url": url, "title": web_page(url, 300)["title"], "content": "", "engine": "fake"}
+                for url in self.hits(query.get("q", ""), 10)
+            ]
+            return 200, {"query": query.get("q", ""), "results": results}
+        if method == "POST" and path == "/v1/search":
+            pages = [web_page(url, self.page_size) for url in self.hits(body.get("query", ""), int(body.get("limit", 5)))]
+            return 200, {"success": True, "data": pages}
+        if method == "POST" and path == "/v1/scrape":
+            page = web_page(body.get("url", ""), self.page_size)
+            return 200, {"success": True, "data": {"markdown": page["markdown"], "metadata": page["metadata"]}}
+        return 404, {"success": False, "error": f"Unknown endpoint {method} {path}"}
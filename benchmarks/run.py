@@ -0,0 +1,366 @@
+"""
+Benchmarks the tools' `Tools._run` end to end against local fake upstreams.
+
+The parent process generates the synthetic data, starts the fake servers and runs every (tool, concurrency)
+scenario in a fresh worker process, so each scenario starts cold and reports its own peak RSS.
+`generate_chat_completion` is replaced with a stub that answers after `--llm-latency-ms`.
+
+    python benchmarks/run.py --tools ynab,actual,firecrawl --concurrency 1,8,32 --requests 64
+    python benchmarks/run.py --tools ynab --valve LOCAL_MIRROR=false --jsonl bench.jsonl
+
+See benchmarks/README.md for the reported columns.
+"""
+
+from datetime import date, datetime, timedelta
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+TOOLS = {
+    "ynab": os.path.join(REPO_DIR, "finance_api_requests", "ynab_api_request.py"),
+    "actual": os.path.join(REPO_DIR, "finance_api_requests", "actual_api_request.py"),
+    "firecrawl": os.path.join(REPO_DIR, "firecrawl_search_and_scrape", "firecrawl_search_and_scrape.py"),
+}
+FINANCE_QUERIES = [
+    "What's my balance?",
+    "How much did I spend on groceries last month?",
+    "Show my transactions from last week",
+    "What did I spend at Costco this year?",
+    "Spending by category in the last 3 months",
+    "Which purchases did I make recently?",
+    "How has my net worth changed over the past month?",
+]
+SEARCH_QUERIES = [
+    "latest python release notes",
+    "how does http/2 multiplexing work",
+    "best budget travel destinations 2026",
+    "sqlite write ahead log performance",
+    "climate report summary this year",
+    "sourdough starter troubleshooting",
+    "compare electric car ranges",
+    "what is retrieval augmented generation",
+]
+BENCH_TOKEN = "benchmark-token"
+STUB_LLM_LATENCY = 0.0
+
+
+# --- Worker ----------------------------------------------------------------------------------------
+
+
+async def stub_generate_chat_completion(request=None, form_data=None, user=None, **kwargs):
+    """
+    Answers like a fast, obedient model: a route list for the finance tools, the prompt itself as the search query.
+    """
+    await asyncio.sleep(STUB_LLM_LATENCY)
+    prompt = form_data["messages"][-1]["content"]
+    if prompt.startswith("User's prompt: "):
+        content = prompt[len("User's prompt: "):]
+    else:
+        query = prompt.lower()
+        start = str(date.today() - timedelta(days=90))
+        if "balance" in query:
+            content = '["accounts"]'
+        elif "category" in query or "categories" in query:
+            content = f'["aggregate", "category", "{start}"]'
+        else:
+            content = f'["transactions", "{start}", "{date.today()}"]'
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def install_open_webui(cacheDir: str):
+    # Only the three names the tools import; a real Open WebUI install is used when present
+    try:
+        import open_webui.config  # noqa: F401
+        import open_webui.models.users  # noqa: F401
+        import open_webui.utils.chat  # noqa: F401
+        return
+    except ImportError:
+        pass
+    modules = {
+        name: types.ModuleType(name)
+        for name in ["open_webui", "open_webui.config", "open_webui.models", "open_webui.models.users", "open_webui.utils", "open_webui.utils.chat"]
+    }
+    modules["open_webui.config"].CACHE_DIR = cacheDir
+    modules["open_webui.models.users"].Users = types.SimpleNamespace(
+        get_user_by_id=lambda userId: types.SimpleNamespace(id=userId, role="user")
+    )
+    modules["open_webui.utils.chat"].generate_chat_completion = stub_generate_chat_completion
+    sys.modules.update(modules)
+
+
+def load_tool(name: str):
+    spec = importlib.util.spec_from_file_location(f"bench_{name}", TOOLS[name])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.generate_chat_completion = stub_generate_chat_completion
+    return module
+
+
+class LocalBudget:
+    """
+    Stands in for a connected `actual.Actual`: the Actual tool only uses `.session`, `.sync()` and `__exit__`.
+    Opens the synthetic budget file directly, so Actual server login/download time is not part of the numbers.
+    """
+
+    def __init__(self, path: str):
+        from sqlmodel import Session, create_engine
+
+        self.engine = create_engine(f"sqlite:///{path}")
+        self.session = Session(self.engine)
+
+    def sync(self):
+        return []
+
+    def __exit__(self, *args):
+        self.session.close()
+        self.engine.dispose()
+
+
+def configure(name: str, module, tools, config: dict):
+    cacheDir = config["cache_dir"]
+    if name == "ynab":
+        module.YNAB_API_BASE = f"{config['ynab_url']}/v1"
+        headers = {"Authorization": f"Bearer {BENCH_TOKEN}"}
+        # The fake server has no quota; keep the limiter from throttling long runs
+        module._RATE_LIMITERS[module.token_key(headers)] = module.YNABRateLimiter(capacity=10**9)
+        tools.valves.YNAB_BUDGET_ID = "benchmark-budget"
+        tools.valves.YNAB_ACCESS_TOKEN = BENCH_TOKEN
+        tools.valves.LOCAL_MIRROR_PATH = os.path.join(cacheDir, "ynab_mirror.sqlite3")
+    elif name == "actual":
+        budgetPath = config["actual_budget"]
+        module.open_actual = lambda base_url, password, encryption_password, file: LocalBudget(budgetPath)
+        tools.valves.PASSWORD = "benchmark"
+        tools.valves.FILE_BUDGET_NAME = "Benchmark Budget"
+    elif name == "firecrawl":
+        module.CACHE_DIR = cacheDir
+        tools.valves.FIRECRAWL_BASE_URL = f"{config['firecrawl_url']}/v1"
+        tools.valves.SEARXNG_BASE_URL = f"{config['firecrawl_url']}/searxng"
+    for key, value in config["valves"].items():
+        if not hasattr(tools.valves, key):
+            continue
+        current = getattr(tools.valves, key)
+        if isinstance(current, bool):
+            value = value.lower() in {"1", "true", "yes", "on"}
+        elif isinstance(current, (int, float)):
+            value = type(current)(value)
+        setattr(tools.valves, key, value)
+
+
+def token_counter():
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("cl100k_base")
+        return (lambda text: len(encoding.encode(text, disallowed_special=()))), "cl100k_base"
+    except Exception:
+        # No tokenizer (or no network to fetch its data): the usual ~4 characters per token
+        return (lambda text: (len(text) + 3) // 4), "chars/4"
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+async def drive(config: dict) -> dict:
+    global STUB_LLM_LATENCY
+    STUB_LLM_LATENCY = config["llm_latency"]
+    name = config["tool"]
+    install_open_webui(config["cache_dir"])
+    module = load_tool(name)
+    tools = module.Tools()
+    configure(name, module, tools, config)
+    queries = SEARCH_QUERIES if name == "firecrawl" else FINANCE_QUERIES
+    countTokens, tokenizer = token_counter()
+    events = []
+
+    async def call(n: int) -> tuple:
+        callEvents = []
+
+        async def emitter(event):
+            callEvents.append(event)
+
+        started = time.perf_counter()
+        try:
+            result = await tools._run(
+                queries[n % len(queries)],
+                __event_emitter__=emitter,
+                __request__=None,
+                __user__={"id": "benchmark-user"},
+                __model__={"id": "benchmark-model"},
+            )
+            # Open WebUI serializes non-string tool results before handing them to the model
+            text = result if isinstance(result, str) else json.dumps(result, default=str)
+            failed = any(event.get("data", {}).get("status") == "error" for event in callEvents)
+        except Exception as e:
+            text, failed = f"{type(e).__name__}: {e}", True
+        events.extend(callEvents)
+        return time.perf_counter() - started, text, failed
+
+    for n in range(config["warmup"]):
+        await call(n)
+    events.clear()
+
+    semaphore = asyncio.Semaphore(config["concurrency"])
+
+    async def bounded(n: int) -> tuple:
+        async with semaphore:
+            return await call(n)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(bounded(n) for n in range(config["requests"])))
+    elapsed = time.perf_counter() - started
+    latencies = [seconds * 1000 for seconds, _, _ in results]
+    tokens = [countTokens(text) for _, text, _ in results]
+    errors = [text[:200] for _, text, failed in results if failed]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "max_ms": round(max(latencies, default=0), 1),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        "peak_rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+        "output_tokens_mean": round(sum(tokens) / len(tokens), 1) if tokens else 0,
+        "output_tokens_max": max(tokens, default=0),
+        "tokenizer": tokenizer,
+        "events": len(events),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+    }
+
+
+def worker(config: dict):
+    with tempfile.TemporaryDirectory(prefix="owui-bench-") as cacheDir:
+        config["cache_dir"] = cacheDir
+        result = asyncio.run(drive(config))
+    # Last line of stdout is the result; tools may print debug output before it
+    print(json.dumps(result))
+
+
+# --- Parent ----------------------------------------------------------------------------------------
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--tools", default="ynab,actual,firecrawl", help="Comma-separated: ynab, actual, firecrawl")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=32, help="Tool calls per scenario")
+    parser.add_argument("--warmup", type=int, default=1, help="Sequential calls before measuring (0 = measure cold start)")
+    parser.add_argument("--transactions", type=int, default=20000, help="Synthetic budget size")
+    parser.add_argument("--months", type=int, default=36, help="Months of history in the synthetic budget")
+    parser.add_argument("--page-kb", type=float, default=20, help="Size of each fake web page")
+    parser.add_argument("--api-latency-ms", type=float, default=20, help="Added latency per fake upstream response")
+    parser.add_argument("--llm-latency-ms", type=float, default=200, help="Latency of the stubbed generate_chat_completion")
+    parser.add_argument("--valve", action="append", default=[], metavar="KEY=VALUE", help="Valve override, repeatable (ignored by tools without that valve)")
+    parser.add_argument("--jsonl", help="Append one JSON line per scenario to this file (for tracking regressions)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_scenario(config: dict) -> dict:
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(config)],
+        capture_output=True,
+        text=True,
+    )
+    lines = process.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, json.JSONDecodeError):
+        raise RuntimeError(f"Worker for {config['tool']} failed:\n{process.stderr[-2000:]}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        return worker(json.loads(args.worker))
+
+    from fake_servers import FakeYNAB, FakeFirecrawl
+    from synthetic import ynab_budget, write_actual_budget
+
+    tools = [name.strip() for name in args.tools.split(",") if name.strip()]
+    unknown = set(tools) - set(TOOLS)
+    if unknown:
+        raise SystemExit(f"Unknown tool(s): {', '.join(sorted(unknown))}")
+    levels = [int(level) for level in args.concurrency.split(",")]
+    valves = dict(item.split("=", 1) for item in args.valve)
+    latency = args.api_latency_ms / 1000
+
+    servers = {}
+    with tempfile.TemporaryDirectory(prefix="owui-bench-data-") as dataDir:
+        budget = ynab_budget(args.transactions, args.months, args.seed)
+        base = {
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "llm_latency": args.llm_latency_ms / 1000,
+            "valves": valves,
+        }
+        if "ynab" in tools:
+            servers["ynab"] = FakeYNAB(budget, latency).start()
+            base["ynab_url"] = servers["ynab"].url
+        if "actual" in tools:
+            base["actual_budget"] = os.path.join(dataDir, "db.sqlite")
+            write_actual_budget(budget, base["actual_budget"])
+        if "firecrawl" in tools:
+            servers["firecrawl"] = FakeFirecrawl(int(args.page_kb * 1024), latency).start()
+            base["firecrawl_url"] = servers["firecrawl"].url
+
+        header = f"{'tool':<10}{'conc':>5}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>8}{'RSS MB':>9}{'KB down':>10}{'KB up':>9}{'tokens':>9}"
+        print(f"{args.transactions} transactions, {args.page_kb:g} KB pages, API latency {args.api_latency_ms:g} ms, LLM latency {args.llm_latency_ms:g} ms")
+        print(header)
+        print("-" * len(header))
+        for name in tools:
+            for level in levels:
+                server = servers.get(name)
+                if server:
+                    server.reset_stats()
+                result = run_scenario({**base, "tool": name, "concurrency": level})
+                traffic = dict(server.stats) if server else {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+                # Upstream bytes as seen by the fake server: responses are what the tool downloads
+                result.update({
+                    "upstream_requests": traffic["requests"],
+                    "bytes_downloaded": traffic["bytes_out"],
+                    "bytes_uploaded": traffic["bytes_in"],
+                })
+                print(
+                    f"{name:<10}{level:>5}{args.requests:>6}{result['errors']:>5}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+                    f"{result['throughput_rps']:>8.1f}{result['peak_rss_mb']:>9.1f}{traffic['bytes_out'] / 1024:>10.1f}"
+                    f"{traffic['bytes_in'] / 1024:>9.1f}{result['output_tokens_mean']:>9.0f}"
+                )
+                if result["first_error"]:
+                    print(f"    first error: {result['first_error']}")
+                if args.jsonl:
+                    record = {
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
+                        "tool": name,
+                        "concurrency": level,
+                        **{key: value for key, value in vars(args).items() if key not in {"tools", "concurrency", "jsonl", "worker"}},
+                        **result,
+                    }
+                    with open(args.jsonl, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record) + "\n")
+    for server in servers.values():
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
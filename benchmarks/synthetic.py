@@ -0,0 +1,265 @@
+"""
+Deterministic synthetic data for the benchmarks: a YNAB-shaped budget, the same budget as an
+Actual Budget database file, and Markdown web pages for the fake Firecrawl server.
+"""
+
+from datetime import date, timedelta
+import hashlib
+import random
+import uuid
+
+ACCOUNTS = [
+    ("Checking", "checking", True),
+    ("Savings", "savings", True),
+    ("Visa", "creditCard", True),
+    ("Amex", "creditCard", True),
+    ("Brokerage", "otherAsset", False),
+    ("Mortgage", "mortgage", False),
+]
+CATEGORY_GROUPS = {
+    "Bills": ["Rent", "Electric", "Water", "Internet", "Phone", "Insurance"],
+    "Everyday": ["Groceries", "Dining Out", "Coffee", "Transportation", "Gas", "Household"],
+    "Fun": ["Entertainment", "Hobbies", "Travel", "Gifts", "Subscriptions"],
+    "Health": ["Medical", "Pharmacy", "Fitness"],
+    "Savings Goals": ["Emergency Fund", "Vacation", "New Car"],
+}
+PAYEE_WORDS = [
+    "Costco", "Safeway", "Trader Joe's", "Shell", "Chevron", "Amazon", "Target", "Walgreens",
+    "Starbucks", "Netflix", "Spotify", "Comcast", "PG&E", "Uber", "Lyft", "Delta", "Hilton",
+    "Home Depot", "REI", "Whole Foods", "Chipotle", "Blue Bottle", "Kaiser", "Planet Fitness",
+]
+MEMOS = ["", "", "", "weekly shop", "refund", "split with Sam", "birthday", "auto-pay", "reimbursable"]
+
+
+def _id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def ynab_budget(transactions: int = 20000, months: int = 36, seed: int = 7, today: date = None) -> dict:
+    """
+    Returns {"accounts", "category_groups", "payees", "transactions", "server_knowledge"} in YNAB API shapes,
+    with `transactions` spread evenly over the last `months` months and sorted by date.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    accounts = [
+        {
+            "id": _id(rng),
+            "name": name,
+            "type": kind,
+            "on_budget": onBudget,
+            "closed": False,
+            "note": None,
+            "balance": 0,
+            "cleared_balance": 0,
+            "uncleared_balance": 0,
+            "transfer_payee_id": None,
+            "direct_import_linked": False,
+            "direct_import_in_error": False,
+            "last_reconciled_at": None,
+            "debt_original_balance": None,
+            "deleted": False,
+        }
+        for name, kind, onBudget in ACCOUNTS
+    ]
+    categoryGroups = []
+    for groupName, names in CATEGORY_GROUPS.items():
+        groupId = _id(rng)
+        categoryGroups.append({
+            "id": groupId,
+            "name": groupName,
+            "hidden": False,
+            "deleted": False,
+            "categories": [
+                {
+                    "id": _id(rng),
+                    "category_group_id": groupId,
+                    "category_group_name": groupName,
+                    "name": name,
+                    "hidden": False,
+                    "budgeted": 0,
+                    "activity": 0,
+                    "balance": 0,
+                    "deleted": False,
+                }
+                for name in names
+            ],
+        })
+    categories = [cat for group in categoryGroups for cat in group["categories"]]
+    payees = [
+        {"id": _id(rng), "name": f"{word} #{n}" if n else word, "transfer_account_id": None, "deleted": False}
+        for n in range(8)
+        for word in PAYEE_WORDS
+    ]
+
+    start = today - timedelta(days=months * 30)
+    span = (today - start).days
+    rows = []
+    for n in range(transactions):
+        account = accounts[rng.randrange(4)] if rng.random() < 0.95 else rng.choice(accounts)
+        payee = rng.choice(payees)
+        category = rng.choice(categories)
+        income = rng.random() < 0.04
+        amount = rng.randrange(100000, 500000) if income else -rng.randrange(500, 250000)
+        rows.append({
+            "id": _id(rng),
+            "date": (start + timedelta(days=n * span // max(transactions, 1))).isoformat(),
+            "amount": amount // 10 * 10,
+            "memo": rng.choice(MEMOS) or None,
+            "cleared": "cleared",
+            "approved": True,
+            "flag_color": None,
+            "flag_name": None,
+            "account_id": account["id"],
+            "account_name": account["name"],
+            "payee_id": payee["id"],
+            "payee_name": payee["name"],
+            "category_id": None if income else category["id"],
+            "category_name": "Inflow: Ready to Assign" if income else category["name"],
+            "transfer_account_id": None,
+            "transfer_transaction_id": None,
+            "matched_transaction_id": None,
+            "import_id": None,
+            "import_payee_name": None,
+            "import_payee_name_original": None,
+            "debt_transaction_type": None,
+            "deleted": False,
+            "subtransactions": [],
+        })
+        account["balance"] += rows[-1]["amount"]
+    for account in accounts:
+        account["cleared_balance"] = account["balance"]
+    return {
+        "accounts": accounts,
+        "category_groups": categoryGroups,
+        "payees": payees,
+        "transactions": rows,
+        "server_knowledge": 1000 + transactions,
+    }
+
+
+def write_actual_budget(budget: dict, path: str):
+    """
+    Writes `budget` (from `ynab_budget`) as an Actual Budget `db.sqlite` at `path`, using actualpy's schema.
+    Amounts are converted from YNAB milliunits to Actual cents. Rows are keyed by table column names
+    (e.g. a transaction's payee is `description`), which differ from actualpy's attribute names.
+    """
+    from sqlalchemy import insert
+    from sqlmodel import SQLModel, Session, create_engine
+    from actual import database as db
+
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.execute(insert(db.Accounts.__table__), [
+            {
+                "id": acc["id"],
+                "name": acc["name"],
+                "offbudget": int(not acc["on_budget"]),
+                "closed": 0,
+                "sort_order": n,
+                "tombstone": 0,
+            }
+            for n, acc in enumerate(budget["accounts"])
+        ])
+        session.execute(insert(db.CategoryGroups.__table__), [
+            {"id": group["id"], "name": group["name"], "is_income": 0, "hidden": 0, "sort_order": n, "tombstone": 0}
+            for n, group in enumerate(budget["category_groups"])
+        ])
+        categories = [cat for group in budget["category_groups"] for cat in group["categories"]]
+        session.execute(insert(db.Categories.__table__), [
+            {
+                "id": cat["id"],
+                "name": cat["name"],
+                "is_income": 0,
+                "cat_group": cat["category_group_id"],
+                "hidden": 0,
+                "sort_order": n,
+                "tombstone": 0,
+            }
+            for n, cat in enumerate(categories)
+        ])
+        session.execute(insert(db.Payees.__table__), [
+            {"id": payee["id"], "name": payee["name"], "tombstone": 0} for payee in budget["payees"]
+        ])
+        session.execute(insert(db.PayeeMapping.__table__), [
+            {"id": payee["id"], "targetId": payee["id"]} for payee in budget["payees"]
+        ])
+        session.execute(insert(db.Transactions.__table__), [
+            {
+                "id": tx["id"],
+                "acct": tx["account_id"],
+                "category": tx["category_id"],
+                "description": tx["payee_id"],
+                "amount": tx["amount"] // 10,
+                "notes": tx["memo"],
+                "date": int(tx["date"].replace("-", "")),
+                "isParent": 0,
+                "isChild": 0,
+                "starting_balance_flag": 0,
+                "cleared": 1,
+                "reconciled": 0,
+                "sort_order": n,
+                "tombstone": 0,
+            }
+            for n, tx in enumerate(budget["transactions"])
+        ])
+        session.commit()
+    engine.dispose()
+
+
+def web_page(url: str, size: int) -> dict:
+    """
+    A Markdown page of roughly `size` bytes for `url`, shaped like a Firecrawl scrape result:
+    navigation, cookie banner, related links and footer boilerplate around headed sections of prose, lists, links and images.
+    """
+    rng = random.Random(hashlib.sha256(url.encode("utf-8")).digest())
+    words = [
+        "budget", "latency", "throughput", "python", "cache", "request", "index", "server", "memory",
+        "stream", "query", "token", "model", "search", "result", "page", "market", "report", "policy",
+        "energy", "climate", "history", "science", "health", "travel", "recipe", "review", "guide",
+    ]
+    title = " ".join(rng.choice(words).capitalize() for _ in range(4))
+    nav = "\n".join([
+        "[Skip to main content](#main)",
+        "![Example Media logo](https://example.com/static/logo.svg)",
+        "We use cookies to improve your experience. [Accept all cookies](https://example.com/cookies/accept)",
+        "\n".join(f"* [{word.capitalize()}](https://example.com/{word})" for word in rng.sample(words, 8)),
+    ])
+    related = "\n".join(
+        f"* [{rng.choice(words).capitalize()} {rng.choice(words)} {rng.choice(words)}](https://example.com/{rng.choice(words)}/{n})"
+        for n in range(12)
+    )
+    footer = "\n\n".join([
+        f"## Related articles\n\n{related}",
+        "Share this: [Twitter](https://twitter.com/share) | [Facebook](https://facebook.com/share) | [Email](mailto:?)",
+        "Subscribe to our newsletter",
+        "[Privacy Policy](https://example.com/privacy) | [Terms](https://example.com/terms) | [Cookies](https://example.com/cookies)",
+        "© 2026 Example Media. All rights reserved.",
+    ])
+    parts = [nav, f"# {title}"]
+    length = len(nav) + len(footer)
+    section = 0
+    while length < size:
+        section += 1
+        lines = [f"## {rng.choice(words).capitalize()} {rng.choice(words)} {section}"]
+        for _ in range(rng.randrange(2, 5)):
+            lines.append(" ".join(rng.choice(words) for _ in range(rng.randrange(40, 90))).capitalize() + ".")
+        if rng.random() < 0.4:
+            lines.append("\n".join(f"- {rng.choice(words)} {rng.choice(words)}" for _ in range(rng.randrange(3, 7))))
+        if rng.random() < 0.3:
+            lines.append(f"[Read more about {rng.choice(words)}](https://example.com/{rng.choice(words)}/{section})")
+        if rng.random() < 0.2:
+            lines.append(f"![{rng.choice(words)}](https://cdn.example.com/images/{section}-{rng.getrandbits(32):08x}.jpg)")
+        block = "\n\n".join(lines)
+        parts.append(block)
+        length += len(block)
+    parts.append(footer)
+    markdown = "\n\n".join(parts)
+    return {
+        "url": url,
+        "title": title,
+        "description": title,
+        "markdown": markdown,
+        "metadata": {"title": title, "sourceURL": url, "statusCode": 200},
+    }
@@ -3,14 +3,29 @@ title: Actual API Request
 description: Retrieves user's financial information (accounts or transactions) from Actual API to answer personal finance questions
 author: megaphonix
 author_url: https://github.com/megaphonixmusic
-version: 0.3.0
+version: 0.4.0
 required_open_webui_version: 0.6.5
-requirements: actualpy>=0.12.1
+requirements: actualpy>=0.12.1, numpy, tiktoken
 """
 
 # !!! IMPORTANT: IT IS HIGHLY RECOMMENDED TO ONLY RUN THIS TOOL WITH LOCAL, PRIVATE LLMS !!!
 # (Due to handling sensitive financial data and information)
 #
+# v0.4.0 [2026-10-17]
+# - Budget sessions are kept open between questions and refreshed with incremental sync
+# - Added Valves for 'Session Sync Interval', 'Session Idle TTL'
+# - Transactions are fetched with one date-bounded query and bulk account/category/payee lookups while the full index is built in the background
+# - Added rule-based fast path for routing obvious queries without an LLM call ('Fast Router' Valve)
+# - Context is rendered in the selected format only, in a single pass
+# - Added 'aggregate' route: outflow/inflow/net totals, counts and averages per category, payee, account or month (transfers left out) are computed in the tool instead of sending every transaction to the LLM
+# - Transactions are held in a columnar, date-sorted in-memory index (NumPy), updated with the changed transactions of each sync
+# - Questions naming an account, category or payee only return (or total) that entity's transactions
+# - Concurrent first questions share one budget download; different budgets open in parallel
+# - Added optional background prefetch ('Background Prefetch', 'Prefetch Interval', 'Prefetch Quiet Hours' Valves)
+# - Added 'Compact' (names listed once, rows carry short ids and integer cents) and 'Auto' (fewest tokens) Context Formats
+# - Added 'balances' route: opening/closing balance per account and a net worth series over a date range, from a daily running-balance history
+# - Added 'Metrics Directory' Valve: per-stage timings (routing, LLM, session open/sync, account fetch, filtering, rendering) and row/token counts as JSON lines and Prometheus histograms
+#
 # v0.3.0 [2025-06-03]
 # - Updated system prompt and logic for more efficient data filtering by date(s)
 #
@@ -19,15 +34,27 @@ requirements: actualpy>=0.12.1
 # - Added Valves for 'Currency' (currently unused), 'Context Format', 'Debug'
 
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Callable, Any, Optional, Awaitable, Literal
+from typing import List, Dict, Callable, Any, Optional, Awaitable, Literal, Iterable
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
 from pydantic import BaseModel, Field
-import requests
 import re
 import json
+import os
+import time
+import asyncio
+import hashlib
+import threading
+import functools
+import contextvars
+import numpy as np
+import tiktoken
 from open_webui.models.users import Users
 from open_webui.utils.chat import generate_chat_completion
 from actual import Actual
-from actual.queries import get_accounts, get_transactions, get_account, get_categories, get_payees
+from actual.database import Accounts, Categories, Payees, Transactions
+from actual.queries import get_transactions
+from sqlalchemy import func
+from sqlmodel import Session, col, select
 
 def format_currency(amount: float) -> str:
         if amount < 0:
@@ -35,6 +62,602 @@ def format_currency(amount: float) -> str:
         else:
             return f"{amount:,.2f}"
 
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan"),
+            ("february", "feb"),
+            ("march", "mar"),
+            ("april", "apr"),
+            ("may",),
+            ("june", "jun"),
+            ("july", "jul"),
+            ("august", "aug"),
+            ("september", "sept", "sep"),
+            ("october", "oct"),
+            ("november", "nov"),
+            ("december", "dec"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+}
+
+ACCOUNT_INTENT = re.compile(
+    r"\b(balances?|net worth|how much (money )?do i have|accounts?|checking|savings|credit cards?|owe|debt)\b"
+)
+TRANSACTION_INTENT = re.compile(
+    r"\b(spen[dt]|spending|purchas\w*|bought|buy|pay|paid|payments?|transactions?|charges?|charged|expenses?|income|earn\w*|deposits?|transfers?|cost)\b"
+)
+AGGREGATE_INTENT = re.compile(r"\b(how much|total|totals|sum|average|avg|breakdown)\b")
+BALANCE_HISTORY_INTENT = re.compile(
+    r"\b(chang\w*|over time|history|historical|trend\w*|grow\w*|grew|increas\w*|decreas\w*|went (up|down))\b"
+)
+GROUP_BY_WORDS = {
+    "payee": "payee", "merchant": "payee", "account": "account",
+    "month": "month", "monthly": "month", "each month": "month", "category": "category",
+}
+GROUP_BY_PATTERN = re.compile(
+    r"\b(?:by|per) (payee|merchant|account|month|category)\b|\b(monthly|each month)\b"
+)
+# Anything left that looks like a date we didn't resolve sends the query to the LLM
+DATE_WORDS = re.compile(
+    rf"\b({MONTH_PATTERN}|\d{{4}}|\d{{1,2}}(st|nd|rd|th)|\d{{1,2}}/\d{{1,2}}|days?|weeks?|weekends?|months?|years?|quarters?|q[1-4]|today|tonight|yesterday|since|between|ago|until|before|after|(mon|tues|wednes|thurs|fri|satur|sun)day|ytd)\b"
+)
+
+
+def shift_months(day: date, months: int) -> date:
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, min(day.day, (next_month - timedelta(days=1)).day))
+
+
+def month_range(year: int, month: int) -> tuple:
+    start = date(year, month, 1)
+    return start, shift_months(start, 1) - timedelta(days=1)
+
+
+def relative_range(today: date, amount: str, unit: str) -> tuple:
+    count = NUMBER_WORDS.get(amount) or int(amount or 1)
+    if unit == "day":
+        return today - timedelta(days=count), today
+    if unit == "week":
+        return today - timedelta(weeks=count), today
+    return shift_months(today, -count * (12 if unit == "year" else 1)), today
+
+
+def parse_date_phrase(text: str, today: date) -> Optional[tuple]:
+    """
+    Resolves the one relative or calendar date phrase in `text`, using the same conventions as the LLM system prompt.
+    Returns (startDate, endDate, phrase), or None if there is no phrase or more than one.
+    """
+    last_month = shift_months(today, -1)
+    rules = [
+        (r"\btoday\b", lambda m: (today, today)),
+        (r"\byesterday\b", lambda m: (today - timedelta(days=1), today - timedelta(days=1))),
+        (r"\bthis week\b", lambda m: (today - timedelta(days=today.weekday()), today)),
+        (r"\blast week\b", lambda m: (today - timedelta(days=7), today - timedelta(days=1))),
+        (r"\bthis month\b", lambda m: (today.replace(day=1), today)),
+        (r"\blast month\b", lambda m: month_range(last_month.year, last_month.month)),
+        (r"\b(this year|year to date|ytd)\b", lambda m: (date(today.year, 1, 1), today)),
+        (r"\blast year\b", lambda m: (date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))),
+        (
+            rf"\b(?:past|last|previous) (\d+|{'|'.join(NUMBER_WORDS)})? ?(day|week|month|year)s?\b",
+            lambda m: relative_range(today, m.group(1), m.group(2)),
+        ),
+        (
+            rf"\b(?:in |during |for )?({MONTH_PATTERN}),? (?:of )?(\d{{4}})\b",
+            lambda m: month_range(int(m.group(2)), MONTHS[m.group(1)]),
+        ),
+        (
+            rf"\b(?:in|during|for) ({MONTH_PATTERN})\b",
+            lambda m: month_range(
+                today.year if MONTHS[m.group(1)] <= today.month else today.year - 1,
+                MONTHS[m.group(1)],
+            ),
+        ),
+        (
+            r"\b(?:in|during) (\d{4})\b",
+            lambda m: (date(int(m.group(1)), 1, 1), date(int(m.group(1)), 12, 31)),
+        ),
+    ]
+    matches = []
+    for pattern, resolve in rules:
+        # "last month" is not "past N months"; the relative rule requires "past/previous" or a count
+        for match in re.finditer(pattern, text):
+            if pattern.startswith(r"\b(?:past") and match.group(0).startswith("last ") and not match.group(1):
+                continue
+            matches.append((match, resolve))
+    # Keep the longest phrase where rules overlap ("in may 2024" also contains "in may")
+    matches = [
+        (match, resolve)
+        for match, resolve in matches
+        if not any(
+            other.start() <= match.start()
+            and match.end() <= other.end()
+            and (other.start(), other.end()) != (match.start(), match.end())
+            for other, _ in matches
+        )
+    ]
+    if len(matches) != 1:
+        return None
+    match, resolve = matches[0]
+    start, end = resolve(match)
+    return start, end, match.group(0)
+
+
+def fast_route(query: str, today: date) -> Optional[list]:
+    """
+    Rule-based router for unambiguous queries. Returns the same list the LLM would
+    (['accounts'], ['balances', ...], ['transactions', ...] or ['aggregate', groupBy, ...]), or None when unsure.
+    """
+    text = query.lower()
+    wants_accounts = bool(ACCOUNT_INTENT.search(text))
+    wants_transactions = bool(TRANSACTION_INTENT.search(text))
+    if wants_accounts == wants_transactions:
+        return None
+    group = GROUP_BY_PATTERN.search(text)
+    # "per month" is a grouping, not a date range
+    dated = GROUP_BY_PATTERN.sub(" ", text)
+    phrase = parse_date_phrase(dated, today)
+    if DATE_WORDS.search(dated.replace(phrase[2], " ") if phrase else dated):
+        return None
+    dates = [phrase[0].isoformat(), phrase[1].isoformat()] if phrase else []
+    if wants_accounts:
+        # "How has my net worth changed", "balances last month"
+        if not group and (BALANCE_HISTORY_INTENT.search(text) or phrase and phrase[2] != "today"):
+            return ["balances"] + dates
+        return ["accounts"] if phrase is None and not group or phrase and phrase[2] == "today" else None
+    if group or AGGREGATE_INTENT.search(text):
+        if group:
+            groupBy = GROUP_BY_WORDS[group.group(1) or group.group(2)]
+        else:
+            # "at Starbucks" asks about a payee
+            groupBy = "payee" if re.search(r"\bat (?!least\b|most\b|all\b)[a-z]", text) else "category"
+        return ["aggregate", groupBy] + dates
+    return ["transactions"] + dates
+
+
+_ROUTER_STATS = {"fast": 0, "llm": 0}
+
+
+def router_stats() -> dict:
+    total = _ROUTER_STATS["fast"] + _ROUTER_STATS["llm"]
+    return {**_ROUTER_STATS, "fast_hit_rate": _ROUTER_STATS["fast"] / total if total else 0.0}
+
+
+TOOL_NAME = "actual_api_request"
+# Latency histogram buckets in seconds, shared by every stage
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_COUNTS = ("bytes", "rows", "tokens")
+
+
+class StageMetrics:
+    """
+    Process-wide latency histograms and byte/row/token totals per stage, for every call of this tool.
+    Rendered in the Prometheus text exposition format by `prometheus`.
+    """
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.calls = {}
+
+    def observe(self, stage: str, seconds: float, counts: dict):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {
+                    "buckets": [0] * len(METRIC_BUCKETS),
+                    "count": 0,
+                    "sum": 0.0,
+                    **{key: 0 for key in METRIC_COUNTS}
+                }
+            entry["count"] += 1
+            entry["sum"] += seconds
+            for n, bound in enumerate(METRIC_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][n] += 1
+            for key in METRIC_COUNTS:
+                entry[key] += int(counts.get(key) or 0)
+
+    def count_call(self, status: str):
+        with self.lock:
+            self.calls[status] = self.calls.get(status, 0) + 1
+
+    def prometheus(self) -> str:
+        with self.lock:
+            stages = {
+                stage: {**entry, "buckets": list(entry["buckets"])}
+                for stage, entry in sorted(self.stages.items())
+            }
+            calls = dict(self.calls)
+        tool = f'tool="{self.tool}"'
+        lines = [
+            "# HELP openwebui_tool_stage_seconds Time spent in each stage of a tool call",
+            "# TYPE openwebui_tool_stage_seconds histogram"
+        ]
+        for stage, entry in stages.items():
+            labels = f'{tool},stage="{stage}"'
+            for bound, count in zip(METRIC_BUCKETS, entry["buckets"]):
+                lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f"openwebui_tool_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+            lines.append(f"openwebui_tool_stage_seconds_count{{{labels}}} {entry['count']}")
+        for key in METRIC_COUNTS:
+            lines.append(f"# HELP openwebui_tool_stage_{key}_total {key.capitalize()} handled by each stage")
+            lines.append(f"# TYPE openwebui_tool_stage_{key}_total counter")
+            for stage, entry in stages.items():
+                if entry[key]:
+                    lines.append(f'openwebui_tool_stage_{key}_total{{{tool},stage="{stage}"}} {entry[key]}')
+        lines.append("# HELP openwebui_tool_calls_total Tool calls by final status")
+        lines.append("# TYPE openwebui_tool_calls_total counter")
+        for status, count in sorted(calls.items()):
+            lines.append(f'openwebui_tool_calls_total{{{tool},status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class CallTrace:
+    """
+    Stage timings and counts of one tool call. Set in `_TRACE` for the duration of the call,
+    so helpers record into it through `span` without it being passed around.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.status = "complete"
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float, counts: dict):
+        entry = self.stages.setdefault(
+            stage, {"seconds": 0.0, "calls": 0, **{key: 0 for key in METRIC_COUNTS}}
+        )
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        for key in METRIC_COUNTS:
+            entry[key] += int(counts.get(key) or 0)
+
+    def summary(self) -> str:
+        parts = []
+        for stage, entry in self.stages.items():
+            details = [f"{entry['calls']}x"] if entry["calls"] > 1 else []
+            if entry["bytes"]:
+                details.append(f"{entry['bytes'] / 1024:,.0f} KB")
+            if entry["rows"]:
+                details.append(f"{entry['rows']:,} rows")
+            if entry["tokens"]:
+                details.append(f"~{entry['tokens']:,} tokens")
+            parts.append(
+                f"{stage} {entry['seconds']:.3f}s" + (f" ({', '.join(details)})" if details else "")
+            )
+        return ", ".join(parts)
+
+    def record(self) -> dict:
+        return {
+            "time": datetime.fromtimestamp(self.started).isoformat(timespec="milliseconds"),
+            "tool": TOOL_NAME,
+            "status": self.status,
+            # Counts a stage never records are left out
+            "stages": {
+                stage: {
+                    "seconds": round(entry["seconds"], 6),
+                    "calls": entry["calls"],
+                    **{key: entry[key] for key in METRIC_COUNTS if entry[key]}
+                }
+                for stage, entry in self.stages.items()
+            }
+        }
+
+
+_METRICS = StageMetrics(TOOL_NAME)
+_TRACE: contextvars.ContextVar = contextvars.ContextVar(f"{TOOL_NAME}_trace", default=None)
+
+
+@contextmanager
+def span(stage: str, **counts):
+    """
+    Times the block as `stage`. Counts ("bytes", "rows", "tokens") can be passed up front
+    or set on the yielded dict inside the block. Stages can nest (every stage is inside "call").
+    """
+    record = dict(counts)
+    started = time.monotonic()
+    try:
+        yield record
+    finally:
+        seconds = time.monotonic() - started
+        _METRICS.observe(stage, seconds, record)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.add(stage, seconds, record)
+
+
+def estimate_tokens(context: Any) -> int:
+    # ~4 characters per token: cheap enough to run on every rendered context
+    return len(context if isinstance(context, str) else json.dumps(context)) // 4
+
+
+def write_metrics(directory: str, trace: CallTrace):
+    # One JSON line per call; the .prom file is replaced whole so a scraper never reads half of it
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{TOOL_NAME}.jsonl"), "a", encoding="utf-8") as file:
+            file.write(json.dumps(trace.record()) + "\n")
+        path = os.path.join(directory, f"{TOOL_NAME}.prom")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(_METRICS.prometheus())
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"[{TOOL_NAME}] Metrics not written: {e}")
+
+
+def traced(run: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Wraps `Tools._run`: the whole call is timed as stage "call", its spans are collected
+    and then written to the 'Metrics Directory' (if set) and printed when 'Debug' is on.
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        trace = CallTrace()
+        token = _TRACE.set(trace)
+        try:
+            with span("call"):
+                return await run(self, *args, **kwargs)
+        except BaseException:
+            trace.status = "error"
+            raise
+        finally:
+            _TRACE.reset(token)
+            _METRICS.count_call(trace.status)
+            write_metrics(self.valves.METRICS_DIR, trace)
+            if self.valves.DEBUG in {"Basic", "Full"}:
+                print(f"[{TOOL_NAME}] Stages: {trace.summary()}")
+
+    return wrapper
+
+
+ACCOUNT_COLUMNS = [("name", "Account Name"), ("balance", "Balance")]
+ACCOUNT_PLAINTEXT = "- {name}: {balance}"
+TRANSACTION_COLUMNS = [
+    ("date", "Transaction Date"),
+    ("payee", "Payee"),
+    ("amount", "Amount"),
+    ("category", "Category"),
+    ("account", "Account"),
+    ("notes", "Notes"),
+]
+TRANSACTION_PLAINTEXT = "- Date: {date}, Payee: {payee}, Amount: {amount}, Category: {category}, Account: {account}, Notes: {notes}"
+BALANCE_COLUMNS = [
+    ("account", "Account"),
+    ("opening", "Opening Balance"),
+    ("closing", "Closing Balance"),
+    ("change", "Change"),
+]
+BALANCE_PLAINTEXT = "- {account}: {opening} -> {closing} (change {change})"
+NET_WORTH_COLUMNS = [("date", "Date"), ("net_worth", "Net Worth"), ("change", "Change")]
+NET_WORTH_PLAINTEXT = "- {date}: {net_worth} (change {change})"
+RIGHT_ALIGNED = {"amount", "balance", "outflow", "inflow", "net", "count", "average", "opening", "closing", "change", "net_worth"}
+# Passed to `render_context` as integer cents
+MONEY_COLUMNS = RIGHT_ALIGNED - {"count"}
+CONTEXT_FORMATS = ("JSON", "Markdown", "Plaintext", "Compact")
+# Compact: repeated names are listed once and rows refer to them by short id
+COMPACT_DICTIONARIES = {"payee": "p", "category": "c", "account": "a"}
+# Dictionary lines are "p1=Name; p2=Name", so names holding these are quoted like CSV cells
+COMPACT_NAME_SPECIAL = ',";='
+# Auto: formats are compared on the first rows, then only the cheapest renders them all
+AUTO_SAMPLE_ROWS = 200
+TOKENIZER_ENCODING = "cl100k_base"
+_ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            _ENCODING = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # Offline installs may lack the tokenizer data; ~4 characters per token still ranks formats
+            _ENCODING = False
+    if _ENCODING is False:
+        return len(text) // 4
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+
+def display_amount(cents: int) -> str:
+    return format_currency(cents / 100)
+
+
+def markdown_cell(value: Any) -> str:
+    return "" if value is None else str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def compact_cell(value: Any, special: str = ',"') -> str:
+    # Quoted CSV-style when it holds one of the `special` separators
+    text = "" if value is None else str(value).replace("\n", " ")
+    if any(char in text for char in special):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def render_compact(title: str, columns: List[tuple], rows: Iterable[dict]) -> tuple:
+    """
+    Columnar CSV without repeated names: payees, categories and accounts are listed once with short ids
+    and money is written as integer cents.
+    """
+    keys = [key for key, _ in columns]
+    ids = {key: {} for key in keys if key in COMPACT_DICTIONARIES}
+    lines = []
+    for row in rows:
+        cells = []
+        for key in keys:
+            value = row.get(key)
+            if key in ids:
+                names = ids[key]
+                if value not in names:
+                    names[value] = f"{COMPACT_DICTIONARIES[key]}{len(names) + 1}"
+                cells.append(names[value])
+            elif key in MONEY_COLUMNS:
+                cells.append(str(value))
+            else:
+                cells.append(compact_cell(value))
+        lines.append(",".join(cells))
+    notes = "amounts in cents"
+    if ids:
+        notes += f"; {'/'.join(ids)} columns hold the ids listed below"
+    header = [f"{title} ({notes}):"]
+    for key, names in ids.items():
+        header.append(f"{key}: " + "; ".join(f"{code}={compact_cell(name, COMPACT_NAME_SPECIAL)}" for name, code in names.items()))
+    header.append(",".join(keys))
+    return "\n".join(header + lines) + "\n", len(lines)
+
+
+def context_tokens(context: Any) -> int:
+    # Open WebUI hands dict results to the model as JSON
+    return count_tokens(context if isinstance(context, str) else json.dumps(context))
+
+
+def render_context(
+    title: str,
+    columns: List[tuple],
+    rows: Iterable[dict],
+    contextFormat: str,
+    plaintextRow: str,
+    display: Callable[[int], Any] = display_amount
+) -> tuple:
+    # `format_context`, timed as the "render" stage with its row count and estimated tokens
+    with span("render") as record:
+        context, count = format_context(title, columns, rows, contextFormat, plaintextRow, display)
+        record["rows"] = count
+        record["tokens"] = estimate_tokens(context)
+    return context, count
+
+
+def format_context(
+    title: str,
+    columns: List[tuple],
+    rows: Iterable[dict],
+    contextFormat: str,
+    plaintextRow: str,
+    display: Callable[[int], Any] = display_amount
+) -> tuple:
+    """
+    Renders rows straight into the selected CONTEXT_FORMAT only, in a single pass over `rows`
+    (which can be a generator). MONEY_COLUMNS hold integer cents and are shown with `display`.
+    "Auto" renders a sample in every format and uses the one with the fewest tokens.
+    Returns the rendered context and the number of rows.
+    """
+    if contextFormat == "Auto":
+        rows = rows if isinstance(rows, list) else list(rows)
+        sample = rows[:AUTO_SAMPLE_ROWS]
+        contextFormat = min(
+            CONTEXT_FORMATS,
+            key=lambda candidate: context_tokens(
+                format_context(title, columns, sample, candidate, plaintextRow, display)[0]
+            )
+        )
+    if contextFormat == "Compact":
+        return render_compact(title, columns, rows)
+
+    count = 0
+    shown = (
+        {**row, **{key: display(row[key]) for key in MONEY_COLUMNS if row.get(key) is not None}}
+        for row in rows
+    )
+    if contextFormat == "JSON":
+        keys = [key for key, _ in columns]
+        items = []
+        for row in shown:
+            items.append({key: row.get(key) for key in keys})
+            count += 1
+        return {title: items}, count
+
+    if contextFormat == "Markdown":
+        lines = [
+            "| " + " | ".join(header for _, header in columns) + " |",
+            "| " + " | ".join("---:" if key in RIGHT_ALIGNED else "---" for key, _ in columns) + " |",
+        ]
+        for row in shown:
+            lines.append("| " + " | ".join(markdown_cell(row.get(key)) for key, _ in columns) + " |")
+            count += 1
+    else:
+        lines = [f"{title}:"]
+        for row in shown:
+            lines.append(plaintextRow.format_map(row))
+            count += 1
+    return "\n".join(lines) + "\n", count
+
+
+def join_contexts(*contexts: Any) -> Any:
+    # JSON contexts merge into one object; anything else is concatenated as text
+    if all(isinstance(context, dict) for context in contexts):
+        return {key: value for context in contexts for key, value in context.items()}
+    return "\n".join(context if isinstance(context, str) else json.dumps(context) for context in contexts)
+
+
+GROUP_BY = {"category", "payee", "account", "month"}
+AGGREGATE_PLAINTEXT = "- {group}: outflow {outflow}, inflow {inflow}, net {net}, {count} transactions, average net {average}"
+
+
+def aggregate_columns(groupBy: str) -> List[tuple]:
+    return [
+        ("group", groupBy.capitalize()),
+        ("outflow", "Outflow"),
+        ("inflow", "Inflow"),
+        ("net", "Net"),
+        ("count", "Transactions"),
+        ("average", "Average Net")
+    ]
+
+
+def aggregate_result(groups: Dict[str, tuple], groupBy: str) -> List[dict]:
+    # {group: (outflow, inflow, count)} -> rows; months in order, other groups largest outflow first
+    if groupBy == "month":
+        keys = sorted(groups)
+    else:
+        keys = sorted(groups, key=lambda key: (-groups[key][0], -groups[key][1], key))
+    result = [
+        {"group": key, "outflow": groups[key][0], "inflow": groups[key][1], "net": groups[key][1] - groups[key][0], "count": groups[key][2]}
+        for key in keys
+    ]
+    if result:
+        outflow = sum(row["outflow"] for row in result)
+        inflow = sum(row["inflow"] for row in result)
+        result.append({"group": "Total", "outflow": outflow, "inflow": inflow, "net": inflow - outflow, "count": sum(row["count"] for row in result)})
+    return result
+
+
+def parse_route(params: list) -> tuple:
+    # ['accounts'] | ['balances' | 'transactions', (startDate, (endDate))] | ['aggregate', groupBy, (startDate, (endDate))]
+    dataType = None
+    startDate = None
+    endDate = None
+    options = {}
+    if isinstance(params, list) and params:
+        dataType = params[0]
+        dates = params[1:]
+        if dataType == "aggregate":
+            options["groupBy"] = "category"
+            if dates and dates[0] in GROUP_BY:
+                options["groupBy"] = dates[0]
+                dates = dates[1:]
+        if len(dates) == 1:
+            startDate = dates[0]
+            endDate = str(date.today())
+        elif len(dates) >= 2:
+            startDate = dates[0]
+            endDate = dates[1]
+    return dataType, startDate, endDate, options
+
 class EventEmitter:
 
     def __init__(self, event_emitter: Callable[[dict], Any] = None):
@@ -48,6 +671,9 @@ class EventEmitter:
         err=None,
         debug="Off"
     ):
+        trace = _TRACE.get()
+        if trace is not None and status == "error":
+            trace.status = "error"
         if debug in {"Basic", "Full"}:
             debugMsg = f"[actual_api_request] {status}: {description}"
             if not err == None:
@@ -65,6 +691,773 @@ class EventEmitter:
                 }
             )
 
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Net worth series: daily points up to two months, weekly up to a year, then month ends
+BALANCE_DAILY_DAYS = 62
+BALANCE_WEEKLY_DAYS = 366
+BALANCE_DEFAULT_DAYS = 30
+
+
+class BalanceHistory:
+    """
+    Daily running balance per account: `running[day, account]` is the sum of every transaction on account
+    code `account` up to and including day ordinal `start + day`, as one (days x accounts) int64 matrix.
+    Built once from an index and updated with the same deltas, so a balance on any day is one row lookup.
+    """
+
+    def __init__(self):
+        self.start = 0
+        self.running = np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.running) - 1
+
+    def apply(self, dates: np.ndarray, accounts: np.ndarray, amounts: np.ndarray):
+        # Adds transactions; negated amounts remove them
+        if not len(dates):
+            return
+        first, last = int(dates.min()), int(dates.max())
+        width = max(self.running.shape[1], int(accounts.max()) + 1)
+        if not len(self.running):
+            self.start = first
+            self.running = np.zeros((last - first + 1, width), dtype=np.int64)
+        else:
+            before = max(0, self.start - first)
+            after = max(0, last - self.end)
+            # Days before the first transaction start from zero, days after the last carry it forward
+            self.running = np.vstack([
+                np.zeros((before, self.running.shape[1]), dtype=np.int64),
+                self.running,
+                np.repeat(self.running[-1:], after, axis=0)
+            ])
+            self.running = np.pad(self.running, ((0, 0), (0, width - self.running.shape[1])))
+            self.start -= before
+        changes = np.zeros_like(self.running)
+        np.add.at(changes, (dates - self.start, accounts), amounts)
+        self.running += np.cumsum(changes, axis=0)
+
+    def at(self, ordinals: np.ndarray) -> np.ndarray:
+        # Running balances at the close of each day: (len(ordinals) x accounts)
+        if not len(self.running):
+            return np.zeros((len(ordinals), 0), dtype=np.int64)
+        rows = np.clip(ordinals - self.start, -1, len(self.running) - 1)
+        result = self.running[np.maximum(rows, 0)]
+        result[rows < 0] = 0
+        return result
+
+
+def balance_points(start: date, end: date) -> List[date]:
+    # Sample dates for the net worth series, always ending on `end`
+    days = (end - start).days + 1
+    if days <= BALANCE_WEEKLY_DAYS:
+        step = 1 if days <= BALANCE_DAILY_DAYS else 7
+        return [end - timedelta(days=n) for n in range(0, days, step)][::-1]
+    points = []
+    month = shift_months(start.replace(day=1), 1)
+    while month <= end:
+        points.append(month - timedelta(days=1))
+        month = shift_months(month, 1)
+    if not points or points[-1] != end:
+        points.append(end)
+    return points
+
+
+class TransactionIndex:
+    """
+    Columnar, in-memory copy of a budget's transactions, kept sorted by date.
+    Dates are ordinals, amounts integer cents and ids/payees/categories/accounts are
+    interned to integer codes, so a date range is two binary searches and a group-by is one `np.bincount`.
+    """
+
+    FIELDS = {
+        "payee": ("payee_name", "No Payee"),
+        "category": ("category_name", "Uncategorized"),
+        "account": ("account_name", "Unknown Account"),
+    }
+
+    def __init__(self, version: Optional[int] = None):
+        self.version = version
+        self.ids = np.empty(0, dtype=np.int64)
+        self.dates = np.empty(0, dtype=np.int32)
+        self.months = np.empty(0, dtype=np.int32)
+        self.amounts = np.empty(0, dtype=np.int64)
+        self.transfers = np.empty(0, dtype=bool)
+        self.memos = np.empty(0, dtype=object)
+        self.codes = {field: np.empty(0, dtype=np.int32) for field in self.FIELDS}
+        self.names = {field: [] for field in self.FIELDS}
+        self.lookup = {field: {} for field in self.FIELDS}
+        self.id_codes = {}
+        self.history = None
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def intern(self, field: str, key: str, name: str) -> int:
+        code = self.lookup[field].get(key)
+        if code is None:
+            code = self.lookup[field][key] = len(self.names[field])
+            self.names[field].append(name)
+        return code
+
+    def rename(self, field: str, key: str, name: str):
+        code = self.lookup[field].get(key)
+        if code is not None and name:
+            self.names[field][code] = name
+
+    def merge(self, transactions: List[dict]):
+        """
+        Applies full or changed transactions (YNAB-style dicts, see `build_transaction_index`):
+        changed and deleted ids are dropped, then live rows are inserted at their sorted date positions.
+        """
+        stale = [
+            self.id_codes[tx["id"]] for tx in transactions if tx["id"] in self.id_codes
+        ]
+        if stale:
+            keep = ~np.isin(self.ids, stale)
+            if self.history is not None:
+                self.history.apply(self.dates[~keep], self.codes["account"][~keep], -self.amounts[~keep])
+            self.ids, self.dates, self.months, self.amounts, self.transfers, self.memos = (
+                self.ids[keep],
+                self.dates[keep],
+                self.months[keep],
+                self.amounts[keep],
+                self.transfers[keep],
+                self.memos[keep],
+            )
+            self.codes = {field: codes[keep] for field, codes in self.codes.items()}
+
+        live = [tx for tx in transactions if not tx.get("deleted", False)]
+        if not live:
+            return
+        days = np.array([tx["date"] for tx in live], dtype="datetime64[D]")
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        live = [live[i] for i in order.tolist()]
+        dates = (days.astype(np.int64) + EPOCH_ORDINAL).astype(np.int32)
+        months = days.astype("datetime64[M]").astype(np.int32) + 1970 * 12
+        ids = np.fromiter(
+            (self.id_codes.setdefault(tx["id"], len(self.id_codes)) for tx in live),
+            np.int64,
+            len(live),
+        )
+        amounts = np.fromiter((tx.get("amount", 0) for tx in live), np.int64, len(live))
+        transfers = np.fromiter((bool(tx.get("transfer_account_id")) for tx in live), bool, len(live))
+        codes = {}
+        for field, (key, default) in self.FIELDS.items():
+            names = [tx.get(key) or default for tx in live]
+            keys = names
+            if field == "account":
+                # Accounts are interned by id so renames apply to older transactions too
+                keys = [tx.get("account_id") or name for tx, name in zip(live, names)]
+            lookup = {
+                k: self.intern(field, k, name) for k, name in dict(zip(keys, names)).items()
+            }
+            codes[field] = np.fromiter(map(lookup.__getitem__, keys), np.int32, len(live))
+
+        positions = np.searchsorted(self.dates, dates, side="right")
+        self.ids = np.insert(self.ids, positions, ids)
+        self.dates = np.insert(self.dates, positions, dates)
+        self.months = np.insert(self.months, positions, months)
+        self.amounts = np.insert(self.amounts, positions, amounts)
+        self.transfers = np.insert(self.transfers, positions, transfers)
+        memos = np.empty(len(live), dtype=object)
+        memos[:] = [tx.get("memo") or "" for tx in live]
+        self.memos = np.insert(self.memos, positions, memos)
+        self.codes = {
+            field: np.insert(self.codes[field], positions, codes[field])
+            for field in self.FIELDS
+        }
+        if self.history is not None:
+            self.history.apply(dates, codes["account"], amounts)
+
+    def balance_history(self) -> BalanceHistory:
+        # Built on first use; `merge` keeps it current from then on
+        if self.history is None:
+            self.history = BalanceHistory()
+            self.history.apply(self.dates, self.codes["account"], self.amounts)
+        return self.history
+
+    def balances(self, accounts: List[dict], startDate: str, endDate: str) -> tuple:
+        """
+        Opening/closing balance per account and a sampled net worth series for the date range, in cents.
+        `accounts` hold each account's current `balance`; a past balance is the current one minus
+        everything after that day (which also covers the Starting Balances left out of the index).
+        """
+        history = self.balance_history()
+        start = date.fromisoformat(startDate)
+        end = date.fromisoformat(endDate)
+        points = balance_points(start, end)
+        ordinals = np.array(
+            [(start - timedelta(days=1)).toordinal()] + [day.toordinal() for day in points],
+            dtype=np.int64
+        )
+        running = history.at(np.append(ordinals, max(history.end, ordinals[-1])))
+        rows = []
+        series = np.zeros(len(ordinals), dtype=np.int64)
+        for acc in accounts:
+            code = self.lookup["account"].get(acc["id"])
+            if code is None or code >= running.shape[1]:
+                values = np.full(len(ordinals), acc.get("balance", 0), dtype=np.int64)
+            else:
+                values = running[:-1, code] - running[-1, code] + acc.get("balance", 0)
+            series += values
+            opening, closing = int(values[0]), int(values[-1])
+            if opening or closing:
+                rows.append({"account": acc.get("name"), "opening": opening, "closing": closing, "change": closing - opening})
+        opening, closing = int(series[0]), int(series[-1])
+        rows.append({"account": "Net Worth", "opening": opening, "closing": closing, "change": closing - opening})
+        netWorth = [
+            {"date": day.isoformat(), "net_worth": int(series[n + 1]), "change": int(series[n + 1] - series[n])}
+            for n, day in enumerate(points)
+        ]
+        return rows, netWorth
+
+    def select(
+        self,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None,
+        scope: Optional[dict] = None
+    ):
+        """
+        Returns the date range as a slice, or as an array of positions when narrowed by a `find_scope` scope.
+        """
+        start = 0
+        end = len(self.dates)
+        if startDate:
+            start = int(
+                np.searchsorted(self.dates, date.fromisoformat(startDate).toordinal())
+            )
+        if endDate:
+            end = int(
+                np.searchsorted(
+                    self.dates, date.fromisoformat(endDate).toordinal(), side="right"
+                )
+            )
+        window = slice(start, max(start, end))
+        if not scope:
+            return window
+        mask = np.ones(window.stop - window.start, dtype=bool)
+        for field, (key, name) in scope.items():
+            code = self.lookup[field].get(key if field == "account" else name)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.codes[field][window] == code
+        return np.flatnonzero(mask) + window.start
+
+    def rows(self, window) -> Iterable[dict]:
+        payees, categories, accounts = (
+            self.names["payee"],
+            self.names["category"],
+            self.names["account"],
+        )
+        isoDates = {}
+        for ordinal, amount, payee, category, account, memo in zip(
+            self.dates[window].tolist(),
+            self.amounts[window].tolist(),
+            self.codes["payee"][window].tolist(),
+            self.codes["category"][window].tolist(),
+            self.codes["account"][window].tolist(),
+            self.memos[window],
+        ):
+            if ordinal not in isoDates:
+                isoDates[ordinal] = date.fromordinal(ordinal).isoformat()
+            yield {
+                "date": isoDates[ordinal],
+                "payee": payees[payee],
+                "amount": amount,
+                "category": categories[category],
+                "account": accounts[account],
+                "notes": memo,
+            }
+
+    def group(self, window, groupBy: str) -> List[dict]:
+        """
+        Outflow (as a positive number), inflow and net per group in integer cents, computed with vectorized counts/sums.
+        Transfers between accounts are neither spending nor income and are left out.
+        Months are listed chronologically, other groups largest outflow first, followed by an overall total.
+        """
+        keep = ~self.transfers[window]
+        keys = (self.months if groupBy == "month" else self.codes[groupBy])[window][keep]
+        if not len(keys):
+            return []
+        amounts = self.amounts[window][keep]
+        base = int(keys.min())
+        counts = np.bincount(keys - base)
+        # float64 sums are exact for anything below 2**53 cents
+        outflows = -np.rint(np.bincount(keys - base, weights=np.minimum(amounts, 0))).astype(np.int64)
+        inflows = np.rint(np.bincount(keys - base, weights=np.maximum(amounts, 0))).astype(np.int64)
+        groups = {}
+        for code in np.nonzero(counts)[0].tolist():
+            if groupBy == "month":
+                label = f"{(base + code) // 12:04d}-{(base + code) % 12 + 1:02d}"
+            else:
+                label = self.names[groupBy][base + code]
+            groups[label] = (int(outflows[code]), int(inflows[code]), int(counts[code]))
+        return aggregate_result(groups, groupBy)
+
+
+def name_lookup(session, table) -> Dict[str, str]:
+    # Only ids and names: actualpy's get_accounts/get_categories/get_payees also load every row's transactions
+    query = select(table.id, table.name).where(func.coalesce(table.tombstone, 0) == 0)
+    return dict(session.exec(query).all())
+
+
+def index_lookups(session) -> tuple:
+    # Everything `index_record` resolves ids with; transfer payees ("Transfer : Savings") point at an account
+    transfers = select(Payees.id, Payees.transfer_acct).where(col(Payees.transfer_acct).is_not(None))
+    return (
+        name_lookup(session, Categories),
+        name_lookup(session, Payees),
+        name_lookup(session, Accounts),
+        dict(session.exec(transfers).all())
+    )
+
+
+def account_balances(session) -> List[dict]:
+    """
+    Every open or closed (not deleted) account with its current balance in cents, in Actual's account order.
+    Same sum as actualpy's `Accounts.balance`, in one query; `get_accounts` would also load every transaction.
+    """
+    balance = (
+        select(func.coalesce(func.sum(Transactions.amount), 0))
+        .where(Transactions.acct == Accounts.id, Transactions.is_parent == 0, Transactions.tombstone == 0)
+        .scalar_subquery()
+    )
+    query = (
+        select(Accounts.id, Accounts.name, balance)
+        .where(func.coalesce(Accounts.tombstone, 0) == 0)
+        .order_by(Accounts.sort_order)
+    )
+    return [
+        {"id": accountId, "name": name, "balance": int(cents)}
+        for accountId, name, cents in session.exec(query).all()
+    ]
+
+
+def index_record(tx, lookups: tuple) -> Optional[dict]:
+    # YNAB-style dict for `TransactionIndex.merge`, or None for Starting Balances (these aren't "transactions")
+    category_lookup, payee_lookup, account_lookup, transfer_lookup = lookups
+    category = category_lookup.get(tx.category_id)
+    payee = payee_lookup.get(tx.payee_id)
+    if category in {"Starting Balances", "Starting Balance"} or payee in {"Starting Balances", "Starting Balance"}:
+        return None
+    return {
+        "id": tx.id,
+        "date": tx.get_date().isoformat(),
+        "amount": tx.amount,
+        "payee_name": payee,
+        "category_name": category,
+        "account_id": tx.acct,
+        "account_name": account_lookup.get(tx.acct),
+        "transfer_account_id": transfer_lookup.get(tx.payee_id),
+        "memo": tx.notes
+    }
+
+
+def build_transaction_index(
+    session,
+    startDate: Optional[str] = None,
+    endDate: Optional[str] = None
+) -> TransactionIndex:
+    with span("index") as record:
+        # One query (the whole budget, or just the routed dates); names are resolved with bulk lookups
+        lookups = index_lookups(session)
+        transactions = []
+        # actualpy's end_date is exclusive
+        query = get_transactions(
+            session,
+            start_date=date.fromisoformat(startDate) if startDate else None,
+            end_date=date.fromisoformat(endDate) + timedelta(days=1) if endDate else None
+        )
+        for tx in query:
+            item = index_record(tx, lookups)
+            if item is not None:
+                transactions.append(item)
+        index = TransactionIndex()
+        index.merge(transactions)
+        record["rows"] = len(index)
+    return index
+
+
+def build_detached_index(engine) -> TransactionIndex:
+    # Own session on the same SQLite file: the pooled session keeps answering questions meanwhile
+    with Session(engine) as session:
+        return build_transaction_index(session)
+
+
+def budget_name_map(session) -> Dict[str, Dict[str, tuple]]:
+    # Same shape as `index_name_map`, for every name in the budget (a date-bounded index only holds some)
+    return {
+        "account": {name.lower(): (accountId, name) for accountId, name in name_lookup(session, Accounts).items() if name},
+        "category": {name.lower(): (None, name) for name in name_lookup(session, Categories).values() if name},
+        "payee": {name.lower(): (None, name) for name in name_lookup(session, Payees).values() if name}
+    }
+
+
+def index_name_map(index: TransactionIndex) -> Dict[str, Dict[str, tuple]]:
+    # {kind: {lowercase name: (id, name)}} for `find_scope`; accounts are interned by id, payees/categories by name
+    return {
+        "account": {
+            index.names["account"][code].lower(): (accountId, index.names["account"][code])
+            for accountId, code in index.lookup["account"].items()
+            if index.names["account"][code]
+        },
+        "category": {name.lower(): (None, name) for name in index.names["category"]},
+        "payee": {name.lower(): (None, name) for name in index.names["payee"]}
+    }
+
+
+# Names too short or too common in questions themselves ("transfer to savings", "cash spending") to narrow by
+SCOPE_MIN_NAME_LENGTH = 3
+SCOPE_STOP_NAMES = {"transfer", "transfers", "cash", "home", "other", "misc", "spending", "income", "payment", "payments"}
+
+
+def find_scope(query: str, nameMap: Dict[str, Dict[str, tuple]]) -> Dict[str, tuple]:
+    """
+    Finds accounts, categories and payees named in the query (whole phrases at word boundaries, longest name first).
+    Names shorter than SCOPE_MIN_NAME_LENGTH or in SCOPE_STOP_NAMES are ignored.
+    Returns {kind: (id, name)}, with at most one entry per kind.
+    """
+    text = query.lower()
+    candidates = []
+    for kind, names in nameMap.items():
+        for lowered, entry in names.items():
+            # Cheap substring test first; only hits pay for the word-boundary regex
+            if len(lowered) < SCOPE_MIN_NAME_LENGTH or lowered in SCOPE_STOP_NAMES or lowered not in text:
+                continue
+            match = re.search(rf"(?<!\w){re.escape(lowered)}(?!\w)", text)
+            if match:
+                candidates.append((match, kind, entry))
+    scope = {}
+    taken = []
+    for match, kind, entry in sorted(
+        candidates, key=lambda candidate: -len(candidate[0].group(0))
+    ):
+        # "Chase Checking" (account) wins over "Chase" (payee) inside it
+        if kind in scope or any(
+            match.start() < end and start < match.end() for start, end in taken
+        ):
+            continue
+        scope[kind] = entry
+        taken.append(match.span())
+    return scope
+
+
+# Changes to these tables can rename or remove what the index has interned, so they trigger a full rebuild
+INDEX_NAME_TABLES = (Accounts, Categories, Payees)
+
+
+def update_transaction_index(index: TransactionIndex, session, changes: list) -> bool:
+    """
+    Applies the changesets returned by `Actual.sync` to `index` in place: only the changed transactions are read back.
+    Returns False if the index has to be rebuilt instead (an account, category or payee changed).
+    """
+    transactions = changed_index_records(session, changes)
+    if transactions is None:
+        return False
+    index.merge(transactions)
+    return True
+
+
+def changed_index_records(session, changes: list) -> Optional[List[dict]]:
+    """
+    Reads back the transactions changed by `Actual.sync` changesets, as `TransactionIndex.merge` input
+    (removed ones as {"id": ..., "deleted": True}). Returns None if the index has to be rebuilt instead.
+    """
+    changed = set()
+    for change in changes:
+        if change.table in INDEX_NAME_TABLES:
+            return None
+        if change.table is Transactions:
+            changed.add(change.id)
+    if not changed:
+        return []
+    with span("index") as record:
+        lookups = index_lookups(session)
+        found = {}
+        ids = sorted(changed)
+        for start in range(0, len(ids), 500):
+            # populate_existing: the session may still hold these rows as they were before the sync
+            query = (
+                select(Transactions)
+                .where(col(Transactions.id).in_(ids[start:start + 500]))
+                .execution_options(populate_existing=True)
+            )
+            for tx in session.exec(query).all():
+                found[tx.id] = tx
+        transactions = []
+        for txId in ids:
+            tx = found.get(txId)
+            # Same rows as `get_transactions`: live, dated, in an account, no split parents
+            live = tx is not None and not tx.tombstone and not tx.is_parent and tx.date and tx.acct
+            item = index_record(tx, lookups) if live else None
+            transactions.append(item if item is not None else {"id": txId, "deleted": True})
+        record["rows"] = len(transactions)
+    return transactions
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight call and its result (callers must not mutate it).
+    Keeps counts of upstream calls made and calls that were coalesced into one already running.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[Any, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        # A cancelled or timed-out caller must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Any, task: asyncio.Future):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller has gone away
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+# Shared work per kind of call; see `flight_stats` for what was coalesced
+_FLIGHTS: Dict[str, SingleFlight] = {
+    "open": SingleFlight(),
+}
+
+
+def flight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _FLIGHTS.items()}
+
+
+class ActualSession:
+    """
+    An opened (logged in, downloaded and decrypted) Actual budget, kept alive between tool calls.
+    """
+
+    def __init__(self, actual: Actual):
+        self.actual = actual
+        self.opened_at = time.monotonic()
+        self.last_used = self.opened_at
+        self.last_sync = self.opened_at
+        self.lock = asyncio.Lock()
+        self.users = 0
+        # Columnar transaction index, built lazily and kept current with each sync's changesets
+        self.index: Optional[TransactionIndex] = None
+        # Background build of that index (see `start_index_build`) and a count of syncs that changed the budget
+        self.building: Optional[asyncio.Future] = None
+        self.generation = 0
+
+    async def read(self, read: Callable, *args) -> Any:
+        # The pooled SQLAlchemy session isn't thread-safe: one worker thread at a time, under `lock`
+        async with self.lock:
+            return await asyncio.to_thread(read, self.actual.session, *args)
+
+    def close(self):
+        try:
+            self.actual.__exit__(None, None, None)
+        except Exception as e:
+            print(f"[actual_api_request] Error closing Actual session: {e}")
+
+
+def start_index_build(entry: ActualSession) -> asyncio.Future:
+    """
+    Starts (or joins) building `entry`'s full transaction index in a worker thread and returns the task.
+    The index is only installed if no sync changed the budget while it was read; otherwise the next cold question starts over.
+    """
+    if entry.building is None or entry.building.done():
+        entry.building = asyncio.ensure_future(install_index(entry))
+        # Mark as retrieved even if every caller has gone away
+        entry.building.add_done_callback(lambda task: task.cancelled() or task.exception())
+    return entry.building
+
+
+async def install_index(entry: ActualSession) -> TransactionIndex:
+    generation = entry.generation
+    index = await asyncio.to_thread(build_detached_index, entry.actual.engine)
+    if entry.generation == generation and entry.index is None:
+        entry.index = index
+    return index
+
+
+_SESSION_POOL: Dict[str, ActualSession] = {}
+_SESSION_POOL_LOCK = asyncio.Lock()
+
+
+def session_key(base_url: str, password: str, encryption_password: str, file: str) -> str:
+    # Hash the credentials so they are never kept around as a plain dict key
+    raw = "\0".join([base_url.rstrip("/"), file, password, encryption_password or ""])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def open_actual(base_url: str, password: str, encryption_password: str, file: str) -> Actual:
+    # Same as entering `with Actual(...)`: log in, download and decrypt the budget file
+    actual = Actual(
+        base_url=base_url,
+        password=password,
+        encryption_password=encryption_password,
+        file=file
+    )
+    actual.__enter__()
+    return actual
+
+
+def evict_idle_sessions(idle_ttl: int):
+    now = time.monotonic()
+    for key, entry in list(_SESSION_POOL.items()):
+        if now - entry.last_used > idle_ttl and not entry.users:
+            del _SESSION_POOL[key]
+            entry.close()
+
+
+async def open_session(key: str, valves) -> ActualSession:
+    # Login and budget download
+    with span("session"):
+        actual = await asyncio.to_thread(
+            open_actual,
+            valves.BASE_URL,
+            valves.PASSWORD,
+            valves.ENCRYPTION_PASSWORD,
+            valves.FILE_BUDGET_NAME,
+        )
+    entry = ActualSession(actual)
+    _SESSION_POOL[key] = entry
+    return entry
+
+
+@asynccontextmanager
+async def pooled_actual(valves, force_sync: bool = False):
+    """
+    Yields an opened `ActualSession` (budget plus transaction index) from the process-wide session pool.
+    The budget is only downloaded when no session exists yet; afterwards it is refreshed
+    with actualpy's incremental sync every `SESSION_SYNC_INTERVAL` seconds (or when forced).
+    """
+    key = session_key(
+        valves.BASE_URL, valves.PASSWORD, valves.ENCRYPTION_PASSWORD, valves.FILE_BUDGET_NAME
+    )
+    async with _SESSION_POOL_LOCK:
+        evict_idle_sessions(valves.SESSION_IDLE_TTL)
+        entry = _SESSION_POOL.get(key)
+    opened = entry is None
+    if opened:
+        # Concurrent first questions share one login + download; other budgets are not held up
+        entry = await _FLIGHTS["open"].run(key, lambda: open_session(key, valves))
+
+    entry.users += 1
+    try:
+        # Held while the session syncs and updates the index, not for the whole question (see `ActualSession.read`)
+        async with entry.lock:
+            # A session that was just opened already holds the latest budget
+            stale = time.monotonic() - entry.last_sync >= valves.SESSION_SYNC_INTERVAL
+            if not opened and (force_sync or stale):
+                try:
+                    with span("sync"):
+                        changes = await asyncio.to_thread(entry.actual.sync)
+                except Exception as e:
+                    # Expired token, server restart, etc.: start over with a fresh session
+                    print(f"[actual_api_request] Actual sync failed, reopening session: {e}")
+                    entry.close()
+                    entry.actual = await asyncio.to_thread(
+                        open_actual,
+                        valves.BASE_URL,
+                        valves.PASSWORD,
+                        valves.ENCRYPTION_PASSWORD,
+                        valves.FILE_BUDGET_NAME,
+                    )
+                    entry.opened_at = time.monotonic()
+                    changes = None
+                entry.last_sync = time.monotonic()
+                if changes is None or changes:
+                    entry.generation += 1
+                # The index follows the sync's changesets; a reopened budget may differ in any way
+                if entry.index is not None:
+                    transactions = None
+                    if changes is not None:
+                        transactions = await asyncio.to_thread(changed_index_records, entry.actual.session, changes)
+                    if transactions is None:
+                        entry.index = None
+                    else:
+                        # On the event loop, so questions never see a half-merged index
+                        entry.index.merge(transactions)
+        yield entry
+    finally:
+        entry.last_used = time.monotonic()
+        entry.users -= 1
+        if valves.SESSION_IDLE_TTL <= 0 and not entry.users:
+            # Pooling disabled: behave like a one-off `with Actual(...)` block
+            if _SESSION_POOL.get(key) is entry:
+                del _SESSION_POOL[key]
+            entry.close()
+
+
+def in_quiet_hours(spec: str, now: datetime) -> bool:
+    # "23-7" = from 23:00 until 07:00 local time; empty or malformed = never quiet
+    match = re.fullmatch(r"\s*(\d{1,2})\s*-\s*(\d{1,2})\s*", spec or "")
+    if not match:
+        return False
+    start, end = int(match.group(1)) % 24, int(match.group(2)) % 24
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+# One background task per process; it always reads the valves of the latest Tools instance
+_PREFETCHER: Dict[str, Any] = {"task": None, "tools": None}
+
+
+def start_prefetch(tools):
+    _PREFETCHER["tools"] = tools
+    if not tools.valves.PREFETCH:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop yet; the first tool call starts it instead
+        return
+    task = _PREFETCHER["task"]
+    if task is None or task.done() or task.get_loop() is not loop:
+        _PREFETCHER["task"] = loop.create_task(prefetch_loop())
+
+
+async def prefetch_loop():
+    while True:
+        valves = _PREFETCHER["tools"].valves
+        if not valves.PREFETCH:
+            return
+        if not in_quiet_hours(valves.PREFETCH_QUIET_HOURS, datetime.now()):
+            started = time.monotonic()
+            try:
+                result = await prefetch_budget(valves)
+            except Exception as e:
+                result = f"failed ({e})"
+            if valves.DEBUG in {"Basic", "Full"}:
+                print(f"[actual_api_request] Prefetch: {result} in {time.monotonic() - started:.2f}s")
+        await asyncio.sleep(max(60, valves.PREFETCH_INTERVAL))
+
+
+async def prefetch_budget(valves) -> str:
+    """
+    Keeps the configured budget warm: opens or syncs the pooled session and (re)builds its transaction index.
+    """
+    if not valves.PASSWORD or not valves.FILE_BUDGET_NAME:
+        return "skipped (no budget configured)"
+    if valves.SESSION_IDLE_TTL <= 0:
+        return "skipped (session pooling is off)"
+    async with pooled_actual(valves, force_sync=True) as pooled:
+        index = pooled.index or await asyncio.shield(start_index_build(pooled))
+        return f"budget synced, {len(index)} transactions indexed"
+
+
 class Tools:
 
     class Valves(BaseModel):
@@ -95,9 +1488,9 @@ class Tools:
             description="Currency format. Actual is currency agnostic, so this is purely for the LLM's awareness.",
             required=True
         )
-        CONTEXT_FORMAT: Literal["JSON", "Markdown", "Plaintext"] = Field(
+        CONTEXT_FORMAT: Literal["JSON", "Markdown", "Plaintext", "Compact", "Auto"] = Field(
             default="JSON",
-            description="How to format data passed to LLM for context: JSON, Markdown, Plaintext",
+            description="How to format data passed to LLM for context: JSON, Markdown, Plaintext, Compact (names listed once, rows carry short ids and integer cents), Auto (whichever of these uses the fewest tokens)",
             required=True
         )
         DEBUG: Literal["Off", "Basic", "Full"] = Field(
@@ -110,13 +1503,61 @@ class Tools:
             description="Enables in-line 'citations', proving response is sourced from real Actual data. Looks messy, but is useful for debugging/differentiating from hallucinations",
             required=False
         )
+        FAST_ROUTER: bool = Field(
+            default=True,
+            title="Fast Router",
+            description="Answer obvious queries ('balance', 'last week', 'in March 2024', 'past 30 days') with built-in rules, only asking the LLM which data to retrieve when unsure",
+            required=False
+        )
+        SESSION_SYNC_INTERVAL: int = Field(
+            default=60,
+            title="Session Sync Interval",
+            description="Seconds between incremental syncs of the open budget with the Actual server. 0 = sync on every question",
+            required=False
+        )
+        SESSION_IDLE_TTL: int = Field(
+            default=1800,
+            title="Session Idle TTL",
+            description="Seconds an unused budget session is kept open before it is closed. 0 = close after every question (no session reuse)",
+            required=False
+        )
+        PREFETCH: bool = Field(
+            default=False,
+            title="Background Prefetch",
+            description="Keep the budget warm by syncing it in the background, so questions are answered from fresh local data. Requires 'Session Idle TTL' > 0",
+            required=False
+        )
+        PREFETCH_INTERVAL: int = Field(
+            default=900,
+            title="Prefetch Interval",
+            description="Seconds between background syncs (minimum 60)",
+            required=False
+        )
+        PREFETCH_QUIET_HOURS: str = Field(
+            default="",
+            title="Prefetch Quiet Hours",
+            description="(Optional) Local hours with no background syncs, e.g. '23-7'",
+            required=False
+        )
+        METRICS_DIR: str = Field(
+            default="",
+            title="Metrics Directory",
+            description="(Optional) Directory where each call appends its per-stage timings and row/token counts to 'actual_api_request.jsonl' and rewrites 'actual_api_request.prom' (Prometheus text format, e.g. for node_exporter's textfile collector)",
+            required=False
+        )
         pass
 
     def __init__(self):
         self.valves = self.Valves()
         self.citation = self.valves.CITATIONS
+        # Valves are assigned right after the tool is instantiated, so check them once that is done
+        try:
+            asyncio.get_running_loop().call_soon(start_prefetch, self)
+        except RuntimeError:
+            pass
         pass
 
+    @traced
     async def _run(
         self,
         query: str,
@@ -129,114 +1570,141 @@ class Tools:
         emitter = EventEmitter(__event_emitter__)
         contextFormat = self.valves.CONTEXT_FORMAT
         debugState = self.valves.DEBUG
+        start_prefetch(self)
         
         await emitter.emit(
             description="Determining which Actual data to retrieve...",
             debug=debugState
         )
 
-        # Use LLM to decide which API endpoint to call
-        tools_metadata = [
-            {
-                "id": "accounts",
-                "description": "Retrieve a list of all account and balance details from Actual.",
-            },
-            {
-                "id": "transactions",
-                "description": "Retrieve a list of all financial transaction details from Actual.",
-            },
-        ]
+        # Obvious queries ("balance", "last week", "in March 2024") don't need an LLM round-trip
+        dataType = None
+        startDate = None
+        endDate = None
+        options = {}
+        with span("route"):
+            fastRoute = fast_route(query, date.today()) if self.valves.FAST_ROUTER else None
+        if fastRoute is not None:
+            _ROUTER_STATS["fast"] += 1
+            dataType, startDate, endDate, options = parse_route(fastRoute)
+        else:
+            _ROUTER_STATS["llm"] += 1
+            # Use LLM to decide which API endpoint to call
+            tools_metadata = [
+                {
+                    "id": "accounts",
+                    "description": "Retrieve a list of all account and balance details from Actual.",
+                },
+                {
+                    "id": "balances",
+                    "description": "Retrieve account balances and net worth over a date range from Actual (how balances changed).",
+                },
+                {
+                    "id": "transactions",
+                    "description": "Retrieve a list of all financial transaction details from Actual.",
+                },
+                {
+                    "id": "aggregate",
+                    "description": "Retrieve outflow (spending), inflow (income) and net totals, counts and averages of Actual transactions grouped by category, payee, account or month. Transfers between accounts are left out.",
+                }
+            ]
 
-        system_prompt = f"""
-            You are an assistant retrieving Actual Budget financial data based on a user's query.
+            system_prompt = f"""
+                You are an assistant retrieving Actual Budget financial data based on a user's query.
 
-            Choose one of the tools below:
-            {tools_metadata}
+                Choose one of the tools below:
+                {tools_metadata}
 
-            Return a list:
-            - [] if no tool applies
-            - ['accounts'] for account/balance-related queries
-            - ['transactions'] for transaction queries with no clear date range
-            - ['transactions', startDate, endDate] for transaction queries with a clear date range
+                Return a list:
+                - [] if no tool applies
+                - ['accounts'] for current account/balance-related queries
+                - ['balances'] or ['balances', startDate, endDate] for how balances or net worth changed over time
+                - ['transactions'] for transaction queries with no clear date range
+                - ['transactions', startDate, endDate] for transaction queries with a clear date range
+                - ['aggregate', groupBy] or ['aggregate', groupBy, startDate, endDate] for questions about totals, sums or averages ("how much", "total", "breakdown", "monthly"), where groupBy is one of 'category', 'payee', 'account', 'month'
 
             
-            For 'transactions':
-            - If the query uses **explicit calendar language** (e.g. "2nd week of May", "March 2024", "May 5–9"), interpret it literally and return accurate ISO 8601 start and end dates.
-            - If the query uses **relative time** (e.g. "last week", "past 3 days", "this month"), compute dates relative to today ({str(date.today())}).
-            - If no date is mentioned, return ['transactions'] without dates.
-
-            Examples:
-            - "What's in my checking account?" → ['accounts']
-            - "How much did I spend last week?" → ['transactions', '2025-05-27', '2025-06-02']
-            - "How much did I spend on groceries?" → ['transactions']
-            - "How much did I spend in the 2nd week of May?" → ['transactions', '2025-05-05', '2025-05-11']
-
-            Only return the list. No explanations.
-            """
-
-        prompt = f"Query: {query}"
-
-        payload = {
-            "model": __model__.get("id") if isinstance(__model__, dict) else __model__,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False
-        }
+                For 'balances', 'transactions' and 'aggregate':
+                - If the query uses **explicit calendar language** (e.g. "2nd week of May", "March 2024", "May 5–9"), interpret it literally and return accurate ISO 8601 start and end dates.
+                - If the query uses **relative time** (e.g. "last week", "past 3 days", "this month"), compute dates relative to today ({str(date.today())}).
+                - If no date is mentioned, return ['balances'], ['transactions'] or ['aggregate', groupBy] without dates.
 
-        try:
-            user = Users.get_user_by_id(__user__["id"])
-            response = await generate_chat_completion(
-                request=__request__, form_data=payload, user=user
-            )
-            content = response["choices"][0]["message"]["content"]
-            content = content.replace("'", '"')
-            match = re.search(r"\[.*?\]", content)
-            dataType = None
-            startDate = None
-            endDate = None
-            if match:
-                try:
-                    params = json.loads(match.group(0))
-                    if debugState == "Full":
-                        print(f'LLM Response: {params}')
-                    if isinstance(params, list) and params:
-                        dataType = params[0]
-                        if len(params) == 2:
-                            startDate = params[1]
-                            endDate = str(date.today())
-                        elif len(params) == 3:
-                            startDate = params[1]
-                            endDate = params[2]
+                Examples:
+                - "What's in my checking account?" → ['accounts']
+                - "How has my net worth changed since March?" → ['balances', '2025-03-01', '2025-06-03']
+                - "What did I buy last week?" → ['transactions', '2025-05-27', '2025-06-02']
+                - "How much did I spend on groceries?" → ['aggregate', 'category']
+                - "How much did I spend at Costco in the 2nd week of May?" → ['aggregate', 'payee', '2025-05-05', '2025-05-11']
+                - "What was my monthly spending this year?" → ['aggregate', 'month', '2025-01-01', '2025-06-03']
+
+                Only return the list. No explanations.
+                """
+
+            prompt = f"Query: {query}"
+
+            payload = {
+                "model": __model__.get("id") if isinstance(__model__, dict) else __model__,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "stream": False
+            }
+
+            try:
+                user = Users.get_user_by_id(__user__["id"])
+                with span("llm"):
+                    response = await generate_chat_completion(
+                        request=__request__, form_data=payload, user=user
+                    )
+                content = response["choices"][0]["message"]["content"]
+                content = content.replace("'", '"')
+                match = re.search(r"\[.*?\]", content)
+                if match:
+                    try:
+                        params = json.loads(match.group(0))
                         if debugState == "Full":
-                            print(f"Parsed dataType: {dataType}")
-                            print(f"Parsed startDate: {startDate}")
-                            print(f"Parsed endDate: {endDate}")
-                except json.JSONDecodeError:
-                    pass
-        except Exception as e:
-            determinationError = "Error occurred while determining what Actual data to retrieve."
-            await emitter.emit(
-                status="error",
-                description=f"{determinationError} {e}",
-                done=True,
-                err=e,
-                debug=debugState
-            )
-            return determinationError
+                            print(f'LLM Response: {params}')
+                        dataType, startDate, endDate, options = parse_route(params)
+                    except json.JSONDecodeError:
+                        pass
+            except Exception as e:
+                determinationError = "Error occurred while determining what Actual data to retrieve."
+                await emitter.emit(
+                    status="error",
+                    description=f"{determinationError} {e}",
+                    done=True,
+                    err=e,
+                    debug=debugState
+                )
+                return determinationError
+
+        if debugState == "Full":
+            print(f"Parsed dataType: {dataType}")
+            print(f"Parsed startDate: {startDate}")
+            print(f"Parsed endDate: {endDate}")
+        if debugState in {"Basic", "Full"}:
+            print(f"[actual_api_request] Router: {'fast path' if fastRoute is not None else 'LLM'} {router_stats()}")
+            print(f"[actual_api_request] Coalesced calls: {flight_stats()}")
 
         await emitter.emit(
             description="Opening Actual session...",
             debug=debugState
         )
 
-        with Actual(
-            base_url=self.valves.BASE_URL,
-            password=self.valves.PASSWORD,
-            encryption_password=self.valves.ENCRYPTION_PASSWORD,
-            file=self.valves.FILE_BUDGET_NAME
-        ) as actual:
+        async with AsyncExitStack() as stack:
+            try:
+                pooled = await stack.enter_async_context(pooled_actual(self.valves))
+            except Exception as e:
+                sessionFail = "Opening the Actual budget failed."
+                await emitter.emit(
+                    status="error",
+                    description=sessionFail,
+                    done=True,
+                    err=e,
+                    debug=debugState
+                )
+                return f"{sessionFail} Error: {str(e)}"
 
             if dataType == "accounts":
                 
@@ -246,38 +1714,26 @@ class Tools:
                 )
 
                 try:
-                    processed_accounts_json = {"All Actual Accounts": []}
-                    processed_accounts_markdown = """
-                        | Account Name | Balance |\n
-                        | --- | ---: |\n
-                        """
-                    processed_accounts_plaintext = "All Actual Accounts:\n"
-                    for acc in get_accounts(actual.session):
-                        balance = round(float(acc.balance), 2)
-                        processed_accounts_json["All Actual Accounts"].append({
-                            "name": acc.name,
-                            "balance": balance
-                        })
-                        processed_accounts_markdown += f"| {acc.name} | {balance} |\n"
-                        processed_accounts_plaintext += f"- {acc.name}: {balance}\n"
+                    with span("fetch") as record:
+                        accounts = await pooled.read(account_balances)
+                        record["rows"] = len(accounts)
+                    processed_accounts, _ = render_context(
+                        "All Actual Accounts",
+                        ACCOUNT_COLUMNS,
+                        accounts,
+                        contextFormat,
+                        ACCOUNT_PLAINTEXT,
+                        display=lambda cents: round(cents / 100, 2)
+                    )
                     await emitter.emit(
                         status="complete",
                         description="Actual account data fetched successfully",
                         done=True,
                         debug=debugState
                     )
-                    if contextFormat == "JSON":
-                        if debugState == "Full":
-                            print(processed_accounts_json)
-                        return processed_accounts_json
-                    elif contextFormat == "Markdown":
-                        if debugState == "Full":
-                            print(processed_accounts_markdown)
-                        return processed_accounts_markdown
-                    elif contextFormat == "Plaintext":
-                        if debugState == "Full":
-                            print(processed_accounts_plaintext)
-                        return processed_accounts_plaintext
+                    if debugState == "Full":
+                        print(processed_accounts)
+                    return processed_accounts
                 except Exception as e:
                     acctFail = "Actual account data fetch failed."
                     await emitter.emit(
@@ -289,7 +1745,7 @@ class Tools:
                     )
                     return f"{acctFail} Error: {str(e)}"
                 
-            elif dataType == "transactions":
+            elif dataType in {"transactions", "aggregate"}:
                 
                 await emitter.emit(
                     description="Fetching Actual transaction data",
@@ -297,59 +1753,58 @@ class Tools:
                 )
 
                 try:
-                    categories = get_categories(actual.session)
-                    category_lookup = {cat.id: cat.name for cat in categories}
-
-                    payees = get_payees(actual.session)
-                    payee_lookup = {pay.id: pay.name for pay in payees}
-
-                    transactions = get_transactions(actual.session, startDate, endDate)
-
-                    processed_transactions_json = {"All Actual Transactions": []}
-                    processed_transactions_markdown = """
-                        | Transaction Date | Payee | Amount | Category | Account | Notes |\n
-                        | --- | --- | ---: | --- | --- | --- |\n
-                        """
-                    processed_transactions_plaintext = "All Actual Transactions:\n"
-                    for tx in get_transactions(actual.session):
-                        account_obj = get_account(actual.session, tx.acct)
-                        account = account_obj.name if account_obj else "Unknown Account"
-                        category = category_lookup.get(tx.category_id, "Uncategorized")
-                        payee = payee_lookup.get(tx.payee_id, "No Payee")
-                        
-                        # Filter out Starting Balances (these aren't "transactions")
-                        isStartingBalance = (category in {"Starting Balances", "Starting Balance"}) or (payee in {"Starting Balances", "Starting Balance"})
-                        if not isStartingBalance:
-                            transactionDate = tx.get_date().isoformat()
-                            amount = format_currency(float(tx.amount/100))
-                            processed_transactions_json["All Actual Transactions"].append({
-                                "date": transactionDate,
-                                "payee": payee,
-                                "amount": amount,
-                                "category": category,
-                                "account": account,
-                                "notes": tx.notes
-                            })
-                            processed_transactions_markdown += f"| {transactionDate} | {payee} | {amount} | {category} | {account} | {tx.notes} |\n"
-                            processed_transactions_plaintext += f"- Date: {transactionDate}, Payee: {payee}, Amount: {amount}, Category: {category}, Account: {account}, Notes: {tx.notes}\n"
+                    index = pooled.index
+                    nameMap = None
+                    if index is None:
+                        building = start_index_build(pooled)
+                        if startDate or endDate:
+                            # Cold session: answer from one date-bounded query while the full index builds
+                            index = await pooled.read(build_transaction_index, startDate, endDate)
+                            nameMap = await pooled.read(budget_name_map)
+                        else:
+                            index = await asyncio.shield(building)
+                    # Questions naming an account, category or payee only get its transactions
+                    scope = find_scope(query, nameMap or index_name_map(index))
+                    scopeLabel = ", ".join(f"{kind}: {entry[1]}" for kind, entry in scope.items())
+                    scopeLabel = f" ({scopeLabel})" if scopeLabel else ""
+                    # Binary search over the date-sorted index instead of a query per question
+                    with span("filter") as record:
+                        window = index.select(startDate, endDate, scope)
+                        record["rows"] = len(index.dates[window])
+
+                    if dataType == "aggregate":
+                        groupBy = options.get("groupBy", "category")
+                        # Sum integer cents and only format the (few) totals
+                        with span("filter"):
+                            rows = index.group(window, groupBy)
+                        transactionCount = rows[-1]["count"] if rows else 0
+                        for row in rows:
+                            row["average"] = round(row["net"] / row["count"])
+                        period = f" ({startDate} to {endDate})" if startDate else ""
+                        processed_transactions, _ = render_context(
+                            f"Actual Outflows and Inflows by {groupBy.capitalize()}, Transfers Excluded{period}{scopeLabel}",
+                            aggregate_columns(groupBy),
+                            rows,
+                            contextFormat,
+                            AGGREGATE_PLAINTEXT
+                        )
+                    else:
+                        processed_transactions, transactionCount = render_context(
+                            f"All Actual Transactions{scopeLabel}",
+                            TRANSACTION_COLUMNS,
+                            index.rows(window),
+                            contextFormat,
+                            TRANSACTION_PLAINTEXT
+                        )
                     await emitter.emit(
                         status="complete",
-                        description="Actual transaction data fetched successfully",
+                        description=f"Actual transaction data fetched successfully ({transactionCount} transactions)",
                         done=True,
                         debug=debugState
                     )
-                    if contextFormat == "JSON":
-                        if debugState == "Full":
-                            print(processed_transactions_json)
-                        return processed_transactions_json
-                    elif contextFormat == "Markdown":
-                        if debugState == "Full":
-                            print(processed_transactions_markdown)
-                        return processed_transactions_markdown
-                    elif contextFormat == "Plaintext":
-                        if debugState == "Full":
-                            print(processed_transactions_plaintext)
-                        return processed_transactions_plaintext
+                    if debugState == "Full":
+                        print(processed_transactions)
+                    return processed_transactions
                 except Exception as e:
                     transactionFail = "Actual transaction data fetch failed."
                     await emitter.emit(
@@ -361,6 +1816,61 @@ class Tools:
                     )
                     return f"{transactionFail} Error: {str(e)}"
 
+            elif dataType == "balances":
+
+                today = date.today()
+                endDate = min(endDate or str(today), str(today))
+                startDate = min(startDate or str(today - timedelta(days=BALANCE_DEFAULT_DAYS)), endDate)
+                await emitter.emit(
+                    description=f"Computing Actual balances from {startDate} to {endDate}...",
+                    debug=debugState
+                )
+
+                try:
+                    # Running balances need the whole history
+                    index = pooled.index or await asyncio.shield(start_index_build(pooled))
+                    with span("fetch") as record:
+                        accounts = await pooled.read(account_balances)
+                        record["rows"] = len(accounts)
+                    with span("filter"):
+                        balanceRows, netWorthRows = index.balances(accounts, startDate, endDate)
+                    period = f"{startDate} to {endDate}"
+                    processed_balances = join_contexts(
+                        render_context(
+                            f"Actual Account Balances ({period})",
+                            BALANCE_COLUMNS,
+                            balanceRows,
+                            contextFormat,
+                            BALANCE_PLAINTEXT
+                        )[0],
+                        render_context(
+                            f"Actual Net Worth ({period})",
+                            NET_WORTH_COLUMNS,
+                            netWorthRows,
+                            contextFormat,
+                            NET_WORTH_PLAINTEXT
+                        )[0]
+                    )
+                    await emitter.emit(
+                        status="complete",
+                        description=f"Actual balances computed successfully ({len(netWorthRows)} dates)",
+                        done=True,
+                        debug=debugState
+                    )
+                    if debugState == "Full":
+                        print(processed_balances)
+                    return processed_balances
+                except Exception as e:
+                    balanceFail = "Actual balance history failed."
+                    await emitter.emit(
+                        status="error",
+                        description=balanceFail,
+                        done=True,
+                        err=e,
+                        debug=debugState
+                    )
+                    return f"{balanceFail} Error: {str(e)}"
+
         # If all else fails...
         
         finalError = "No matching Actual data found."
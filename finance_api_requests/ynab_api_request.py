@@ -3,8 +3,9 @@ title: YNAB API Request
 description: Retrieves user's financial information (accounts or transactions) from YNAB API to answer personal finance questions
 author: megaphonix
 author_url: https://github.com/megaphonixmusic
-version: 0.3.0
+version: 0.4.0
 required_open_webui_version: 0.6.5
+requirements: httpx, numpy, tiktoken
 """
 
 # !!! IMPORTANT: IT IS HIGHLY RECOMMENDED TO ONLY RUN THIS TOOL WITH LOCAL, PRIVATE LLMS !!!
@@ -16,6 +17,23 @@ required_open_webui_version: 0.6.5
 #     Step 1: https://api.ynab.com/#access-token-usage
 #     Step 2: https://api.ynab.com/#response-format
 #
+# v0.4.0 [2026-10-17]
+# - Added local mirror (SQLite) of accounts/transactions, kept in sync with YNAB delta requests
+# - YNAB requests are non-blocking (shared async HTTP client with connection pooling)
+# - Added rule-based fast path for routing obvious queries without an LLM call ('Fast Router' Valve)
+# - Context is rendered in the selected format only, in a single pass
+# - Added 'aggregate' route: outflow/inflow/net totals, counts and averages per category, payee, account or month (transfers left out) are computed in the tool instead of sending every transaction to the LLM
+# - Mirrored transactions are also held in a columnar, date-sorted in-memory index (NumPy), updated with the same deltas
+# - Without the mirror, date ranges are fetched with the cheapest mix of month requests (concurrent, settled months cached with a TTL and size bound, dropped when a sync sees them change) or one since_date request
+# - Questions naming an account, category or payee only fetch/return that entity's transactions (cached name -> id map)
+# - YNAB requests go through a shared rate limiter (200/hour per token): retries with backoff on 429/5xx, coalesces identical requests, serves the mirror when quota is low
+# - Concurrent identical syncs, fetches and name lookups share one upstream call
+# - Added optional background prefetch ('Background Prefetch', 'Prefetch Interval', 'Prefetch Quiet Hours' Valves)
+# - Transaction responses are streamed and parsed item by item (only the needed fields and rows are kept); full syncs are written to the mirror in batches
+# - Added 'Compact' (names listed once, rows carry short ids and integer cents) and 'Auto' (fewest tokens) Context Formats
+# - Added 'balances' route: opening/closing balance per account and a net worth series over a date range, from a daily running-balance history
+# - Added 'Metrics Directory' Valve: per-stage timings (routing, LLM, HTTP, parsing, filtering, rendering) and byte/row/token counts as JSON lines and Prometheus histograms
+#
 # v0.3.0 [2025-06-03]
 # - Updated system prompt and logic for more efficient data filtering by date(s)
 #
@@ -24,14 +42,42 @@ required_open_webui_version: 0.6.5
 # - Added Valves for 'Context Format', 'Debug'
 
 from datetime import datetime, timedelta, date
-from typing import List, Dict, Callable, Any, Optional, Awaitable, Literal
+from typing import List, Dict, Callable, Any, Optional, Awaitable, Literal, Iterable, AsyncIterator
 from pydantic import BaseModel, Field
-import requests
+import httpx
+import numpy as np
+import tiktoken
 import re
 import json
+import os
+import sqlite3
+import asyncio
+import hashlib
+import random
+import time
+import threading
+import weakref
+import functools
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from open_webui.config import CACHE_DIR
 from open_webui.models.users import Users
 from open_webui.utils.chat import generate_chat_completion
 
+YNAB_API_BASE = "https://api.ynab.com/v1"
+HTTP_MAX_CONNECTIONS_PER_HOST = 10
+HTTP_TIMEOUT = 30.0
+# YNAB allows 200 requests per rolling hour for each access token
+YNAB_RATE_LIMIT = 200
+YNAB_RATE_WINDOW = 3600
+# Below this many requests left, answer from cached/mirrored data where possible
+YNAB_LOW_QUOTA = 20
+YNAB_MAX_QUOTA_WAIT = 10.0
+YNAB_RETRIES = 3
+YNAB_RETRY_BACKOFF = 1.0
+
 
 def format_currency(amount: float) -> str:
     if amount < 0:
@@ -40,6 +86,811 @@ def format_currency(amount: float) -> str:
         return f"${amount:,.2f}"
 
 
+# Per event loop: a client's pooled connections (and a semaphore) can't be used from another loop
+_HTTP_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # loop -> httpx.AsyncClient
+_HOST_SEMAPHORES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # loop -> {host: asyncio.Semaphore}
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Async HTTP client of the running event loop: keep-alive connection pooling, HTTP/2 when `h2` is installed.
+    Each loop gets its own client; those of loops that have been closed are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    client = _HTTP_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        # Open connections refer back to their loop, so a closed loop's client is never collected on its own
+        for oldLoop in [oldLoop for oldLoop in _HTTP_CLIENTS if oldLoop.is_closed()]:
+            del _HTTP_CLIENTS[oldLoop]
+            _HOST_SEMAPHORES.pop(oldLoop, None)
+        try:
+            import h2  # noqa: F401
+
+            http2 = True
+        except ImportError:
+            http2 = False
+        client = httpx.AsyncClient(
+            http2=http2,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=60,
+            ),
+        )
+        _HTTP_CLIENTS[loop] = client
+        _HOST_SEMAPHORES[loop] = {}
+    return client
+
+
+async def http_request(
+    method: str, url: str, stream: bool = False, **kwargs
+) -> httpx.Response:
+    # httpx limits are pool-wide, so cap concurrent requests per host separately
+    client = get_http_client()
+    host = urlsplit(url).netloc
+    semaphores = _HOST_SEMAPHORES[asyncio.get_running_loop()]
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    async with semaphores[host]:
+        if stream:
+            # The caller reads the body incrementally and must `aclose()` the response
+            request = client.build_request(method, url, **kwargs)
+            return await client.send(request, stream=True)
+        return await client.request(method, url, **kwargs)
+
+
+# Separators between array items; `raw_decode` does not skip leading whitespace
+JSON_ITEM_GAP = re.compile(r"[\s,]*")
+JSON_SCALAR_MEMBER = re.compile(r'"(\w+)"\s*:\s*(-?\d+(?:\.\d+)?|true|false|null|"[^"\\]*")')
+
+
+async def stream_json_array(
+    chunks: AsyncIterator[str], key: str, meta: Optional[dict] = None
+) -> AsyncIterator[Any]:
+    """
+    Yields the items of the first `"key": [...]` array of a streamed JSON document one at a time,
+    so only the current item (not the whole document) is held in memory.
+    Scalar members before and after the array (e.g. YNAB's `server_knowledge`) are collected into `meta`.
+    """
+    decoder = json.JSONDecoder()
+    opener = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+    buffer = ""
+    head = ""
+    inArray = False
+    tail = None
+    async for chunk in chunks:
+        if tail is not None:
+            tail += chunk
+            continue
+        buffer += chunk
+        if not inArray:
+            match = opener.search(buffer)
+            if not match:
+                # Keep enough for a key split across chunks; the rest only matters for `meta`
+                keep = len(key) + 16
+                head += buffer[:-keep]
+                buffer = buffer[-keep:]
+                continue
+            head += buffer[: match.start()]
+            buffer = buffer[match.end() :]
+            inArray = True
+        position = 0
+        while True:
+            position = JSON_ITEM_GAP.match(buffer, position).end()
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                tail = buffer[position + 1 :]
+                break
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Item continues in the next chunk
+                break
+            yield item
+        buffer = "" if tail is not None else buffer[position:]
+    if tail is None:
+        raise ValueError(f"Truncated JSON response: '{key}' array not complete")
+    if meta is not None:
+        for name, value in JSON_SCALAR_MEMBER.findall(head + tail):
+            meta[name] = json.loads(value)
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight call and its result (callers must not mutate it).
+    Keeps counts of upstream calls made and calls that were coalesced into one already running.
+    """
+
+    def __init__(self):
+        self.inflight: Dict[Any, asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        # A cancelled or timed-out caller must not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Any, task: asyncio.Future):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller has gone away
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+
+# Shared work per kind of call; see `flight_stats` for what was coalesced
+_FLIGHTS: Dict[str, SingleFlight] = {
+    "sync": SingleFlight(),
+    "fetch": SingleFlight(),
+    "names": SingleFlight(),
+}
+
+
+MONTHS = {
+    name: number
+    for number, names in enumerate(
+        [
+            ("january", "jan"),
+            ("february", "feb"),
+            ("march", "mar"),
+            ("april", "apr"),
+            ("may",),
+            ("june", "jun"),
+            ("july", "jul"),
+            ("august", "aug"),
+            ("september", "sept", "sep"),
+            ("october", "oct"),
+            ("november", "nov"),
+            ("december", "dec"),
+        ],
+        start=1,
+    )
+    for name in names
+}
+MONTH_PATTERN = "|".join(sorted(MONTHS, key=len, reverse=True))
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12,
+}
+
+ACCOUNT_INTENT = re.compile(
+    r"\b(balances?|net worth|how much (money )?do i have|accounts?|checking|savings|credit cards?|owe|debt)\b"
+)
+TRANSACTION_INTENT = re.compile(
+    r"\b(spen[dt]|spending|purchas\w*|bought|buy|pay|paid|payments?|transactions?|charges?|charged|expenses?|income|earn\w*|deposits?|transfers?|cost)\b"
+)
+AGGREGATE_INTENT = re.compile(r"\b(how much|total|totals|sum|average|avg|breakdown)\b")
+BALANCE_HISTORY_INTENT = re.compile(
+    r"\b(chang\w*|over time|history|historical|trend\w*|grow\w*|grew|increas\w*|decreas\w*|went (up|down))\b"
+)
+GROUP_BY_WORDS = {
+    "payee": "payee", "merchant": "payee", "account": "account",
+    "month": "month", "monthly": "month", "each month": "month", "category": "category",
+}
+GROUP_BY_PATTERN = re.compile(
+    r"\b(?:by|per) (payee|merchant|account|month|category)\b|\b(monthly|each month)\b"
+)
+# Anything left that looks like a date we didn't resolve sends the query to the LLM
+DATE_WORDS = re.compile(
+    rf"\b({MONTH_PATTERN}|\d{{4}}|\d{{1,2}}(st|nd|rd|th)|\d{{1,2}}/\d{{1,2}}|days?|weeks?|weekends?|months?|years?|quarters?|q[1-4]|today|tonight|yesterday|since|between|ago|until|before|after|(mon|tues|wednes|thurs|fri|satur|sun)day|ytd)\b"
+)
+
+
+def shift_months(day: date, months: int) -> date:
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    month += 1
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return date(year, month, min(day.day, (next_month - timedelta(days=1)).day))
+
+
+def month_range(year: int, month: int) -> tuple:
+    start = date(year, month, 1)
+    return start, shift_months(start, 1) - timedelta(days=1)
+
+
+def relative_range(today: date, amount: str, unit: str) -> tuple:
+    count = NUMBER_WORDS.get(amount) or int(amount or 1)
+    if unit == "day":
+        return today - timedelta(days=count), today
+    if unit == "week":
+        return today - timedelta(weeks=count), today
+    return shift_months(today, -count * (12 if unit == "year" else 1)), today
+
+
+def parse_date_phrase(text: str, today: date) -> Optional[tuple]:
+    """
+    Resolves the one relative or calendar date phrase in `text`, using the same conventions as the LLM system prompt.
+    Returns (startDate, endDate, phrase), or None if there is no phrase or more than one.
+    """
+    last_month = shift_months(today, -1)
+    rules = [
+        (r"\btoday\b", lambda m: (today, today)),
+        (r"\byesterday\b", lambda m: (today - timedelta(days=1), today - timedelta(days=1))),
+        (r"\bthis week\b", lambda m: (today - timedelta(days=today.weekday()), today)),
+        (r"\blast week\b", lambda m: (today - timedelta(days=7), today - timedelta(days=1))),
+        (r"\bthis month\b", lambda m: (today.replace(day=1), today)),
+        (r"\blast month\b", lambda m: month_range(last_month.year, last_month.month)),
+        (r"\b(this year|year to date|ytd)\b", lambda m: (date(today.year, 1, 1), today)),
+        (r"\blast year\b", lambda m: (date(today.year - 1, 1, 1), date(today.year - 1, 12, 31))),
+        (
+            rf"\b(?:past|last|previous) (\d+|{'|'.join(NUMBER_WORDS)})? ?(day|week|month|year)s?\b",
+            lambda m: relative_range(today, m.group(1), m.group(2)),
+        ),
+        (
+            rf"\b(?:in |during |for )?({MONTH_PATTERN}),? (?:of )?(\d{{4}})\b",
+            lambda m: month_range(int(m.group(2)), MONTHS[m.group(1)]),
+        ),
+        (
+            rf"\b(?:in|during|for) ({MONTH_PATTERN})\b",
+            lambda m: month_range(
+                today.year if MONTHS[m.group(1)] <= today.month else today.year - 1,
+                MONTHS[m.group(1)],
+            ),
+        ),
+        (
+            r"\b(?:in|during) (\d{4})\b",
+            lambda m: (date(int(m.group(1)), 1, 1), date(int(m.group(1)), 12, 31)),
+        ),
+    ]
+    matches = []
+    for pattern, resolve in rules:
+        # "last month" is not "past N months"; the relative rule requires "past/previous" or a count
+        for match in re.finditer(pattern, text):
+            if pattern.startswith(r"\b(?:past") and match.group(0).startswith("last ") and not match.group(1):
+                continue
+            matches.append((match, resolve))
+    # Keep the longest phrase where rules overlap ("in may 2024" also contains "in may")
+    matches = [
+        (match, resolve)
+        for match, resolve in matches
+        if not any(
+            other.start() <= match.start()
+            and match.end() <= other.end()
+            and (other.start(), other.end()) != (match.start(), match.end())
+            for other, _ in matches
+        )
+    ]
+    if len(matches) != 1:
+        return None
+    match, resolve = matches[0]
+    start, end = resolve(match)
+    return start, end, match.group(0)
+
+
+def fast_route(query: str, today: date) -> Optional[list]:
+    """
+    Rule-based router for unambiguous queries. Returns the same list the LLM would
+    (['accounts'], ['balances', ...], ['transactions', ...] or ['aggregate', groupBy, ...]), or None when unsure.
+    """
+    text = query.lower()
+    wants_accounts = bool(ACCOUNT_INTENT.search(text))
+    wants_transactions = bool(TRANSACTION_INTENT.search(text))
+    if wants_accounts == wants_transactions:
+        return None
+    group = GROUP_BY_PATTERN.search(text)
+    # "per month" is a grouping, not a date range
+    dated = GROUP_BY_PATTERN.sub(" ", text)
+    phrase = parse_date_phrase(dated, today)
+    if DATE_WORDS.search(dated.replace(phrase[2], " ") if phrase else dated):
+        return None
+    dates = [phrase[0].isoformat(), phrase[1].isoformat()] if phrase else []
+    if wants_accounts:
+        # "How has my net worth changed", "balances last month"
+        if not group and (
+            BALANCE_HISTORY_INTENT.search(text) or phrase and phrase[2] != "today"
+        ):
+            return ["balances"] + dates
+        return ["accounts"] if phrase is None and not group or phrase and phrase[2] == "today" else None
+    if group or AGGREGATE_INTENT.search(text):
+        if group:
+            groupBy = GROUP_BY_WORDS[group.group(1) or group.group(2)]
+        else:
+            # "at Starbucks" asks about a payee
+            groupBy = "payee" if re.search(r"\bat (?!least\b|most\b|all\b)[a-z]", text) else "category"
+        return ["aggregate", groupBy] + dates
+    return ["transactions"] + dates
+
+
+_ROUTER_STATS = {"fast": 0, "llm": 0}
+
+
+def router_stats() -> dict:
+    total = _ROUTER_STATS["fast"] + _ROUTER_STATS["llm"]
+    return {**_ROUTER_STATS, "fast_hit_rate": _ROUTER_STATS["fast"] / total if total else 0.0}
+
+
+TOOL_NAME = "ynab_api_request"
+# Latency histogram buckets in seconds, shared by every stage
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_COUNTS = ("bytes", "rows", "tokens")
+
+
+class StageMetrics:
+    """
+    Process-wide latency histograms and byte/row/token totals per stage, for every call of this tool.
+    Rendered in the Prometheus text exposition format by `prometheus`.
+    """
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.calls = {}
+
+    def observe(self, stage: str, seconds: float, counts: dict):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {
+                    "buckets": [0] * len(METRIC_BUCKETS),
+                    "count": 0,
+                    "sum": 0.0,
+                    **{key: 0 for key in METRIC_COUNTS},
+                }
+            entry["count"] += 1
+            entry["sum"] += seconds
+            for n, bound in enumerate(METRIC_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][n] += 1
+            for key in METRIC_COUNTS:
+                entry[key] += int(counts.get(key) or 0)
+
+    def count_call(self, status: str):
+        with self.lock:
+            self.calls[status] = self.calls.get(status, 0) + 1
+
+    def prometheus(self) -> str:
+        with self.lock:
+            stages = {
+                stage: {**entry, "buckets": list(entry["buckets"])}
+                for stage, entry in sorted(self.stages.items())
+            }
+            calls = dict(self.calls)
+        tool = f'tool="{self.tool}"'
+        lines = [
+            "# HELP openwebui_tool_stage_seconds Time spent in each stage of a tool call",
+            "# TYPE openwebui_tool_stage_seconds histogram",
+        ]
+        for stage, entry in stages.items():
+            labels = f'{tool},stage="{stage}"'
+            for bound, count in zip(METRIC_BUCKETS, entry["buckets"]):
+                lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f"openwebui_tool_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+            lines.append(f"openwebui_tool_stage_seconds_count{{{labels}}} {entry['count']}")
+        for key in METRIC_COUNTS:
+            lines.append(f"# HELP openwebui_tool_stage_{key}_total {key.capitalize()} handled by each stage")
+            lines.append(f"# TYPE openwebui_tool_stage_{key}_total counter")
+            for stage, entry in stages.items():
+                if entry[key]:
+                    lines.append(f'openwebui_tool_stage_{key}_total{{{tool},stage="{stage}"}} {entry[key]}')
+        lines.append("# HELP openwebui_tool_calls_total Tool calls by final status")
+        lines.append("# TYPE openwebui_tool_calls_total counter")
+        for status, count in sorted(calls.items()):
+            lines.append(f'openwebui_tool_calls_total{{{tool},status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class CallTrace:
+    """
+    Stage timings and counts of one tool call. Set in `_TRACE` for the duration of the call,
+    so helpers record into it through `span` without it being passed around.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.status = "complete"
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float, counts: dict):
+        entry = self.stages.setdefault(
+            stage, {"seconds": 0.0, "calls": 0, **{key: 0 for key in METRIC_COUNTS}}
+        )
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        for key in METRIC_COUNTS:
+            entry[key] += int(counts.get(key) or 0)
+
+    def summary(self) -> str:
+        parts = []
+        for stage, entry in self.stages.items():
+            details = [f"{entry['calls']}x"] if entry["calls"] > 1 else []
+            if entry["bytes"]:
+                details.append(f"{entry['bytes'] / 1024:,.0f} KB")
+            if entry["rows"]:
+                details.append(f"{entry['rows']:,} rows")
+            if entry["tokens"]:
+                details.append(f"~{entry['tokens']:,} tokens")
+            parts.append(
+                f"{stage} {entry['seconds']:.3f}s" + (f" ({', '.join(details)})" if details else "")
+            )
+        return ", ".join(parts)
+
+    def record(self) -> dict:
+        return {
+            "time": datetime.fromtimestamp(self.started).isoformat(timespec="milliseconds"),
+            "tool": TOOL_NAME,
+            "status": self.status,
+            # Counts a stage never records are left out
+            "stages": {
+                stage: {
+                    "seconds": round(entry["seconds"], 6),
+                    "calls": entry["calls"],
+                    **{key: entry[key] for key in METRIC_COUNTS if entry[key]},
+                }
+                for stage, entry in self.stages.items()
+            },
+        }
+
+
+_METRICS = StageMetrics(TOOL_NAME)
+_TRACE: contextvars.ContextVar = contextvars.ContextVar(f"{TOOL_NAME}_trace", default=None)
+
+
+@contextmanager
+def span(stage: str, **counts):
+    """
+    Times the block as `stage`. Counts ("bytes", "rows", "tokens") can be passed up front
+    or set on the yielded dict inside the block. Stages can nest (e.g. "http" inside "sync").
+    """
+    record = dict(counts)
+    started = time.monotonic()
+    try:
+        yield record
+    finally:
+        seconds = time.monotonic() - started
+        _METRICS.observe(stage, seconds, record)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.add(stage, seconds, record)
+
+
+def estimate_tokens(context: Any) -> int:
+    # ~4 characters per token: cheap enough to run on every rendered context
+    return len(context if isinstance(context, str) else json.dumps(context)) // 4
+
+
+def write_metrics(directory: str, trace: CallTrace):
+    # One JSON line per call; the .prom file is replaced whole so a scraper never reads half of it
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{TOOL_NAME}.jsonl"), "a", encoding="utf-8") as file:
+            file.write(json.dumps(trace.record()) + "\n")
+        path = os.path.join(directory, f"{TOOL_NAME}.prom")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(_METRICS.prometheus())
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"[{TOOL_NAME}] Metrics not written: {e}")
+
+
+def traced(run: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Wraps `Tools._run`: the whole call is timed as stage "call", its spans are collected
+    and then written to the 'Metrics Directory' (if set) and printed when 'Debug' is on.
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        trace = CallTrace()
+        token = _TRACE.set(trace)
+        try:
+            with span("call"):
+                return await run(self, *args, **kwargs)
+        except BaseException:
+            trace.status = "error"
+            raise
+        finally:
+            _TRACE.reset(token)
+            _METRICS.count_call(trace.status)
+            write_metrics(self.valves.METRICS_DIR, trace)
+            if self.valves.DEBUG in {"Basic", "Full"}:
+                print(f"[{TOOL_NAME}] Stages: {trace.summary()}")
+
+    return wrapper
+
+
+ACCOUNT_COLUMNS = [("name", "Account Name"), ("type", "Type"), ("balance", "Balance")]
+ACCOUNT_PLAINTEXT = "- {name} ({type}): {balance}"
+TRANSACTION_COLUMNS = [
+    ("date", "Transaction Date"),
+    ("payee", "Payee"),
+    ("amount", "Amount"),
+    ("category", "Category"),
+    ("account", "Account"),
+    ("memo", "Notes"),
+]
+TRANSACTION_PLAINTEXT = "- Date: {date}, Payee: {payee}, Amount: {amount}, Category: {category}, Account: {account}, Memo: {memo}"
+BALANCE_COLUMNS = [
+    ("account", "Account"),
+    ("opening", "Opening Balance"),
+    ("closing", "Closing Balance"),
+    ("change", "Change"),
+]
+BALANCE_PLAINTEXT = "- {account}: {opening} -> {closing} (change {change})"
+NET_WORTH_COLUMNS = [("date", "Date"), ("net_worth", "Net Worth"), ("change", "Change")]
+NET_WORTH_PLAINTEXT = "- {date}: {net_worth} (change {change})"
+RIGHT_ALIGNED = {
+    "amount",
+    "balance",
+    "outflow",
+    "inflow",
+    "net",
+    "count",
+    "average",
+    "opening",
+    "closing",
+    "change",
+    "net_worth",
+}
+# Passed to `render_context` as integer milliunits
+MONEY_COLUMNS = RIGHT_ALIGNED - {"count"}
+CONTEXT_FORMATS = ("JSON", "Markdown", "Plaintext", "Compact")
+# Compact: repeated names are listed once and rows refer to them by short id
+COMPACT_DICTIONARIES = {"payee": "p", "category": "c", "account": "a"}
+# Dictionary lines are "p1=Name; p2=Name", so names holding these are quoted like CSV cells
+COMPACT_NAME_SPECIAL = ',";='
+# Auto: formats are compared on the first rows, then only the cheapest renders them all
+AUTO_SAMPLE_ROWS = 200
+TOKENIZER_ENCODING = "cl100k_base"
+_ENCODING = None
+
+
+def count_tokens(text: str) -> int:
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            _ENCODING = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            # Offline installs may lack the tokenizer data; ~4 characters per token still ranks formats
+            _ENCODING = False
+    if _ENCODING is False:
+        return len(text) // 4
+    return len(_ENCODING.encode(text, disallowed_special=()))
+
+
+def display_amount(milliunits: int) -> float:
+    return milliunits / 1000.0
+
+
+def markdown_cell(value: Any) -> str:
+    return "" if value is None else str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def compact_cell(value: Any, special: str = ',"') -> str:
+    # Quoted CSV-style when it holds one of the `special` separators
+    text = "" if value is None else str(value).replace("\n", " ")
+    if any(char in text for char in special):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def render_compact(title: str, columns: List[tuple], rows: Iterable[dict]) -> tuple:
+    """
+    Columnar CSV without repeated names: payees, categories and accounts are listed once with short ids
+    and money is written as integer cents.
+    """
+    keys = [key for key, _ in columns]
+    ids = {key: {} for key in keys if key in COMPACT_DICTIONARIES}
+    lines = []
+    for row in rows:
+        cells = []
+        for key in keys:
+            value = row.get(key)
+            if key in ids:
+                names = ids[key]
+                if value not in names:
+                    names[value] = f"{COMPACT_DICTIONARIES[key]}{len(names) + 1}"
+                cells.append(names[value])
+            elif key in MONEY_COLUMNS:
+                cells.append(str(round(value / 10)))
+            else:
+                cells.append(compact_cell(value))
+        lines.append(",".join(cells))
+    notes = "amounts in cents"
+    if ids:
+        notes += f"; {'/'.join(ids)} columns hold the ids listed below"
+    header = [f"{title} ({notes}):"]
+    for key, names in ids.items():
+        header.append(
+            f"{key}: " + "; ".join(f"{code}={compact_cell(name, COMPACT_NAME_SPECIAL)}" for name, code in names.items())
+        )
+    header.append(",".join(keys))
+    return "\n".join(header + lines) + "\n", len(lines)
+
+
+def context_tokens(context: Any) -> int:
+    # Open WebUI hands dict results to the model as JSON
+    return count_tokens(context if isinstance(context, str) else json.dumps(context))
+
+
+def render_context(
+    title: str,
+    columns: List[tuple],
+    rows: Iterable[dict],
+    contextFormat: str,
+    plaintextRow: str,
+    display: Callable[[int], Any] = display_amount,
+) -> tuple:
+    # `format_context`, timed as the "render" stage with its row count and estimated tokens
+    with span("render") as record:
+        context, count = format_context(
+            title, columns, rows, contextFormat, plaintextRow, display
+        )
+        record["rows"] = count
+        record["tokens"] = estimate_tokens(context)
+    return context, count
+
+
+def format_context(
+    title: str,
+    columns: List[tuple],
+    rows: Iterable[dict],
+    contextFormat: str,
+    plaintextRow: str,
+    display: Callable[[int], Any] = display_amount,
+) -> tuple:
+    """
+    Renders rows straight into the selected CONTEXT_FORMAT only, in a single pass over `rows`
+    (which can be a generator). MONEY_COLUMNS hold integer milliunits and are shown with `display`.
+    "Auto" renders a sample in every format and uses the one with the fewest tokens.
+    Returns the rendered context and the number of rows.
+    """
+    if contextFormat == "Auto":
+        rows = rows if isinstance(rows, list) else list(rows)
+        sample = rows[:AUTO_SAMPLE_ROWS]
+        contextFormat = min(
+            CONTEXT_FORMATS,
+            key=lambda candidate: context_tokens(
+                format_context(title, columns, sample, candidate, plaintextRow, display)[0]
+            ),
+        )
+    if contextFormat == "Compact":
+        return render_compact(title, columns, rows)
+
+    count = 0
+    shown = (
+        {
+            **row,
+            **{key: display(row[key]) for key in MONEY_COLUMNS if row.get(key) is not None},
+        }
+        for row in rows
+    )
+    if contextFormat == "JSON":
+        keys = [key for key, _ in columns]
+        items = []
+        for row in shown:
+            items.append({key: row.get(key) for key in keys})
+            count += 1
+        return {title: items}, count
+
+    if contextFormat == "Markdown":
+        lines = [
+            "| " + " | ".join(header for _, header in columns) + " |",
+            "| " + " | ".join("---:" if key in RIGHT_ALIGNED else "---" for key, _ in columns) + " |",
+        ]
+        for row in shown:
+            lines.append("| " + " | ".join(markdown_cell(row.get(key)) for key, _ in columns) + " |")
+            count += 1
+    else:
+        lines = [f"{title}:"]
+        for row in shown:
+            lines.append(plaintextRow.format_map(row))
+            count += 1
+    return "\n".join(lines) + "\n", count
+
+
+def join_contexts(*contexts: Any) -> Any:
+    # JSON contexts merge into one object; anything else is concatenated as text
+    if all(isinstance(context, dict) for context in contexts):
+        return {key: value for context in contexts for key, value in context.items()}
+    return "\n".join(
+        context if isinstance(context, str) else json.dumps(context) for context in contexts
+    )
+
+
+GROUP_BY = {"category", "payee", "account", "month"}
+AGGREGATE_PLAINTEXT = "- {group}: outflow {outflow}, inflow {inflow}, net {net}, {count} transactions, average net {average}"
+
+
+def aggregate_columns(groupBy: str) -> List[tuple]:
+    return [
+        ("group", groupBy.capitalize()),
+        ("outflow", "Outflow"),
+        ("inflow", "Inflow"),
+        ("net", "Net"),
+        ("count", "Transactions"),
+        ("average", "Average Net"),
+    ]
+
+
+def aggregate_result(groups: Dict[str, tuple], groupBy: str) -> List[dict]:
+    # {group: (outflow, inflow, count)} -> rows; months in order, other groups largest outflow first
+    if groupBy == "month":
+        keys = sorted(groups)
+    else:
+        keys = sorted(groups, key=lambda key: (-groups[key][0], -groups[key][1], key))
+    result = [
+        {
+            "group": key,
+            "outflow": groups[key][0],
+            "inflow": groups[key][1],
+            "net": groups[key][1] - groups[key][0],
+            "count": groups[key][2],
+        }
+        for key in keys
+    ]
+    if result:
+        outflow = sum(row["outflow"] for row in result)
+        inflow = sum(row["inflow"] for row in result)
+        result.append({
+            "group": "Total",
+            "outflow": outflow,
+            "inflow": inflow,
+            "net": inflow - outflow,
+            "count": sum(row["count"] for row in result),
+        })
+    return result
+
+
+def aggregate_rows(rows: Iterable[dict], groupBy: str) -> List[dict]:
+    """
+    Sums integer `amount`s of normalized transaction rows per group, in one pass, into outflow
+    (spending, as a positive number), inflow (income, refunds) and net, followed by an overall total.
+    Transfers between accounts are neither spending nor income and are left out.
+    """
+    groups = {}
+    for row in rows:
+        if row.get("transfer"):
+            continue
+        key = row["date"][:7] if groupBy == "month" else row[groupBy]
+        outflow, inflow, count = groups.get(key, (0, 0, 0))
+        amount = row["amount"]
+        groups[key] = (
+            outflow - min(amount, 0),
+            inflow + max(amount, 0),
+            count + 1,
+        )
+    return aggregate_result(groups, groupBy)
+
+
+def parse_route(params: list) -> tuple:
+    # ['accounts'] | ['balances' | 'transactions', (startDate, (endDate))] | ['aggregate', groupBy, (startDate, (endDate))]
+    dataType = None
+    startDate = None
+    endDate = None
+    options = {}
+    if isinstance(params, list) and params:
+        dataType = params[0]
+        dates = params[1:]
+        if dataType == "aggregate":
+            options["groupBy"] = "category"
+            if dates and dates[0] in GROUP_BY:
+                options["groupBy"] = dates[0]
+                dates = dates[1:]
+        if len(dates) == 1:
+            startDate = dates[0]
+            endDate = str(date.today())
+        elif len(dates) >= 2:
+            startDate = dates[0]
+            endDate = dates[1]
+    return dataType, startDate, endDate, options
+
+
 class EventEmitter:
 
     def __init__(self, event_emitter: Callable[[dict], Any] = None):
@@ -53,6 +904,9 @@ class EventEmitter:
         err=None,
         debug="Off",
     ):
+        trace = _TRACE.get()
+        if trace is not None and status == "error":
+            trace.status = "error"
         if debug in {"Basic", "Full"}:
             debugMsg = f"[ynab_api_request] {status}: {description}"
             if not err == None:
@@ -71,6 +925,1173 @@ class EventEmitter:
             )
 
 
+class YNABAPIError(Exception):
+
+    def __init__(self, status_code: int, text: str):
+        self.status_code = status_code
+        self.text = text
+        super().__init__(f"YNAB API error: {status_code} {text}")
+
+
+class YNABRateLimiter:
+    """
+    Process-wide token bucket for one YNAB access token, shared by every tool call.
+    Tokens refill at YNAB_RATE_LIMIT per YNAB_RATE_WINDOW and are corrected from the `X-Rate-Limit` response header.
+    Identical GET requests that are already in flight are coalesced into one upstream call.
+    """
+
+    def __init__(self, capacity: int = YNAB_RATE_LIMIT, window: int = YNAB_RATE_WINDOW):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.flight = SingleFlight()
+        self.requests = 0
+        self.retries = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    @property
+    def remaining(self) -> int:
+        self._refill()
+        return int(self.tokens)
+
+    @property
+    def low(self) -> bool:
+        return self.remaining < YNAB_LOW_QUOTA
+
+    def describe(self) -> str:
+        return f"{self.remaining}/{self.capacity} YNAB API requests left this hour"
+
+    async def acquire(self):
+        self._refill()
+        if self.tokens < 1:
+            wait = (1 - self.tokens) / self.rate
+            if wait > YNAB_MAX_QUOTA_WAIT:
+                raise YNABAPIError(
+                    429,
+                    f"Rate limit reached, try again in {int(wait // 60) + 1} minute(s)",
+                )
+            await asyncio.sleep(wait)
+            self._refill()
+        self.tokens -= 1
+
+    def observe(self, response: httpx.Response):
+        # "X-Rate-Limit: 36/200" = requests used / allowed in the current window
+        used, _, limit = (response.headers.get("X-Rate-Limit") or "").partition("/")
+        if used.isdigit() and limit.isdigit():
+            self.capacity = int(limit)
+            self.tokens = min(self.tokens, float(int(limit) - int(used)))
+        if response.status_code == 429:
+            # No tokens until YNAB's Retry-After (when given) has passed
+            retryAfter = response.headers.get("Retry-After", "")
+            self.tokens = min(
+                self.tokens,
+                1.0 - float(retryAfter) * self.rate if retryAfter.isdigit() else 0.0,
+            )
+
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        # Retries 429/5xx responses and connection errors with exponential backoff
+        for attempt in range(YNAB_RETRIES + 1):
+            await self.acquire()
+            self.requests += 1
+            retryAfter = ""
+            try:
+                # Streamed bodies are counted by whoever reads them ("parse")
+                with span("http") as record:
+                    response = await http_request(method, url, **kwargs)
+                    if kwargs.get("stream") and response.status_code != 200:
+                        # Error bodies are small; read them so callers can use `.text`
+                        await response.aread()
+                    record["bytes"] = response.num_bytes_downloaded
+            except httpx.TransportError:
+                if attempt == YNAB_RETRIES:
+                    raise
+            else:
+                self.observe(response)
+                retryable = response.status_code == 429 or response.status_code >= 500
+                if not retryable or attempt == YNAB_RETRIES:
+                    return response
+                retryAfter = response.headers.get("Retry-After", "")
+            if retryAfter.isdigit():
+                if float(retryAfter) > YNAB_MAX_QUOTA_WAIT:
+                    return response
+                delay = float(retryAfter)
+            else:
+                delay = YNAB_RETRY_BACKOFF * 2**attempt * (1 + random.random())
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        params: Optional[dict] = None,
+        stream: bool = False,
+    ) -> httpx.Response:
+        # A streamed body can only be read once, so it is never shared
+        if method != "GET" or stream:
+            return await self._send(
+                method, url, headers=headers, params=params, stream=stream
+            )
+        key = (url, tuple(sorted((params or {}).items())))
+        return await self.flight.run(
+            key, lambda: self._send(method, url, headers=headers, params=params)
+        )
+
+
+_RATE_LIMITERS: Dict[str, YNABRateLimiter] = {}
+
+
+def token_key(headers: dict) -> str:
+    # Hash the access token so it is never kept around as a plain dict key
+    return hashlib.sha256(headers.get("Authorization", "").encode("utf-8")).hexdigest()
+
+
+def get_rate_limiter(headers: dict) -> YNABRateLimiter:
+    # Quota is per access token, not per budget
+    key = token_key(headers)
+    if key not in _RATE_LIMITERS:
+        _RATE_LIMITERS[key] = YNABRateLimiter()
+    return _RATE_LIMITERS[key]
+
+
+def flight_stats() -> dict:
+    stats = {name: flight.stats() for name, flight in _FLIGHTS.items()}
+    stats["http"] = {
+        "calls": sum(limiter.flight.calls for limiter in _RATE_LIMITERS.values()),
+        "coalesced": sum(limiter.flight.coalesced for limiter in _RATE_LIMITERS.values()),
+    }
+    return stats
+
+
+async def ynab_request(
+    method: str,
+    url: str,
+    headers: dict,
+    params: Optional[dict] = None,
+    stream: bool = False,
+) -> httpx.Response:
+    return await get_rate_limiter(headers).request(
+        method, url, headers, params, stream
+    )
+
+
+# Transaction fields the tools use; everything else (subtransactions, flags, ...) is dropped while streaming
+TRANSACTION_FIELDS = (
+    "id",
+    "date",
+    "amount",
+    "memo",
+    "account_id",
+    "account_name",
+    "payee_id",
+    "payee_name",
+    "category_id",
+    "category_name",
+    "transfer_account_id",
+    "deleted",
+)
+STREAM_BATCH_SIZE = 1000
+
+
+async def stream_transactions(
+    response: httpx.Response, meta: Optional[dict] = None
+) -> AsyncIterator[dict]:
+    """
+    Parses `data.transactions` of a streamed YNAB response item by item, projected to TRANSACTION_FIELDS.
+    """
+    try:
+        async for tx in stream_json_array(response.aiter_text(), "transactions", meta):
+            yield {field: tx.get(field) for field in TRANSACTION_FIELDS}
+    finally:
+        await response.aclose()
+
+
+class YNABLocalStore:
+    """
+    On-disk (SQLite) mirror of a YNAB budget's accounts and transactions.
+    Tracks the last `server_knowledge` per budget so later syncs only need delta requests.
+    The connection is shared by the event loop and worker threads (index builds, prefetch), so every use holds `lock`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Reentrant, so a caller can hold it across several reads that must agree
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sync_state (
+                budget_id TEXT NOT NULL,
+                resource TEXT NOT NULL,
+                server_knowledge INTEGER NOT NULL,
+                synced_at TEXT NOT NULL,
+                PRIMARY KEY (budget_id, resource)
+            );
+            CREATE TABLE IF NOT EXISTS accounts (
+                budget_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                name TEXT,
+                type TEXT,
+                on_budget INTEGER,
+                closed INTEGER,
+                balance INTEGER,
+                PRIMARY KEY (budget_id, id)
+            );
+            CREATE TABLE IF NOT EXISTS transactions (
+                budget_id TEXT NOT NULL,
+                id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                memo TEXT,
+                account_id TEXT,
+                account_name TEXT,
+                payee_id TEXT,
+                payee_name TEXT,
+                category_id TEXT,
+                category_name TEXT,
+                transfer_account_id TEXT,
+                PRIMARY KEY (budget_id, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_transactions_date
+                ON transactions (budget_id, date);
+            """
+        )
+        self.conn.commit()
+
+    def get_server_knowledge(self, budget_id: str, resource: str) -> Optional[int]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT server_knowledge FROM sync_state WHERE budget_id = ? AND resource = ?",
+                (budget_id, resource),
+            ).fetchone()
+        return row["server_knowledge"] if row else None
+
+    def _set_server_knowledge(self, budget_id: str, resource: str, knowledge: int):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+            (budget_id, resource, knowledge, datetime.now().isoformat()),
+        )
+
+    def merge_accounts(
+        self, budget_id: str, accounts: List[dict], knowledge: Optional[int]
+    ) -> int:
+        # knowledge=None leaves the recorded server_knowledge as it was
+        with self.lock, self.conn:
+            for acc in accounts:
+                if acc.get("deleted", False):
+                    self.conn.execute(
+                        "DELETE FROM accounts WHERE budget_id = ? AND id = ?",
+                        (budget_id, acc["id"]),
+                    )
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO accounts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        budget_id,
+                        acc["id"],
+                        acc.get("name"),
+                        acc.get("type"),
+                        int(acc.get("on_budget", False)),
+                        int(acc.get("closed", False)),
+                        acc.get("balance", 0),
+                    ),
+                )
+            if knowledge is not None:
+                self._set_server_knowledge(budget_id, "accounts", knowledge)
+        return len(accounts)
+
+    def merge_transactions(
+        self, budget_id: str, transactions: List[dict], knowledge: Optional[int]
+    ) -> int:
+        # Batches of a streamed sync pass knowledge=None; the last call records it
+        with self.lock, self.conn:
+            for tx in transactions:
+                if tx.get("deleted", False):
+                    self.conn.execute(
+                        "DELETE FROM transactions WHERE budget_id = ? AND id = ?",
+                        (budget_id, tx["id"]),
+                    )
+                    continue
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        budget_id,
+                        tx["id"],
+                        tx.get("date"),
+                        tx.get("amount", 0),
+                        tx.get("memo"),
+                        tx.get("account_id"),
+                        tx.get("account_name"),
+                        tx.get("payee_id"),
+                        tx.get("payee_name"),
+                        tx.get("category_id"),
+                        tx.get("category_name"),
+                        tx.get("transfer_account_id"),
+                    ),
+                )
+            if knowledge is not None:
+                self._set_server_knowledge(budget_id, "transactions", knowledge)
+        return len(transactions)
+
+    def get_accounts(self, budget_id: str) -> List[dict]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT * FROM accounts WHERE budget_id = ? ORDER BY name", (budget_id,)
+            ).fetchall()
+        return [
+            {**dict(row), "on_budget": bool(row["on_budget"]), "closed": bool(row["closed"])}
+            for row in rows
+        ]
+
+    def iter_transactions(
+        self,
+        budget_id: str,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None,
+    ) -> List[dict]:
+        # Account names are denormalized on each transaction; prefer the current name
+        sql = """
+            SELECT t.id, t.date, t.amount, t.memo, t.account_id,
+                COALESCE(a.name, t.account_name) AS account_name,
+                t.payee_id, t.payee_name, t.category_id, t.category_name,
+                t.transfer_account_id
+            FROM transactions t
+            LEFT JOIN accounts a ON a.budget_id = t.budget_id AND a.id = t.account_id
+            WHERE t.budget_id = ?
+            """
+        args = [budget_id]
+        if startDate:
+            sql += " AND t.date >= ?"
+            args.append(startDate)
+        if endDate:
+            sql += " AND t.date <= ?"
+            args.append(endDate)
+        sql += " ORDER BY t.date, t.id"
+        # Fetched in full so the lock is not held while the caller iterates
+        with self.lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        for row in rows:
+            yield dict(row)
+
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# Net worth series: daily points up to two months, weekly up to a year, then month ends
+BALANCE_DAILY_DAYS = 62
+BALANCE_WEEKLY_DAYS = 366
+BALANCE_DEFAULT_DAYS = 30
+
+
+class BalanceHistory:
+    """
+    Daily running balance per account: `running[day, account]` is the sum of every transaction on account
+    code `account` up to and including day ordinal `start + day`, as one (days x accounts) int64 matrix.
+    Built once from an index and updated with the same deltas, so a balance on any day is one row lookup.
+    """
+
+    def __init__(self):
+        self.start = 0
+        self.running = np.zeros((0, 0), dtype=np.int64)
+
+    @property
+    def end(self) -> int:
+        return self.start + len(self.running) - 1
+
+    def apply(self, dates: np.ndarray, accounts: np.ndarray, amounts: np.ndarray):
+        # Adds transactions; negated amounts remove them
+        if not len(dates):
+            return
+        first, last = int(dates.min()), int(dates.max())
+        width = max(self.running.shape[1], int(accounts.max()) + 1)
+        if not len(self.running):
+            self.start = first
+            self.running = np.zeros((last - first + 1, width), dtype=np.int64)
+        else:
+            before = max(0, self.start - first)
+            after = max(0, last - self.end)
+            # Days before the first transaction start from zero, days after the last carry it forward
+            self.running = np.vstack(
+                [
+                    np.zeros((before, self.running.shape[1]), dtype=np.int64),
+                    self.running,
+                    np.repeat(self.running[-1:], after, axis=0),
+                ]
+            )
+            self.running = np.pad(
+                self.running, ((0, 0), (0, width - self.running.shape[1]))
+            )
+            self.start -= before
+        changes = np.zeros_like(self.running)
+        np.add.at(changes, (dates - self.start, accounts), amounts)
+        self.running += np.cumsum(changes, axis=0)
+
+    def at(self, ordinals: np.ndarray) -> np.ndarray:
+        # Running balances at the close of each day: (len(ordinals) x accounts)
+        if not len(self.running):
+            return np.zeros((len(ordinals), 0), dtype=np.int64)
+        rows = np.clip(ordinals - self.start, -1, len(self.running) - 1)
+        result = self.running[np.maximum(rows, 0)]
+        result[rows < 0] = 0
+        return result
+
+
+def balance_points(start: date, end: date) -> List[date]:
+    # Sample dates for the net worth series, always ending on `end`
+    days = (end - start).days + 1
+    if days <= BALANCE_WEEKLY_DAYS:
+        step = 1 if days <= BALANCE_DAILY_DAYS else 7
+        return [end - timedelta(days=n) for n in range(0, days, step)][::-1]
+    points = []
+    month = shift_months(start.replace(day=1), 1)
+    while month <= end:
+        points.append(month - timedelta(days=1))
+        month = shift_months(month, 1)
+    if not points or points[-1] != end:
+        points.append(end)
+    return points
+
+
+class TransactionIndex:
+    """
+    Columnar, in-memory copy of a budget's transactions, kept sorted by date.
+    Dates are ordinals, amounts integer milliunits and ids/payees/categories/accounts are
+    interned to integer codes, so a date range is two binary searches and a group-by is one `np.bincount`.
+    """
+
+    FIELDS = {
+        "payee": ("payee_name", "Unknown"),
+        "category": ("category_name", "Uncategorized"),
+        "account": ("account_name", "Unknown Account"),
+    }
+
+    def __init__(self, version: Optional[int] = None):
+        self.version = version
+        self.ids = np.empty(0, dtype=np.int64)
+        self.dates = np.empty(0, dtype=np.int32)
+        self.months = np.empty(0, dtype=np.int32)
+        self.amounts = np.empty(0, dtype=np.int64)
+        self.transfers = np.empty(0, dtype=bool)
+        self.memos = np.empty(0, dtype=object)
+        self.codes = {field: np.empty(0, dtype=np.int32) for field in self.FIELDS}
+        self.names = {field: [] for field in self.FIELDS}
+        self.lookup = {field: {} for field in self.FIELDS}
+        self.id_codes = {}
+        self.history = None
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def intern(self, field: str, key: str, name: str) -> int:
+        code = self.lookup[field].get(key)
+        if code is None:
+            code = self.lookup[field][key] = len(self.names[field])
+            self.names[field].append(name)
+        return code
+
+    def rename(self, field: str, key: str, name: str):
+        code = self.lookup[field].get(key)
+        if code is not None and name:
+            self.names[field][code] = name
+
+    def merge(self, transactions: List[dict]):
+        """
+        Applies full or delta YNAB transactions: changed and deleted ids are dropped,
+        then live rows are inserted at their sorted date positions.
+        """
+        stale = [
+            self.id_codes[tx["id"]] for tx in transactions if tx["id"] in self.id_codes
+        ]
+        if stale:
+            keep = ~np.isin(self.ids, stale)
+            if self.history is not None:
+                self.history.apply(
+                    self.dates[~keep], self.codes["account"][~keep], -self.amounts[~keep]
+                )
+            self.ids, self.dates, self.months, self.amounts, self.transfers, self.memos = (
+                self.ids[keep],
+                self.dates[keep],
+                self.months[keep],
+                self.amounts[keep],
+                self.transfers[keep],
+                self.memos[keep],
+            )
+            self.codes = {field: codes[keep] for field, codes in self.codes.items()}
+
+        live = [tx for tx in transactions if not tx.get("deleted", False)]
+        if not live:
+            return
+        days = np.array([tx["date"] for tx in live], dtype="datetime64[D]")
+        order = np.argsort(days, kind="stable")
+        days = days[order]
+        live = [live[i] for i in order.tolist()]
+        dates = (days.astype(np.int64) + EPOCH_ORDINAL).astype(np.int32)
+        months = days.astype("datetime64[M]").astype(np.int32) + 1970 * 12
+        ids = np.fromiter(
+            (self.id_codes.setdefault(tx["id"], len(self.id_codes)) for tx in live),
+            np.int64,
+            len(live),
+        )
+        amounts = np.fromiter((tx.get("amount", 0) for tx in live), np.int64, len(live))
+        transfers = np.fromiter(
+            (bool(tx.get("transfer_account_id")) for tx in live), bool, len(live)
+        )
+        codes = {}
+        for field, (key, default) in self.FIELDS.items():
+            names = [tx.get(key) or default for tx in live]
+            keys = names
+            if field == "account":
+                # Accounts are interned by id so renames apply to older transactions too
+                keys = [tx.get("account_id") or name for tx, name in zip(live, names)]
+            lookup = {
+                k: self.intern(field, k, name) for k, name in dict(zip(keys, names)).items()
+            }
+            codes[field] = np.fromiter(map(lookup.__getitem__, keys), np.int32, len(live))
+
+        positions = np.searchsorted(self.dates, dates, side="right")
+        self.ids = np.insert(self.ids, positions, ids)
+        self.dates = np.insert(self.dates, positions, dates)
+        self.months = np.insert(self.months, positions, months)
+        self.amounts = np.insert(self.amounts, positions, amounts)
+        self.transfers = np.insert(self.transfers, positions, transfers)
+        memos = np.empty(len(live), dtype=object)
+        memos[:] = [tx.get("memo") or "" for tx in live]
+        self.memos = np.insert(self.memos, positions, memos)
+        self.codes = {
+            field: np.insert(self.codes[field], positions, codes[field])
+            for field in self.FIELDS
+        }
+        if self.history is not None:
+            self.history.apply(dates, codes["account"], amounts)
+
+    def balance_history(self) -> BalanceHistory:
+        # Built on first use; `merge` keeps it current from then on
+        if self.history is None:
+            self.history = BalanceHistory()
+            self.history.apply(self.dates, self.codes["account"], self.amounts)
+        return self.history
+
+    def balances(
+        self, accounts: List[dict], startDate: str, endDate: str
+    ) -> tuple:
+        """
+        Opening/closing balance per account and a sampled net worth series for the date range.
+        `accounts` are YNAB accounts with their current `balance`; a past balance is the current
+        one minus everything after that day, so this costs O(days), not a pass over transactions.
+        """
+        history = self.balance_history()
+        start = date.fromisoformat(startDate)
+        end = date.fromisoformat(endDate)
+        points = balance_points(start, end)
+        ordinals = np.array(
+            [(start - timedelta(days=1)).toordinal()] + [day.toordinal() for day in points],
+            dtype=np.int64,
+        )
+        running = history.at(np.append(ordinals, max(history.end, ordinals[-1])))
+        rows = []
+        series = np.zeros(len(ordinals), dtype=np.int64)
+        for acc in accounts:
+            code = self.lookup["account"].get(acc["id"])
+            if code is None or code >= running.shape[1]:
+                values = np.full(len(ordinals), acc.get("balance", 0), dtype=np.int64)
+            else:
+                values = running[:-1, code] - running[-1, code] + acc.get("balance", 0)
+            series += values
+            opening, closing = int(values[0]), int(values[-1])
+            if opening or closing:
+                rows.append({
+                    "account": acc.get("name"),
+                    "opening": opening,
+                    "closing": closing,
+                    "change": closing - opening,
+                })
+        opening, closing = int(series[0]), int(series[-1])
+        rows.append({
+            "account": "Net Worth",
+            "opening": opening,
+            "closing": closing,
+            "change": closing - opening,
+        })
+        netWorth = [
+            {
+                "date": day.isoformat(),
+                "net_worth": int(series[n + 1]),
+                "change": int(series[n + 1] - series[n]),
+            }
+            for n, day in enumerate(points)
+        ]
+        return rows, netWorth
+
+    def select(
+        self,
+        startDate: Optional[str] = None,
+        endDate: Optional[str] = None,
+        scope: Optional[dict] = None,
+    ):
+        """
+        Returns the date range as a slice, or as an array of positions when narrowed by a `find_scope` scope.
+        """
+        start = 0
+        end = len(self.dates)
+        if startDate:
+            start = int(
+                np.searchsorted(self.dates, date.fromisoformat(startDate).toordinal())
+            )
+        if endDate:
+            end = int(
+                np.searchsorted(
+                    self.dates, date.fromisoformat(endDate).toordinal(), side="right"
+                )
+            )
+        window = slice(start, max(start, end))
+        if not scope:
+            return window
+        mask = np.ones(window.stop - window.start, dtype=bool)
+        for field, (key, name) in scope.items():
+            code = self.lookup[field].get(key if field == "account" else name)
+            if code is None:
+                return np.empty(0, dtype=np.intp)
+            mask &= self.codes[field][window] == code
+        return np.flatnonzero(mask) + window.start
+
+    def rows(self, window) -> Iterable[dict]:
+        payees, categories, accounts = (
+            self.names["payee"],
+            self.names["category"],
+            self.names["account"],
+        )
+        isoDates = {}
+        for ordinal, amount, payee, category, account, memo in zip(
+            self.dates[window].tolist(),
+            self.amounts[window].tolist(),
+            self.codes["payee"][window].tolist(),
+            self.codes["category"][window].tolist(),
+            self.codes["account"][window].tolist(),
+            self.memos[window],
+        ):
+            if ordinal not in isoDates:
+                isoDates[ordinal] = date.fromordinal(ordinal).isoformat()
+            yield {
+                "date": isoDates[ordinal],
+                "payee": payees[payee],
+                "amount": amount,
+                "category": categories[category],
+                "account": accounts[account],
+                "memo": memo,
+            }
+
+    def group(self, window, groupBy: str) -> List[dict]:
+        """
+        Same result as `aggregate_rows` over `rows(window)`, computed with vectorized counts/sums.
+        """
+        keep = ~self.transfers[window]
+        keys = (self.months if groupBy == "month" else self.codes[groupBy])[window][keep]
+        if not len(keys):
+            return []
+        amounts = self.amounts[window][keep]
+        base = int(keys.min())
+        counts = np.bincount(keys - base)
+        # float64 sums are exact for anything below 2**53 milliunits
+        outflows = -np.rint(
+            np.bincount(keys - base, weights=np.minimum(amounts, 0))
+        ).astype(np.int64)
+        inflows = np.rint(
+            np.bincount(keys - base, weights=np.maximum(amounts, 0))
+        ).astype(np.int64)
+        groups = {}
+        for code in np.nonzero(counts)[0].tolist():
+            if groupBy == "month":
+                label = f"{(base + code) // 12:04d}-{(base + code) % 12 + 1:02d}"
+            else:
+                label = self.names[groupBy][base + code]
+            groups[label] = (int(outflows[code]), int(inflows[code]), int(counts[code]))
+        return aggregate_result(groups, groupBy)
+
+
+_TRANSACTION_INDEXES: Dict[tuple, TransactionIndex] = {}
+
+
+def get_transaction_index(store: YNABLocalStore, budget_id: str) -> TransactionIndex:
+    # Built once from the mirror; `sync_local_store` keeps it current with the same deltas.
+    # A first build reads the whole mirror, so callers on the event loop run this in a worker thread
+    knowledge = store.get_server_knowledge(budget_id, "transactions")
+    index = _TRANSACTION_INDEXES.get((store.path, budget_id))
+    if index is None or index.version != knowledge:
+        with span("index") as record:
+            with store.lock:
+                # Rows and knowledge from the same moment, even if a sync is writing batches
+                knowledge = store.get_server_knowledge(budget_id, "transactions")
+                transactions = list(store.iter_transactions(budget_id))
+            index = TransactionIndex(knowledge)
+            index.merge(transactions)
+            record["rows"] = len(index)
+        _TRANSACTION_INDEXES[(store.path, budget_id)] = index
+    return index
+
+
+_LOCAL_STORES: Dict[str, YNABLocalStore] = {}
+
+
+def get_local_store(path: str) -> YNABLocalStore:
+    # One connection per database file, shared by every call in this process
+    if not path:
+        path = os.path.join(str(CACHE_DIR), "ynab_api_request.sqlite3")
+    if path not in _LOCAL_STORES:
+        _LOCAL_STORES[path] = YNABLocalStore(path)
+    return _LOCAL_STORES[path]
+
+
+async def sync_local_store(
+    store: YNABLocalStore,
+    budget_id: str,
+    headers: dict,
+    resources: tuple = ("accounts", "transactions"),
+) -> Dict[str, int]:
+    """
+    Brings the local mirror up to date using YNAB delta requests.
+    The first sync downloads everything; later syncs only receive changed/deleted entities.
+    Returns the number of changed records per resource.
+    """
+    changes = {}
+    for resource in resources:
+        url = f"{YNAB_API_BASE}/budgets/{budget_id}/{resource}"
+        params = {}
+        knowledge = store.get_server_knowledge(budget_id, resource)
+        if knowledge is not None:
+            params["last_knowledge_of_server"] = knowledge
+        index = _TRANSACTION_INDEXES.get((store.path, budget_id))
+
+        if resource == "accounts":
+            response = await ynab_request("GET", url, headers, params)
+            if response.status_code != 200:
+                raise YNABAPIError(response.status_code, response.text)
+            data = response.json().get("data", {})
+            accounts = data.get("accounts", [])
+            # Without server_knowledge keep the previous one; 0 would make every later sync a full download
+            changes[resource] = store.merge_accounts(
+                budget_id, accounts, data.get("server_knowledge", knowledge)
+            )
+            for acc in accounts if index is not None else []:
+                index.rename("account", acc["id"], acc.get("name"))
+            continue
+
+        # Full downloads can be huge: stream them into the mirror in batches
+        response = await ynab_request("GET", url, headers, params, stream=True)
+        if response.status_code != 200:
+            raise YNABAPIError(response.status_code, response.text)
+        # Apply a delta to the in-memory index as well; a full download replaces it
+        if index is not None and (knowledge is None or index.version != knowledge):
+            _TRANSACTION_INDEXES.pop((store.path, budget_id), None)
+            index = None
+        # Cached months (used with the mirror off) must not outlive changes the mirror has seen
+        if knowledge is None:
+            _MONTH_CACHE.invalidate(budget_id)
+        meta = {}
+        batch = []
+        changes[resource] = 0
+        # Includes writing each batch to the mirror as it arrives
+        with span("parse") as record:
+            async for tx in stream_transactions(response, meta):
+                batch.append(tx)
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    changes[resource] += store.merge_transactions(budget_id, batch, None)
+                    if index is not None:
+                        index.merge(batch)
+                    if knowledge is not None:
+                        _MONTH_CACHE.invalidate(budget_id, batch)
+                    batch = []
+            serverKnowledge = meta.get("server_knowledge", knowledge)
+            if serverKnowledge is None:
+                print(
+                    f"[ynab_api_request] No server_knowledge in the {resource} response, "
+                    "the next sync downloads everything again"
+                )
+            changes[resource] += store.merge_transactions(budget_id, batch, serverKnowledge)
+            if index is not None:
+                index.merge(batch)
+                index.version = serverKnowledge
+            if knowledge is not None:
+                _MONTH_CACHE.invalidate(budget_id, batch)
+            record["bytes"] = response.num_bytes_downloaded
+            record["rows"] = changes[resource]
+    return changes
+
+
+SCOPE_ENDPOINTS = {"account": "accounts", "category": "categories", "payee": "payees"}
+# Narrowest endpoint first: a payee usually has fewer transactions than a category or an account
+SCOPE_PRIORITY = ("payee", "category", "account")
+NAME_MAP_TTL = 3600
+_NAME_MAPS: Dict[str, tuple] = {}
+
+
+async def get_name_map(budget_id: str, headers: dict) -> Dict[str, Dict[str, tuple]]:
+    """
+    Cached {kind: {lowercase name: (id, name)}} of the budget's accounts, categories and payees.
+    """
+    cached = _NAME_MAPS.get(budget_id)
+    if cached and (
+        time.monotonic() - cached[0] < NAME_MAP_TTL or get_rate_limiter(headers).low
+    ):
+        return cached[1]
+
+    async def get(resource: str) -> dict:
+        url = f"{YNAB_API_BASE}/budgets/{budget_id}/{resource}"
+        response = await ynab_request("GET", url, headers)
+        if response.status_code != 200:
+            raise YNABAPIError(response.status_code, response.text)
+        return response.json().get("data", {})
+
+    accounts, categories, payees = await asyncio.gather(
+        get("accounts"), get("categories"), get("payees")
+    )
+    entries = {
+        "account": accounts.get("accounts", []),
+        "category": [
+            cat
+            for group in categories.get("category_groups", [])
+            for cat in group.get("categories", [])
+        ],
+        "payee": payees.get("payees", []),
+    }
+    nameMap = {
+        kind: {
+            item["name"].lower(): (item["id"], item["name"])
+            for item in items
+            if item.get("name") and not item.get("deleted", False)
+        }
+        for kind, items in entries.items()
+    }
+    _NAME_MAPS[budget_id] = (time.monotonic(), nameMap)
+    return nameMap
+
+
+def mirror_name_map(
+    store: YNABLocalStore, index: TransactionIndex, budget_id: str
+) -> Dict[str, Dict[str, tuple]]:
+    # Same shape as `get_name_map`; the index interns payees/categories by name
+    # ("Unknown" only stands in for a missing payee, so it isn't one to match)
+    unknownPayee = TransactionIndex.FIELDS["payee"][1]
+    return {
+        "account": {
+            acc["name"].lower(): (acc["id"], acc["name"])
+            for acc in store.get_accounts(budget_id)
+            if acc.get("name")
+        },
+        "category": {name.lower(): (None, name) for name in index.names["category"]},
+        "payee": {
+            name.lower(): (None, name)
+            for name in index.names["payee"]
+            if name != unknownPayee
+        },
+    }
+
+
+# Names too short or too common in questions themselves ("transfer to savings", "cash spending") to narrow by
+SCOPE_MIN_NAME_LENGTH = 3
+SCOPE_STOP_NAMES = {
+    "transfer",
+    "transfers",
+    "cash",
+    "home",
+    "other",
+    "misc",
+    "spending",
+    "income",
+    "payment",
+    "payments",
+}
+
+
+def find_scope(query: str, nameMap: Dict[str, Dict[str, tuple]]) -> Dict[str, tuple]:
+    """
+    Finds accounts, categories and payees named in the query (whole phrases at word boundaries, longest name first).
+    Names shorter than SCOPE_MIN_NAME_LENGTH or in SCOPE_STOP_NAMES are ignored.
+    Returns {kind: (id, name)}, with at most one entry per kind.
+    """
+    text = query.lower()
+    candidates = []
+    for kind, names in nameMap.items():
+        for lowered, entry in names.items():
+            # Cheap substring test first; only hits pay for the word-boundary regex
+            if (
+                len(lowered) < SCOPE_MIN_NAME_LENGTH
+                or lowered in SCOPE_STOP_NAMES
+                or lowered not in text
+            ):
+                continue
+            match = re.search(rf"(?<!\w){re.escape(lowered)}(?!\w)", text)
+            if match:
+                candidates.append((match, kind, entry))
+    scope = {}
+    taken = []
+    for match, kind, entry in sorted(
+        candidates, key=lambda candidate: -len(candidate[0].group(0))
+    ):
+        # "Chase Checking" (account) wins over "Chase" (payee) inside it
+        if kind in scope or any(
+            match.start() < end and start < match.end() for start, end in taken
+        ):
+            continue
+        scope[kind] = entry
+        taken.append(match.span())
+    return scope
+
+
+# Fixed cost of one extra request, in "months of transactions downloaded"
+MONTH_REQUEST_OVERHEAD = 0.5
+# Settled months are rarely edited, but can be; the cache also has to fit in memory
+MONTH_CACHE_TTL = 6 * 3600
+MONTH_CACHE_MAX_ROWS = 200000
+
+
+class MonthCache:
+    """
+    LRU cache of whole months of transactions, keyed by (budget_id, "YYYY-MM-01"),
+    with a time-to-live per month and bounded by the total number of transactions held.
+    """
+
+    def __init__(self, ttl: float = MONTH_CACHE_TTL, maxRows: int = MONTH_CACHE_MAX_ROWS):
+        self.ttl = ttl
+        self.maxRows = maxRows
+        self.entries: OrderedDict = OrderedDict()  # key -> (storedAt, transactions)
+        self.totalRows = 0
+
+    def __contains__(self, key: tuple) -> bool:
+        return self.get(key) is not None
+
+    def get(self, key: tuple) -> Optional[List[dict]]:
+        entry = self.entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            if entry is not None:
+                self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def __setitem__(self, key: tuple, transactions: List[dict]):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic(), transactions)
+        self.totalRows += len(transactions)
+        # Least recently used first, until the bound holds again
+        while self.entries and self.totalRows > self.maxRows:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, budget_id: str, transactions: Optional[List[dict]] = None):
+        """
+        Drops the months of `budget_id` that `transactions` (changed or deleted, as reported
+        by a delta sync) fall in now or did before, or every month of the budget if None.
+        """
+        months = {(tx.get("date") or "")[:7] + "-01" for tx in transactions or []}
+        ids = {tx.get("id") for tx in transactions or []}
+        for key, (_, cached) in list(self.entries.items()):
+            if key[0] == budget_id and (
+                transactions is None
+                or key[1] in months
+                or any(tx.get("id") in ids for tx in cached)
+            ):
+                self._remove(key)
+
+    def _remove(self, key: tuple):
+        _, transactions = self.entries.pop(key)
+        self.totalRows -= len(transactions)
+
+
+_MONTH_CACHE = MonthCache()
+
+
+def plan_transaction_fetch(
+    budget_id: str, startDate: Optional[str], endDate: Optional[str], today: date
+) -> tuple:
+    """
+    Picks the cheapest way to download transactions for [startDate, endDate]: one budget-wide
+    request (`since_date` returns everything up to today) or one request per calendar month.
+    Cost is estimated in months of data downloaded plus a fixed overhead per request,
+    and months already cached for `budget_id` cost nothing.
+    Returns ("since", startDate) or ("months", [month, ...]).
+    """
+    if not startDate:
+        return "since", None
+    first = date.fromisoformat(startDate).replace(day=1)
+    last = min(date.fromisoformat(endDate or str(today)), today).replace(day=1)
+    months = []
+    while first <= last:
+        months.append(first.isoformat())
+        first = shift_months(first, 1)
+    if not months:
+        return "since", startDate
+    # `since_date` downloads every month from startDate to today in one request
+    sinceCost = len(months) + (today.year - last.year) * 12 + today.month - last.month
+    sinceCost += MONTH_REQUEST_OVERHEAD
+    monthCost = sum(
+        1 + MONTH_REQUEST_OVERHEAD for month in months if (budget_id, month) not in _MONTH_CACHE
+    )
+    return ("months", months) if monthCost <= sinceCost else ("since", startDate)
+
+
+async def fetch_transactions(
+    budget_id: str,
+    headers: dict,
+    startDate: Optional[str],
+    endDate: Optional[str],
+    scope: Optional[dict] = None,
+) -> tuple:
+    """
+    Downloads transactions for [startDate, endDate] following `plan_transaction_fetch`, fetching
+    months concurrently. Months that closed before the previous month are cached (see `MonthCache`).
+    With a `scope` (see `find_scope`), the narrowest account/category/payee endpoint is used instead.
+    Returns (transactions in range and scope, stats).
+    """
+    today = date.today()
+    if scope:
+        # Scoped endpoints only support since_date
+        plan = next(kind for kind in SCOPE_PRIORITY if kind in scope)
+        target = startDate
+    else:
+        plan, target = plan_transaction_fetch(budget_id, startDate, endDate, today)
+    stats = {"plan": plan, "requests": 0, "cached": 0, "bytes": 0, "rows": 0}
+
+    def wanted(tx: dict) -> bool:
+        return (
+            (not startDate or startDate <= (tx.get("date") or ""))
+            and (not endDate or (tx.get("date") or "9999-12-31") <= endDate)
+            and all(
+                tx.get(f"{kind}_id") == entry[0] for kind, entry in (scope or {}).items()
+            )
+        )
+
+    async def get(
+        url: str, params: Optional[dict] = None, keep: Callable[[dict], bool] = wanted
+    ) -> List[dict]:
+        # Streamed: only rows that pass `keep` are held, never the whole response
+        response = await ynab_request("GET", url, headers, params, stream=True)
+        if response.status_code != 200:
+            raise YNABAPIError(response.status_code, response.text)
+        stats["requests"] += 1
+        with span("parse") as record:
+            kept = [tx async for tx in stream_transactions(response) if keep(tx)]
+            record["bytes"] = response.num_bytes_downloaded
+            record["rows"] = len(kept)
+        stats["bytes"] += response.num_bytes_downloaded
+        return kept
+
+    if plan == "months":
+        # Months before the previous one are settled and safe to keep
+        settled = shift_months(today.replace(day=1), -1).isoformat()
+        # Looked up once: an entry may expire while the missing months are fetched
+        cached = {month: _MONTH_CACHE.get((budget_id, month)) for month in target}
+        missing = [month for month in target if cached[month] is None]
+        stats["cached"] = len(target) - len(missing)
+        fetched = await asyncio.gather(
+            *(
+                # Whole months are kept so they can be cached
+                get(
+                    f"{YNAB_API_BASE}/budgets/{budget_id}/months/{month}/transactions",
+                    keep=lambda tx: True,
+                )
+                for month in missing
+            )
+        )
+        for month, transactions in zip(missing, fetched):
+            if month < settled:
+                _MONTH_CACHE[(budget_id, month)] = transactions
+        fetchedByMonth = dict(zip(missing, fetched))
+        batches = [
+            fetchedByMonth[month] if cached[month] is None else cached[month]
+            for month in target
+        ]
+    elif plan == "since":
+        url = f"{YNAB_API_BASE}/budgets/{budget_id}/transactions"
+        batches = [await get(url, {"since_date": target} if target else None)]
+    else:
+        url = f"{YNAB_API_BASE}/budgets/{budget_id}/{SCOPE_ENDPOINTS[plan]}/{scope[plan][0]}/transactions"
+        batches = [await get(url, {"since_date": target} if target else None)]
+
+    transactions = [tx for batch in batches for tx in batch if wanted(tx)]
+    stats["rows"] = len(transactions)
+    return transactions, stats
+
+
+def in_quiet_hours(spec: str, now: datetime) -> bool:
+    # "23-7" = from 23:00 until 07:00 local time; empty or malformed = never quiet
+    match = re.fullmatch(r"\s*(\d{1,2})\s*-\s*(\d{1,2})\s*", spec or "")
+    if not match:
+        return False
+    start, end = int(match.group(1)) % 24, int(match.group(2)) % 24
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+# One background task per process; it always reads the valves of the latest Tools instance
+_PREFETCHER: Dict[str, Any] = {"task": None, "tools": None}
+
+
+def start_prefetch(tools):
+    _PREFETCHER["tools"] = tools
+    if not tools.valves.PREFETCH:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # No event loop yet; the first tool call starts it instead
+        return
+    task = _PREFETCHER["task"]
+    if task is None or task.done() or task.get_loop() is not loop:
+        _PREFETCHER["task"] = loop.create_task(prefetch_loop())
+
+
+async def prefetch_loop():
+    while True:
+        valves = _PREFETCHER["tools"].valves
+        if not valves.PREFETCH:
+            return
+        if not in_quiet_hours(valves.PREFETCH_QUIET_HOURS, datetime.now()):
+            started = time.monotonic()
+            try:
+                result = await prefetch_budget(valves)
+            except Exception as e:
+                result = f"failed ({e})"
+            if valves.DEBUG in {"Basic", "Full"}:
+                print(f"[ynab_api_request] Prefetch: {result} in {time.monotonic() - started:.2f}s")
+        await asyncio.sleep(max(60, valves.PREFETCH_INTERVAL))
+
+
+async def prefetch_budget(valves) -> str:
+    """
+    Keeps the configured budget warm: syncs the local mirror and (re)builds its index,
+    or refreshes the name map when the mirror is off. Skipped while API quota is low.
+    """
+    if not valves.YNAB_BUDGET_ID or not valves.YNAB_ACCESS_TOKEN:
+        return "skipped (no budget configured)"
+    budget_id = valves.YNAB_BUDGET_ID
+    headers = {"Authorization": f"Bearer {valves.YNAB_ACCESS_TOKEN}"}
+    limiter = get_rate_limiter(headers)
+    if limiter.low:
+        return f"skipped ({limiter.describe()})"
+    if not valves.LOCAL_MIRROR:
+        _NAME_MAPS.pop(budget_id, None)
+        await _FLIGHTS["names"].run(
+            (token_key(headers), budget_id), lambda: get_name_map(budget_id, headers)
+        )
+        return "name map refreshed"
+    store = get_local_store(valves.LOCAL_MIRROR_PATH)
+    resources = ("accounts", "transactions")
+    changes = await _FLIGHTS["sync"].run(
+        (store.path, budget_id, resources),
+        lambda: sync_local_store(store, budget_id, headers, resources),
+    )
+    # A first build can take a while on large budgets; keep it off the event loop
+    index = await asyncio.to_thread(get_transaction_index, store, budget_id)
+    return f"mirror synced {changes}, {len(index)} transactions indexed"
+
+
 class Tools:
 
     class Valves(BaseModel):
@@ -86,9 +2107,9 @@ class Tools:
             description="YNAB API authorization token",
             required=True,
         )
-        CONTEXT_FORMAT: Literal["JSON", "Markdown", "Plaintext"] = Field(
+        CONTEXT_FORMAT: Literal["JSON", "Markdown", "Plaintext", "Compact", "Auto"] = Field(
             default="JSON",
-            description="How to format data passed to LLM for context: JSON, Markdown, Plaintext",
+            description="How to format data passed to LLM for context: JSON, Markdown, Plaintext, Compact (names listed once, rows carry short ids and integer cents), Auto (whichever of these uses the fewest tokens)",
             required=True,
         )
         DEBUG: Literal["Off", "Basic", "Full"] = Field(
@@ -101,13 +2122,61 @@ class Tools:
             description="Enables in-line 'citations', proving response is sourced from actual YNAB data. Looks messy, but is useful for debugging/differentiating from hallucinations",
             required=False,
         )
+        FAST_ROUTER: bool = Field(
+            default=True,
+            title="Fast Router",
+            description="Answer obvious queries ('balance', 'last week', 'in March 2024', 'past 30 days') with built-in rules, only asking the LLM which data to retrieve when unsure",
+            required=False,
+        )
+        LOCAL_MIRROR: bool = Field(
+            default=True,
+            title="Local Mirror",
+            description="Keep a local copy of the budget, kept up to date with YNAB delta requests, and answer queries from it instead of downloading all data every time",
+            required=False,
+        )
+        LOCAL_MIRROR_PATH: str = Field(
+            default="",
+            title="Local Mirror Path",
+            description="(Optional) SQLite file for the local mirror. Defaults to 'ynab_api_request.sqlite3' in the Open WebUI cache directory",
+            required=False,
+        )
+        PREFETCH: bool = Field(
+            default=False,
+            title="Background Prefetch",
+            description="Keep the budget warm by syncing it in the background, so questions are answered from fresh local data",
+            required=False,
+        )
+        PREFETCH_INTERVAL: int = Field(
+            default=900,
+            title="Prefetch Interval",
+            description="Seconds between background syncs (minimum 60). Each sync uses 2 YNAB API requests",
+            required=False,
+        )
+        PREFETCH_QUIET_HOURS: str = Field(
+            default="",
+            title="Prefetch Quiet Hours",
+            description="(Optional) Local hours with no background syncs, e.g. '23-7'",
+            required=False,
+        )
+        METRICS_DIR: str = Field(
+            default="",
+            title="Metrics Directory",
+            description="(Optional) Directory where each call appends its per-stage timings and byte/row/token counts to 'ynab_api_request.jsonl' and rewrites 'ynab_api_request.prom' (Prometheus text format, e.g. for node_exporter's textfile collector)",
+            required=False,
+        )
         pass
 
     def __init__(self):
         self.valves = self.Valves()
         self.citation = self.valves.CITATIONS
+        # Valves are assigned right after the tool is instantiated, so check them once that is done
+        try:
+            asyncio.get_running_loop().call_soon(start_prefetch, self)
+        except RuntimeError:
+            pass
         pass
 
+    @traced
     async def _run(
         self,
         query: str,
@@ -120,6 +2189,7 @@ class Tools:
         emitter = EventEmitter(__event_emitter__)
         contextFormat = self.valves.CONTEXT_FORMAT
         debugState = self.valves.DEBUG
+        start_prefetch(self)
 
         await emitter.emit(
             description="Determining which YNAB data to retrieve...", debug=debugState
@@ -128,121 +2198,214 @@ class Tools:
         budget_id = self.valves.YNAB_BUDGET_ID
         access_token = self.valves.YNAB_ACCESS_TOKEN
         headers = {"Authorization": f"Bearer {access_token}"}
+        limiter = get_rate_limiter(headers)
 
-        # Use LLM to decide which API endpoint to call
-        tools_metadata = [
-            {
-                "id": "accounts",
-                "description": "Retrieve a list of all account and balance details from YNAB.",
-            },
-            {
-                "id": "transactions",
-                "description": "Retrieve a list of all financial transaction details from YNAB.",
-            },
-        ]
+        # Obvious queries ("balance", "last week", "in March 2024") don't need an LLM round-trip
+        dataType = None
+        startDate = None
+        endDate = None
+        options = {}
+        with span("route"):
+            fastRoute = fast_route(query, date.today()) if self.valves.FAST_ROUTER else None
+        if fastRoute is not None:
+            _ROUTER_STATS["fast"] += 1
+            dataType, startDate, endDate, options = parse_route(fastRoute)
+        else:
+            _ROUTER_STATS["llm"] += 1
+            # Use LLM to decide which API endpoint to call
+            tools_metadata = [
+                {
+                    "id": "accounts",
+                    "description": "Retrieve a list of all account and balance details from YNAB.",
+                },
+                {
+                    "id": "balances",
+                    "description": "Retrieve account balances and net worth over a date range from YNAB (how balances changed).",
+                },
+                {
+                    "id": "transactions",
+                    "description": "Retrieve a list of all financial transaction details from YNAB.",
+                },
+                {
+                    "id": "aggregate",
+                    "description": "Retrieve outflow (spending), inflow (income) and net totals, counts and averages of YNAB transactions grouped by category, payee, account or month. Transfers between accounts are left out.",
+                },
+            ]
 
-        system_prompt = f"""
-            You are an assistant retrieving YNAB (You Need A Budget) financial data based on a user's query.
+            system_prompt = f"""
+                You are an assistant retrieving YNAB (You Need A Budget) financial data based on a user's query.
 
-            Choose one of the tools below:
-            {tools_metadata}
+                Choose one of the tools below:
+                {tools_metadata}
 
-            Return a list:
-            - [] if no tool applies
-            - ['accounts'] for account/balance-related queries
-            - ['transactions'] for transaction queries with no clear date range
-            - ['transactions', startDate, endDate] for transaction queries with a clear date range
+                Return a list:
+                - [] if no tool applies
+                - ['accounts'] for current account/balance-related queries
+                - ['balances'] or ['balances', startDate, endDate] for how balances or net worth changed over time
+                - ['transactions'] for transaction queries with no clear date range
+                - ['transactions', startDate, endDate] for transaction queries with a clear date range
+                - ['aggregate', groupBy] or ['aggregate', groupBy, startDate, endDate] for questions about totals, sums or averages ("how much", "total", "breakdown", "monthly"), where groupBy is one of 'category', 'payee', 'account', 'month'
 
             
-            For 'transactions':
-            - If the query uses **explicit calendar language** (e.g. "2nd week of May", "March 2024", "May 5–9"), interpret it literally and return accurate ISO 8601 start and end dates.
-            - If the query uses **relative time** (e.g. "last week", "past 3 days", "this month"), compute dates relative to today ({str(date.today())}).
-            - If no date is mentioned, return ['transactions'] without dates.
-
-            Examples:
-            - "What's in my checking account?" → ['accounts']
-            - "How much did I spend last week?" → ['transactions', '2025-05-27', '2025-06-02']
-            - "How much did I spend on groceries?" → ['transactions']
-            - "How much did I spend in the 2nd week of May?" → ['transactions', '2025-05-05', '2025-05-11']
-
-            Only return the list. No explanations.
-            """
+                For 'balances', 'transactions' and 'aggregate':
+                - If the query uses **explicit calendar language** (e.g. "2nd week of May", "March 2024", "May 5–9"), interpret it literally and return accurate ISO 8601 start and end dates.
+                - If the query uses **relative time** (e.g. "last week", "past 3 days", "this month"), compute dates relative to today ({str(date.today())}).
+                - If no date is mentioned, return ['balances'], ['transactions'] or ['aggregate', groupBy] without dates.
 
+                Examples:
+                - "What's in my checking account?" → ['accounts']
+                - "How has my net worth changed since March?" → ['balances', '2025-03-01', '2025-06-03']
+                - "What did I buy last week?" → ['transactions', '2025-05-27', '2025-06-02']
+                - "How much did I spend on groceries?" → ['aggregate', 'category']
+                - "How much did I spend at Costco in the 2nd week of May?" → ['aggregate', 'payee', '2025-05-05', '2025-05-11']
+                - "What was my monthly spending this year?" → ['aggregate', 'month', '2025-01-01', '2025-06-03']
 
+                Only return the list. No explanations.
+                """
 
-        prompt = f"Query: {query}"
 
-        payload = {
-            "model": __model__.get("id") if isinstance(__model__, dict) else __model__,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False,
-        }
 
-        try:
-            user = Users.get_user_by_id(__user__["id"])
-            response = await generate_chat_completion(
-                request=__request__, form_data=payload, user=user
-            )
-            content = response["choices"][0]["message"]["content"]
-            content = content.replace("'", '"')
-            match = re.search(r"\[.*?\]", content)
-            dataType = None
-            startDate = None
-            endDate = None
-            if match:
-                try:
-                    params = json.loads(match.group(0))
-                    if debugState == "Full":
-                        print(f'LLM Response: {params}')
-                    if isinstance(params, list) and params:
-                        dataType = params[0]
-                        if len(params) == 2:
-                            startDate = params[1]
-                            endDate = str(date.today())
-                        elif len(params) == 3:
-                            startDate = params[1]
-                            endDate = params[2]
+            prompt = f"Query: {query}"
+
+            payload = {
+                "model": __model__.get("id") if isinstance(__model__, dict) else __model__,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "stream": False,
+            }
+
+            try:
+                user = Users.get_user_by_id(__user__["id"])
+                with span("llm"):
+                    response = await generate_chat_completion(
+                        request=__request__, form_data=payload, user=user
+                    )
+                content = response["choices"][0]["message"]["content"]
+                content = content.replace("'", '"')
+                match = re.search(r"\[.*?\]", content)
+                if match:
+                    try:
+                        params = json.loads(match.group(0))
                         if debugState == "Full":
-                            print(f"Parsed dataType: {dataType}")
-                            print(f"Parsed startDate: {startDate}")
-                            print(f"Parsed endDate: {endDate}")
-                except json.JSONDecodeError:
-                    pass
-        except Exception as e:
-            determinationError = (
-                "Error occurred while determining what YNAB data to retrieve."
-            )
-            await emitter.emit(
-                status="error",
-                description=f"{determinationError} {e}",
-                done=True,
-                err=e,
-                debug=debugState,
-            )
-            return determinationError
+                            print(f'LLM Response: {params}')
+                        dataType, startDate, endDate, options = parse_route(params)
+                    except json.JSONDecodeError:
+                        pass
+            except Exception as e:
+                determinationError = (
+                    "Error occurred while determining what YNAB data to retrieve."
+                )
+                await emitter.emit(
+                    status="error",
+                    description=f"{determinationError} {e}",
+                    done=True,
+                    err=e,
+                    debug=debugState,
+                )
+                return determinationError
+
+        if debugState == "Full":
+            print(f"Parsed dataType: {dataType}")
+            print(f"Parsed startDate: {startDate}")
+            print(f"Parsed endDate: {endDate}")
+        if debugState in {"Basic", "Full"}:
+            print(f"[ynab_api_request] Router: {'fast path' if fastRoute is not None else 'LLM'} {router_stats()}")
+            print(f"[ynab_api_request] Coalesced calls: {flight_stats()}")
 
         await emitter.emit(description="Opening YNAB session...", debug=debugState)
 
+        store = None
+        if self.valves.LOCAL_MIRROR and dataType in {
+            "accounts",
+            "balances",
+            "transactions",
+            "aggregate",
+        }:
+            await emitter.emit(
+                description="Syncing local YNAB mirror...", debug=debugState
+            )
+            try:
+                store = get_local_store(self.valves.LOCAL_MIRROR_PATH)
+                # Transactions reference account names, so keep accounts current as well
+                resources = (
+                    ("accounts",)
+                    if dataType == "accounts"
+                    else ("accounts", "transactions")
+                )
+                if limiter.low and all(
+                    store.get_server_knowledge(budget_id, resource) is not None
+                    for resource in resources
+                ):
+                    # Save the remaining quota; the mirror is at most a few syncs behind
+                    await emitter.emit(
+                        description=f"YNAB API quota low ({limiter.describe()}), answering from local mirror...",
+                        debug=debugState,
+                    )
+                else:
+                    # Chats asking at the same time share one delta sync
+                    with span("sync"):
+                        changes = await _FLIGHTS["sync"].run(
+                            (store.path, budget_id, resources),
+                            lambda: sync_local_store(store, budget_id, headers, resources),
+                        )
+                    if debugState == "Full":
+                        print(f"Local mirror changes: {changes}")
+            except YNABAPIError as e:
+                await emitter.emit(
+                    status="error", description=str(e), done=True, debug=debugState
+                )
+                return str(e)
+            except Exception as e:
+                syncFail = "YNAB local mirror sync failed."
+                await emitter.emit(
+                    status="error",
+                    description=syncFail,
+                    done=True,
+                    err=e,
+                    debug=debugState,
+                )
+                return f"{syncFail} Error: {str(e)}"
+
         if dataType == "accounts":
 
             await emitter.emit(
                 description="Fetching YNAB account data...", debug=debugState
             )
 
-            url = f"https://api.ynab.com/v1/budgets/{budget_id}/accounts"
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                apiErr = f"YNAB API error: {response.status_code} {response.text}"
-                await emitter.emit(
-                    status="error", description=apiErr, done=True, debug=debugState
-                )
-                return apiErr
+            if store:
+                accounts = store.get_accounts(budget_id)
+            else:
+                url = f"{YNAB_API_BASE}/budgets/{budget_id}/accounts"
+                try:
+                    response = await ynab_request("GET", url, headers)
+                except YNABAPIError as e:
+                    await emitter.emit(
+                        status="error", description=str(e), done=True, debug=debugState
+                    )
+                    return str(e)
+                except Exception as e:
+                    # Connection errors and timeouts once retries are used up
+                    requestFail = "YNAB request failed."
+                    await emitter.emit(
+                        status="error",
+                        description=requestFail,
+                        done=True,
+                        err=e,
+                        debug=debugState,
+                    )
+                    return f"{requestFail} Error: {str(e)}"
+                if response.status_code != 200:
+                    apiErr = f"YNAB API error: {response.status_code} {response.text}"
+                    await emitter.emit(
+                        status="error", description=apiErr, done=True, debug=debugState
+                    )
+                    return apiErr
 
             try:
-                accounts = response.json().get("data", {}).get("accounts", [])
+                if not store:
+                    accounts = response.json().get("data", {}).get("accounts", [])
                 if not accounts:
                     noAcctErr = f"No accounts found."
                     await emitter.emit(
@@ -253,50 +2416,27 @@ class Tools:
                     )
                     return noAcctErr
 
-                processed_accounts_json = {"All YNAB Accounts": []}
-                processed_accounts_markdown = """
-                    | Account Name | Type | Balance |\n
-                    | --- | --- | ---: |\n
-                    """
-                processed_accounts_plaintext = "All YNAB Accounts:\n"
-                for acc in accounts:
-                    if not acc.get("closed", False):
-                        acctName = acc.get("name")
-                        acctBalance = acc.get("balance", 0) / 1000.0
-                        acctType = acc.get("type")
-                        processed_accounts_json["All YNAB Accounts"].append(
-                            {
-                                "name": acctName,
-                                "balance": acctBalance,
-                                "type": acctType,
-                                # Not necessary yet:
-                                # "included_in_budget": acc.get("on_budget", False)
-                            }
-                        )
-                    processed_accounts_markdown += (
-                        f"| {acctName} | {acctType} | {acctBalance} |\n"
-                    )
-                    processed_accounts_plaintext += (
-                        f"- {acctName} ({acctType}): {acctBalance}\n"
-                    )
+                rows = (
+                    {
+                        "name": acc.get("name"),
+                        "type": acc.get("type"),
+                        "balance": acc.get("balance", 0),
+                    }
+                    for acc in accounts
+                    if not acc.get("closed", False)
+                )
+                processed_accounts, _ = render_context(
+                    "All YNAB Accounts", ACCOUNT_COLUMNS, rows, contextFormat, ACCOUNT_PLAINTEXT
+                )
                 await emitter.emit(
                     status="complete",
-                    description="YNAB account data fetched successfully",
+                    description=f"YNAB account data fetched successfully ({limiter.describe()})",
                     done=True,
                     debug=debugState,
                 )
-                if contextFormat == "JSON":
-                    if debugState == "Full":
-                        print(processed_accounts_json)
-                    return processed_accounts_json
-                elif contextFormat == "Markdown":
-                    if debugState == "Full":
-                        print(processed_accounts_markdown)
-                    return processed_accounts_markdown
-                elif contextFormat == "Plaintext":
-                    if debugState == "Full":
-                        print(processed_accounts_plaintext)
-                    return processed_accounts_plaintext
+                if debugState == "Full":
+                    print(processed_accounts)
+                return processed_accounts
             except Exception as e:
                 acctFail = "YNAB account data fetch failed."
                 await emitter.emit(
@@ -308,54 +2448,136 @@ class Tools:
                 )
                 return f"{acctFail} Error: {str(e)}"
 
-        elif dataType == "transactions":
+        elif dataType in {"transactions", "aggregate"}:
+
+            # Questions naming an account, category or payee only need its transactions
+            try:
+                if store:
+                    index = await asyncio.to_thread(get_transaction_index, store, budget_id)
+                    nameMap = mirror_name_map(store, index, budget_id)
+                else:
+                    nameMap = await _FLIGHTS["names"].run(
+                        (token_key(headers), budget_id),
+                        lambda: get_name_map(budget_id, headers),
+                    )
+                scope = find_scope(query, nameMap)
+            except Exception as e:
+                scope = {}
+                if debugState in {"Basic", "Full"}:
+                    print(f"[ynab_api_request] Scope lookup failed: {e}")
+            scopeLabel = ", ".join(f"{kind}: {entry[1]}" for kind, entry in scope.items())
+            scopeLabel = f" ({scopeLabel})" if scopeLabel else ""
 
             await emitter.emit(
-                description="Fetching YNAB transaction data", debug=debugState
+                description=f"Fetching YNAB transaction data{scopeLabel}",
+                debug=debugState,
             )
 
-            use_month_endpoint = False
-            if startDate and endDate:
-                start_dt = date.fromisoformat(startDate)
-                end_dt = date.fromisoformat(endDate)
-                use_month_endpoint = (
-                    start_dt.year == end_dt.year and start_dt.month == end_dt.month
-                )
-
-            if startDate and use_month_endpoint:
-                month_str = start_dt.strftime("%Y-%m-01")
-                url = f"https://api.ynab.com/v1/budgets/{budget_id}/months/{month_str}/transactions"
-            elif startDate:
-                url = f"https://api.ynab.com/v1/budgets/{budget_id}/transactions?since_date={startDate}"
-            else:
-                url = f"https://api.ynab.com/v1/budgets/{budget_id}/transactions"
-                
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                apiErr = f"YNAB API error: {response.status_code} {response.text}"
-                await emitter.emit(
-                    status="error", description=apiErr, done=True, debug=debugState
-                )
-                return apiErr
+            if not store:
+                try:
+                    transactions, fetchStats = await _FLIGHTS["fetch"].run(
+                        (
+                            token_key(headers),
+                            budget_id,
+                            startDate,
+                            endDate,
+                            tuple(sorted(scope.items())),
+                        ),
+                        lambda: fetch_transactions(
+                            budget_id, headers, startDate, endDate, scope
+                        ),
+                    )
+                except YNABAPIError as e:
+                    await emitter.emit(
+                        status="error", description=str(e), done=True, debug=debugState
+                    )
+                    return str(e)
+                except Exception as e:
+                    # Connection errors and timeouts once retries are used up, or a truncated response body
+                    requestFail = "YNAB request failed."
+                    await emitter.emit(
+                        status="error",
+                        description=requestFail,
+                        done=True,
+                        err=e,
+                        debug=debugState,
+                    )
+                    return f"{requestFail} Error: {str(e)}"
+                if debugState in {"Basic", "Full"}:
+                    print(
+                        f"[ynab_api_request] Fetch plan: {fetchStats['plan']}, "
+                        f"{fetchStats['requests']} requests ({fetchStats['cached']} months cached), "
+                        f"{fetchStats['bytes']} bytes fetched, {fetchStats['rows']} rows kept"
+                    )
 
             try:
 
-                transactions = response.json().get("data", {}).get("transactions", [])
-                if startDate and endDate:
-                    start_dt = date.fromisoformat(startDate)
-                    end_dt = date.fromisoformat(endDate)
-
-                    print(f"start_dt: {start_dt}, end_dt: {end_dt}")
-                    print(f"Initial transaction count: {len(transactions)}")
+                if store:
+                    # Binary search over the mirror's in-memory, date-sorted index
+                    index = await asyncio.to_thread(get_transaction_index, store, budget_id)
+                    with span("filter") as record:
+                        window = index.select(startDate, endDate, scope)
+                        record["rows"] = len(index.dates[window])
 
-                    transactions = [
-                        tx for tx in transactions
-                        if start_dt <= date.fromisoformat(tx.get("date", "9999-12-31")) <= end_dt
-                    ]
-
-                    print(f"Filtered transaction count: {len(transactions)}")
+                if dataType == "aggregate":
+                    groupBy = options.get("groupBy", "category")
+                    # Sum integer milliunits and only convert the (few) totals
+                    with span("filter"):
+                        if store:
+                            rows = index.group(window, groupBy)
+                        else:
+                            rows = aggregate_rows(
+                                (
+                                    {
+                                        "date": tx.get("date") or "",
+                                        "amount": tx.get("amount", 0),
+                                        "payee": tx.get("payee_name") or "Unknown",
+                                        "category": tx.get("category_name")
+                                        or "Uncategorized",
+                                        "account": tx.get("account_name")
+                                        or "Unknown Account",
+                                        "transfer": bool(tx.get("transfer_account_id")),
+                                    }
+                                    for tx in transactions
+                                ),
+                                groupBy,
+                            )
+                    transactionCount = rows[-1]["count"] if rows else 0
+                    for row in rows:
+                        # Whole cents, in milliunits
+                        row["average"] = round(row["net"] / row["count"] / 10) * 10
+                    period = f" ({startDate} to {endDate})" if startDate else ""
+                    processed_transactions, _ = render_context(
+                        f"YNAB Outflows and Inflows by {groupBy.capitalize()}, Transfers Excluded{period}{scopeLabel}",
+                        aggregate_columns(groupBy),
+                        rows,
+                        contextFormat,
+                        AGGREGATE_PLAINTEXT,
+                    )
+                else:
+                    if store:
+                        rows = index.rows(window)
+                    else:
+                        rows = (
+                            {
+                                "date": tx.get("date") or "",
+                                "payee": tx.get("payee_name") or "Unknown",
+                                "amount": tx.get("amount", 0),
+                                "category": tx.get("category_name") or "Uncategorized",
+                                "account": tx.get("account_name") or "Unknown Account",
+                                "memo": tx.get("memo") or "",
+                            }
+                            for tx in transactions
+                        )
+                    processed_transactions, transactionCount = render_context(
+                        f"All YNAB Transactions{scopeLabel}",
+                        TRANSACTION_COLUMNS,
+                        rows,
+                        contextFormat,
+                        TRANSACTION_PLAINTEXT,
+                    )
 
-                if not transactions:
+                if not transactionCount:
                     noTxError = f"No transactions found."
                     await emitter.emit(
                         status="error",
@@ -364,49 +2586,15 @@ class Tools:
                         debug=debugState,
                     )
                     return noTxError
-                processed_transactions_json = {"All YNAB Transactions": []}
-                processed_transactions_markdown = """
-                    | Transaction Date | Payee | Amount | Category | Account | Notes |\n
-                    | --- | --- | ---: | --- | --- | --- |\n
-                    """
-                processed_transactions_plaintext = "All YNAB Transactions:\n"
-                for tx in transactions:
-                    txDate = tx.get("date", "")
-                    payee = (tx.get("payee_name", "Unknown"),)
-                    amount = tx.get("amount", 0) / 1000.0
-                    category = tx.get("category_name", "Uncategorized")
-                    account = tx.get("account_name", "Unknown Account")
-                    memo = tx.get("memo", "")
-                    processed_transactions_json["All YNAB Transactions"].append(
-                        {
-                            "date": txDate,
-                            "payee": payee,
-                            "amount": amount,
-                            "category": category,
-                            "account": account,
-                            "memo": memo,
-                        }
-                    )
-                    processed_transactions_markdown += f"| {txDate} | {payee} | {amount} | {category} | {account} | {memo} |\n"
-                    processed_transactions_plaintext += f"- Date: {txDate}, Payee: {payee}, Amount: {amount}, Category: {category}, Account: {account}, Memo: {memo}\n"
                 await emitter.emit(
                     status="complete",
-                    description="YNAB transaction data fetched successfully",
+                    description=f"YNAB transaction data fetched successfully ({transactionCount} transactions, {limiter.describe()})",
                     done=True,
                     debug=debugState,
                 )
-                if contextFormat == "JSON":
-                    if debugState == "Full":
-                        print(processed_transactions_json)
-                    return processed_transactions_json
-                elif contextFormat == "Markdown":
-                    if debugState == "Full":
-                        print(processed_transactions_markdown)
-                    return processed_transactions_markdown
-                elif contextFormat == "Plaintext":
-                    if debugState == "Full":
-                        print(processed_transactions_plaintext)
-                    return processed_transactions_plaintext
+                if debugState == "Full":
+                    print(processed_transactions)
+                return processed_transactions
             except Exception as e:
                 transactionFail = "YNAB transaction data fetch failed."
                 await emitter.emit(
@@ -418,6 +2606,96 @@ class Tools:
                 )
                 return f"{transactionFail} Error: {str(e)}"
 
+        elif dataType == "balances":
+
+            today = date.today()
+            endDate = min(endDate or str(today), str(today))
+            startDate = min(
+                startDate or str(today - timedelta(days=BALANCE_DEFAULT_DAYS)), endDate
+            )
+            await emitter.emit(
+                description=f"Computing YNAB balances from {startDate} to {endDate}...",
+                debug=debugState,
+            )
+
+            try:
+                if store:
+                    accounts = store.get_accounts(budget_id)
+                    index = await asyncio.to_thread(get_transaction_index, store, budget_id)
+                else:
+                    # Only what happened since startDate is needed to walk back from today's balances
+                    url = f"{YNAB_API_BASE}/budgets/{budget_id}/accounts"
+                    response = await ynab_request("GET", url, headers)
+                    if response.status_code != 200:
+                        raise YNABAPIError(response.status_code, response.text)
+                    accounts = [
+                        acc
+                        for acc in response.json().get("data", {}).get("accounts", [])
+                        if not acc.get("deleted", False)
+                    ]
+                    transactions, _ = await _FLIGHTS["fetch"].run(
+                        (token_key(headers), budget_id, startDate, None, ()),
+                        lambda: fetch_transactions(budget_id, headers, startDate, None),
+                    )
+                    index = TransactionIndex()
+                    index.merge(transactions)
+            except YNABAPIError as e:
+                await emitter.emit(
+                    status="error", description=str(e), done=True, debug=debugState
+                )
+                return str(e)
+            except Exception as e:
+                # Connection errors and timeouts once retries are used up, or a truncated response body
+                requestFail = "YNAB request failed."
+                await emitter.emit(
+                    status="error",
+                    description=requestFail,
+                    done=True,
+                    err=e,
+                    debug=debugState,
+                )
+                return f"{requestFail} Error: {str(e)}"
+
+            try:
+                with span("filter"):
+                    balanceRows, netWorthRows = index.balances(accounts, startDate, endDate)
+                period = f"{startDate} to {endDate}"
+                processed_balances = join_contexts(
+                    render_context(
+                        f"YNAB Account Balances ({period})",
+                        BALANCE_COLUMNS,
+                        balanceRows,
+                        contextFormat,
+                        BALANCE_PLAINTEXT,
+                    )[0],
+                    render_context(
+                        f"YNAB Net Worth ({period})",
+                        NET_WORTH_COLUMNS,
+                        netWorthRows,
+                        contextFormat,
+                        NET_WORTH_PLAINTEXT,
+                    )[0],
+                )
+                await emitter.emit(
+                    status="complete",
+                    description=f"YNAB balances computed successfully ({len(netWorthRows)} dates, {limiter.describe()})",
+                    done=True,
+                    debug=debugState,
+                )
+                if debugState == "Full":
+                    print(processed_balances)
+                return processed_balances
+            except Exception as e:
+                balanceFail = "YNAB balance history failed."
+                await emitter.emit(
+                    status="error",
+                    description=balanceFail,
+                    done=True,
+                    err=e,
+                    debug=debugState,
+                )
+                return f"{balanceFail} Error: {str(e)}"
+
         # If all else fails...
 
         finalError = "No matching YNAB data found."
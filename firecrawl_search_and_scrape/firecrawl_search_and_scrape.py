@@ -5,28 +5,921 @@ author: megaphonix
 author_url: https://github.com/megaphonixmusic
 git_url: https://github.com/megaphonixmusic/open-webui-tools
 required_open_webui_version: 0.6.5
-requirements: tiktoken
-version: 0.1.0
+requirements: tiktoken, httpx
+version: 0.2.0
 """
 
+# v0.2.0 [2026-10-17]
+# - Firecrawl requests are non-blocking (shared async HTTP client with connection pooling)
+# - Fixed request timeout (was passed in milliseconds); 'Timeout' is now a deadline for the whole call, answered with the pages already at hand when it is reached
+# - Added 'SearXNG + Firecrawl Scrape' search mode: pages are scraped in parallel and slow pages are dropped
+# - Added 'Max Context Tokens' Valve: returned content is packed to fit a token budget
+# - Added page cache (TTL, size-bounded LRU, optional on-disk) and deduplication of identical pages
+# - Generated search queries and search results are cached ('Query Cache TTL', 'Search Cache TTL')
+# - Concurrent identical query generations, searches and page scrapes share one upstream call, cancelled once no caller is waiting
+# - Scraped pages are cleaned in one pass: navigation, link lists, cookie/newsletter/footer text and repeated blocks are dropped, whitespace and tables collapsed
+# - Added 'Max Chunks Per Source' Valve: only the heading-led chunks of each page that best match the prompt and search query (BM25) are kept
+# - Added 'Metrics Directory' Valve: per-stage timings (query generation, HTTP, search, scrape, clean, rank, pack) and byte/row/token counts as JSON lines and Prometheus histograms
+#
 # v0.0.1 [2025-06-06]
 # - First commit
 
 from datetime import datetime
 from typing import Any, Callable, List, Optional, Literal, Awaitable
 from pydantic import BaseModel, Field
-import requests
+import httpx
 import re
 import json
+import asyncio
+import time
+import os
+import hashlib
+import math
+import sqlite3
+import threading
+import weakref
+import functools
+import contextvars
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import tiktoken
+from open_webui.config import CACHE_DIR
 from open_webui.models.users import Users
 from open_webui.utils.chat import generate_chat_completion
 
-def clean_markdown(md):
-    # Remove images and links, keep the text
-    md = re.sub(r'!?\[([^\]]+)\]\([^\)]+\)', r'\1', md)
-    # Remove empty link brackets left over
-    md = re.sub(r'\[\]\([^\)]+\)', '', md)
-    return md.strip()
+HTTP_MAX_CONNECTIONS_PER_HOST = 10
+
+# Per event loop: a client's pooled connections (and a semaphore) can't be used from another loop
+_HTTP_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # loop -> httpx.AsyncClient
+_HOST_SEMAPHORES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()  # loop -> {host: asyncio.Semaphore}
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Async HTTP client of the running event loop: keep-alive connection pooling, HTTP/2 when `h2` is installed.
+    Each loop gets its own client; those of loops that have been closed are dropped.
+    """
+    loop = asyncio.get_running_loop()
+    client = _HTTP_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        # Open connections refer back to their loop, so a closed loop's client is never collected on its own
+        for oldLoop in [oldLoop for oldLoop in _HTTP_CLIENTS if oldLoop.is_closed()]:
+            del _HTTP_CLIENTS[oldLoop]
+            _HOST_SEMAPHORES.pop(oldLoop, None)
+        try:
+            import h2  # noqa: F401
+            http2 = True
+        except ImportError:
+            http2 = False
+        client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=20,
+                keepalive_expiry=60
+            )
+        )
+        _HTTP_CLIENTS[loop] = client
+        _HOST_SEMAPHORES[loop] = {}
+    return client
+
+async def http_request(method: str, url: str, **kwargs) -> httpx.Response:
+    # httpx limits are pool-wide, so cap concurrent requests per host separately
+    client = get_http_client()
+    host = urlsplit(url).netloc
+    semaphores = _HOST_SEMAPHORES[asyncio.get_running_loop()]
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    async with semaphores[host]:
+        with span("http") as record:
+            response = await client.request(method, url, **kwargs)
+            record["bytes"] = response.num_bytes_downloaded
+            return response
+
+TOOL_NAME = "firecrawl_search_and_scrape"
+# Latency histogram buckets in seconds, shared by every stage
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_COUNTS = ("bytes", "rows", "tokens")
+
+class StageMetrics:
+    """
+    Process-wide latency histograms and byte/row/token totals per stage, for every call of this tool.
+    Rendered in the Prometheus text exposition format by `prometheus`.
+    """
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.calls = {}
+
+    def observe(self, stage: str, seconds: float, counts: dict):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {
+                    "buckets": [0] * len(METRIC_BUCKETS),
+                    "count": 0,
+                    "sum": 0.0,
+                    **{key: 0 for key in METRIC_COUNTS}
+                }
+            entry["count"] += 1
+            entry["sum"] += seconds
+            for n, bound in enumerate(METRIC_BUCKETS):
+                if seconds <= bound:
+                    entry["buckets"][n] += 1
+            for key in METRIC_COUNTS:
+                entry[key] += int(counts.get(key) or 0)
+
+    def count_call(self, status: str):
+        with self.lock:
+            self.calls[status] = self.calls.get(status, 0) + 1
+
+    def prometheus(self) -> str:
+        with self.lock:
+            stages = {
+                stage: {**entry, "buckets": list(entry["buckets"])}
+                for stage, entry in sorted(self.stages.items())
+            }
+            calls = dict(self.calls)
+        tool = f'tool="{self.tool}"'
+        lines = [
+            "# HELP openwebui_tool_stage_seconds Time spent in each stage of a tool call",
+            "# TYPE openwebui_tool_stage_seconds histogram"
+        ]
+        for stage, entry in stages.items():
+            labels = f'{tool},stage="{stage}"'
+            for bound, count in zip(METRIC_BUCKETS, entry["buckets"]):
+                lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'openwebui_tool_stage_seconds_bucket{{{labels},le="+Inf"}} {entry["count"]}')
+            lines.append(f"openwebui_tool_stage_seconds_sum{{{labels}}} {entry['sum']:.6f}")
+            lines.append(f"openwebui_tool_stage_seconds_count{{{labels}}} {entry['count']}")
+        for key in METRIC_COUNTS:
+            lines.append(f"# HELP openwebui_tool_stage_{key}_total {key.capitalize()} handled by each stage")
+            lines.append(f"# TYPE openwebui_tool_stage_{key}_total counter")
+            for stage, entry in stages.items():
+                if entry[key]:
+                    lines.append(f'openwebui_tool_stage_{key}_total{{{tool},stage="{stage}"}} {entry[key]}')
+        lines.append("# HELP openwebui_tool_calls_total Tool calls by final status")
+        lines.append("# TYPE openwebui_tool_calls_total counter")
+        for status, count in sorted(calls.items()):
+            lines.append(f'openwebui_tool_calls_total{{{tool},status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+class CallTrace:
+    """
+    Stage timings and counts of one tool call. Set in `_TRACE` for the duration of the call,
+    so helpers record into it through `span` without it being passed around.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.status = "complete"
+        self.stages = {}
+
+    def add(self, stage: str, seconds: float, counts: dict):
+        entry = self.stages.setdefault(
+            stage, {"seconds": 0.0, "calls": 0, **{key: 0 for key in METRIC_COUNTS}}
+        )
+        entry["seconds"] += seconds
+        entry["calls"] += 1
+        for key in METRIC_COUNTS:
+            entry[key] += int(counts.get(key) or 0)
+
+    def summary(self) -> str:
+        parts = []
+        for stage, entry in self.stages.items():
+            details = [f"{entry['calls']}x"] if entry["calls"] > 1 else []
+            if entry["bytes"]:
+                details.append(f"{entry['bytes'] / 1024:,.0f} KB")
+            if entry["rows"]:
+                details.append(f"{entry['rows']:,} rows")
+            if entry["tokens"]:
+                details.append(f"~{entry['tokens']:,} tokens")
+            parts.append(
+                f"{stage} {entry['seconds']:.3f}s" + (f" ({', '.join(details)})" if details else "")
+            )
+        return ", ".join(parts)
+
+    def record(self) -> dict:
+        return {
+            "time": datetime.fromtimestamp(self.started).isoformat(timespec="milliseconds"),
+            "tool": TOOL_NAME,
+            "status": self.status,
+            # Counts a stage never records are left out
+            "stages": {
+                stage: {
+                    "seconds": round(entry["seconds"], 6),
+                    "calls": entry["calls"],
+                    **{key: entry[key] for key in METRIC_COUNTS if entry[key]}
+                }
+                for stage, entry in self.stages.items()
+            }
+        }
+
+_METRICS = StageMetrics(TOOL_NAME)
+_TRACE: contextvars.ContextVar = contextvars.ContextVar(f"{TOOL_NAME}_trace", default=None)
+
+@contextmanager
+def span(stage: str, **counts):
+    """
+    Times the block as `stage`. Counts ("bytes", "rows", "tokens") can be passed up front
+    or set on the yielded dict inside the block. Stages can nest (e.g. "http" inside "scrape").
+    """
+    record = dict(counts)
+    started = time.monotonic()
+    try:
+        yield record
+    finally:
+        seconds = time.monotonic() - started
+        _METRICS.observe(stage, seconds, record)
+        trace = _TRACE.get()
+        if trace is not None:
+            trace.add(stage, seconds, record)
+
+def estimate_tokens(context: Any) -> int:
+    # ~4 characters per token: cheap enough to run on every rendered context
+    return len(context if isinstance(context, str) else json.dumps(context)) // 4
+
+def write_metrics(directory: str, trace: CallTrace):
+    # One JSON line per call; the .prom file is replaced whole so a scraper never reads half of it
+    if not directory:
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"{TOOL_NAME}.jsonl"), "a", encoding="utf-8") as file:
+            file.write(json.dumps(trace.record()) + "\n")
+        path = os.path.join(directory, f"{TOOL_NAME}.prom")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+            file.write(_METRICS.prometheus())
+        os.replace(f"{path}.tmp", path)
+    except OSError as e:
+        print(f"[{TOOL_NAME}] Metrics not written: {e}")
+
+def traced(run: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Wraps `Tools._run`: the whole call is timed as stage "call", its spans are collected
+    and then written to the 'Metrics Directory' (if set) and printed when 'Debug' is on.
+    """
+
+    @functools.wraps(run)
+    async def wrapper(self, *args, **kwargs):
+        trace = CallTrace()
+        token = _TRACE.set(trace)
+        try:
+            with span("call"):
+                return await run(self, *args, **kwargs)
+        except BaseException:
+            trace.status = "error"
+            raise
+        finally:
+            _TRACE.reset(token)
+            _METRICS.count_call(trace.status)
+            write_metrics(self.valves.METRICS_DIR, trace)
+            if self.valves.DEBUG in {"Basic", "Full"}:
+                print(f"[{TOOL_NAME}] Stages: {trace.summary()}")
+
+    return wrapper
+
+# Share of the overall TIMEOUT that search query generation may use before falling back to the raw prompt
+QUERY_GENERATION_BUDGET = 0.3
+
+class Deadline:
+    """
+    Overall time budget for one tool call. Each stage is timed so the split can be reported, and recorded as a metrics span.
+    """
+
+    def __init__(self, seconds: float):
+        self.started = time.monotonic()
+        self.expires = self.started + seconds
+        self.stages = {}
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    @contextmanager
+    def stage(self, name: str):
+        stageStart = time.monotonic()
+        try:
+            with span(name) as record:
+                yield record
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.monotonic() - stageStart
+
+    def summary(self) -> str:
+        stages = ", ".join(f"{name} {spent:.1f}s" for name, spent in self.stages.items())
+        total = time.monotonic() - self.started
+        return f"{stages}; total {total:.1f}s" if stages else f"total {total:.1f}s"
+
+# Cleaning patterns, compiled once. Link targets may hold one level of parentheses (Wikipedia-style URLs)
+LINK_TARGET = r"\((?:[^()\n]|\([^()\n]*\))*\)"
+INLINE_MARKUP = re.compile(
+    rf"\[!\[[^\]\n]*\]{LINK_TARGET}\]{LINK_TARGET}"
+    rf"|!\[[^\]\n]*\]{LINK_TARGET}"
+    rf"|\[(?P<link>[^\[\]\n]*)\]{LINK_TARGET}"
+    r"|<https?://[^>\s]+>"
+    r"|</?(?:a|b|i|u|p|br|div|em|font|img|small|span|strong|sub|sup)\b[^>\n]*>"
+    r"|\\(?P<escaped>[\\`*_{}\[\]()#+\-.!|<>])"
+)
+HEADING = re.compile(r"#{1,6}(?= )")
+FENCE = re.compile(r"\s*(```|~~~)")
+RULE = re.compile(r"\s*([-*_=])(?:\s*\1){2,}\s*")
+TABLE_DELIMITER = re.compile(r"\|?(?:\s*:?-+:?\s*\|)+\s*:?-*:?\s*")
+TABLE_PADDING = re.compile(r"[ \t]*\|[ \t]*")
+INNER_SPACE = re.compile(r"[ \t\u00a0\u200b]{2,}")
+WORD_CHARS = re.compile(r"\w")
+# Cookie banners, newsletter prompts, share bars and footers; only checked on short blocks, and only dropped
+# when another signal agrees: some link text, or a place where boilerplate lives (the first or last few blocks)
+BOILERPLATE = re.compile(
+    r"\b(accept (all )?cookies|we use cookies|(this|our) (site|website) uses cookies|cookie (policy|settings|preferences)"
+    r"|privacy policy|terms (of (use|service)|and conditions)|all rights reserved|skip to (main )?content"
+    r"|subscribe to (our|the)|sign up for (our|the)|newsletter|follow us|share (this|on)|advertisement|back to top)\b"
+    r"|©|\(c\) \d{4}",
+    re.IGNORECASE
+)
+BOILERPLATE_MAX_CHARS = 300
+BOILERPLATE_LINK_DENSITY = 0.2
+BOILERPLATE_EDGE_BLOCKS = 3
+# Blocks whose text is mostly link text are navigation, tag clouds and link farms
+LINK_DENSITY_MAX = 0.5
+
+def clean_markdown(md: str) -> str:
+    """
+    Strips a scraped page down to its content in one pass over its lines:
+    links become their text, images, HTML tags and Markdown escapes go, whitespace and table padding collapse,
+    and boilerplate blocks are dropped (mostly links, repeated earlier on the page, or short cookie/newsletter/footer text
+    that also has links or sits at the top or bottom of the page).
+    Headings left with nothing under them are dropped too. Fenced code is kept as is.
+    """
+    blocks = []
+    seen = set()
+    lines = []
+    linkChars = 0
+    fence = None
+    position = 0
+
+    def replace(match):
+        nonlocal linkChars
+        text = match.group("link")
+        if text is not None:
+            linkChars += len(text)
+            return text
+        escaped = match.group("escaped")
+        return escaped if escaped is not None else ""
+
+    def flush():
+        nonlocal lines, linkChars, position
+        if not lines:
+            return
+        text = "\n".join(lines)
+        heading = HEADING.match(text)
+        lines, chars, linkChars = [], linkChars, 0
+        position += 1
+        boilerplate = None
+        if not text.startswith(("```", "~~~")):
+            key = " ".join(text.lower().split())
+            if not heading and len(text) <= BOILERPLATE_MAX_CHARS and BOILERPLATE.search(text):
+                boilerplate = position
+            drop = not heading and (
+                key in seen
+                or chars > LINK_DENSITY_MAX * len(text)
+                or boilerplate and (position <= BOILERPLATE_EDGE_BLOCKS or chars > BOILERPLATE_LINK_DENSITY * len(text))
+                or not WORD_CHARS.search(text)
+            )
+            seen.add(key)
+            if drop:
+                # A heading whose section turns out empty is dropped below
+                if blocks and blocks[-1][1]:
+                    blocks[-1][2] = True
+                return
+        # Boilerplate text in the middle of the page may be content; its distance from the end is only known below
+        blocks.append([text, len(heading.group(0)) if heading else 0, False, boilerplate])
+
+    for line in md.splitlines():
+        if fence:
+            lines.append(line.rstrip())
+            if line.strip().startswith(fence):
+                fence = None
+                flush()
+            continue
+        opening = FENCE.match(line)
+        if opening:
+            flush()
+            fence = opening.group(1)
+            lines.append(line.strip())
+            continue
+        if not line.strip():
+            flush()
+            continue
+        if RULE.fullmatch(line) and not TABLE_DELIMITER.fullmatch(line):
+            # Setext underline: the line above is a heading; any other rule is dropped
+            underline = line.strip()
+            if lines and underline[0] in "=-" and underline == underline[0] * len(underline):
+                title = lines.pop()
+                flush()
+                lines.append(("# " if underline[0] == "=" else "## ") + title.strip())
+                flush()
+            continue
+        # Substitutions only run on lines that need them
+        if "[" in line or "<" in line or "\\" in line:
+            line = INLINE_MARKUP.sub(replace, line)
+        if "  " in line or "\t" in line or "\u00a0" in line:
+            indent = len(line) - len(line.lstrip())
+            line = line[:indent] + INNER_SPACE.sub(" ", line[indent:])
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if line.lstrip().startswith("|"):
+            line = line.strip()
+            if TABLE_DELIMITER.fullmatch(line):
+                # Shortest delimiter that keeps the column alignment (:-, -:, :-:)
+                line = "|" + "|".join(
+                    (":" if cell.strip().startswith(":") else "") + "-" + (":" if cell.strip().endswith(":") else "")
+                    for cell in line.strip("|").split("|")
+                ) + "|"
+            else:
+                line = TABLE_PADDING.sub("|", line)
+                if not line.strip("|"):
+                    continue
+        if HEADING.match(line):
+            flush()
+            lines.append(line)
+            flush()
+            continue
+        lines.append(line)
+    flush()
+
+    # Walk back so each heading knows what follows it
+    kept = []
+    nextLevel = None
+    droppedBelow = False
+    for text, level, emptied, boilerplate in reversed(blocks):
+        if boilerplate and boilerplate > position - BOILERPLATE_EDGE_BLOCKS:
+            droppedBelow = True
+            continue
+        emptied = emptied or (level and droppedBelow)
+        droppedBelow = False
+        if level and emptied and (nextLevel is None or 0 < nextLevel <= level):
+            continue
+        kept.append(text)
+        nextLevel = level
+    return BLOCK_SEPARATOR.join(reversed(kept))
+
+SOURCE_SEPARATOR = "\n\n---\n\n"
+BLOCK_SEPARATOR = "\n\n"
+TOKENIZER_ENCODING = "cl100k_base"
+
+_ENCODING = None
+
+class ApproximateEncoding:
+    """
+    Stands in for a tiktoken encoding when its data can't be loaded: every 4 characters count as one token.
+    """
+
+    def encode(self, text: str, **kwargs) -> List[str]:
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    def encode_batch(self, texts: List[str], **kwargs) -> List[List[str]]:
+        return [self.encode(text) for text in texts]
+
+    def decode(self, tokens: List[str]) -> str:
+        return "".join(tokens)
+
+def get_encoding():
+    global _ENCODING
+    if _ENCODING is None:
+        try:
+            _ENCODING = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            # Offline installs may lack the tokenizer data; the budget is then kept at ~4 characters per token
+            print(f"[firecrawl_search_and_scrape] Tokenizer unavailable, estimating tokens from length: {e}")
+            _ENCODING = ApproximateEncoding()
+    return _ENCODING
+
+def split_blocks(md: str) -> List[str]:
+    # Paragraph boundaries, plus a boundary before every heading even without a blank line
+    blocks = []
+    for paragraph in re.split(r"\n\s*\n", md):
+        blocks.extend(part for part in re.split(r"\n(?=#{1,6} )", paragraph) if part.strip())
+    return blocks
+
+# Chunk selection: pages are split into heading-led chunks of roughly this many characters
+CHUNK_MAX_CHARS = 1500
+BM25_K1 = 1.2
+BM25_B = 0.75
+TERM = re.compile(r"\w+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which",
+    "who", "why", "will", "with", "you", "your",
+}
+
+def query_terms(queries: List[str]) -> dict:
+    """
+    Maps each word form to look for in pages to its query term: lowercased, without stopwords,
+    singular and plural ("release" and "releases") both counting as the same term.
+    """
+    forms = {}
+    for word in TERM.findall(" ".join(queries).lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        forms[word] = forms[word + "s"] = word
+    return forms
+
+def split_chunks(md: str) -> List[dict]:
+    """
+    Splits a page into chunks that each start at a heading (or continue a long section), cut at block boundaries.
+    Every chunk remembers the heading of its section so it can be shown, and scored, under it.
+    """
+    chunks = []
+    heading = ""
+    for block in split_blocks(md):
+        lead = bool(HEADING.match(block))
+        if lead:
+            heading = block.split("\n", 1)[0]
+        # A heading always takes at least the block after it
+        if not lead and chunks and chunks[-1]["heading"] == heading and (
+            chunks[-1]["chars"] + len(block) <= CHUNK_MAX_CHARS
+            or chunks[-1]["lead"] and len(chunks[-1]["blocks"]) == 1
+        ):
+            chunks[-1]["blocks"].append(block)
+            chunks[-1]["chars"] += len(block)
+        else:
+            chunks.append({"heading": heading, "lead": lead, "blocks": [block], "chars": len(block)})
+    return chunks
+
+def select_chunks(sources: List[dict], queries: List[str], maxChunks: int) -> tuple:
+    """
+    Keeps the `maxChunks` chunks of each source that score highest against `queries` with BM25
+    (statistics over all chunks of all sources, section headings counted with each chunk), in page order.
+    Ties and pages with no matching terms keep their leading chunks. Returns the sources and the chunks kept/total.
+    """
+    forms = query_terms(queries)
+    # Only query terms are matched; every other word just adds to the chunk's length
+    matcher = re.compile(r"\b(?:" + "|".join(map(re.escape, sorted(forms, key=len, reverse=True))) + r")\b") if forms else None
+    stems = set(forms.values())
+    pages = []
+    for source in sources:
+        chunks = split_chunks(source["markdown"])
+        for chunk in chunks:
+            text = "\n".join(chunk["blocks"])
+            text = (text if chunk["lead"] else chunk["heading"] + "\n" + text).lower()
+            chunk["length"] = len(text.split())
+            # Plain substring checks rule out most chunks before the (slower) word-boundary regex
+            if matcher and any(stem in text for stem in stems):
+                chunk["counts"] = Counter(map(forms.__getitem__, matcher.findall(text)))
+            else:
+                chunk["counts"] = Counter()
+        pages.append(chunks)
+
+    allChunks = [chunk for chunks in pages for chunk in chunks]
+    total = len(allChunks)
+    if maxChunks <= 0 or not total:
+        return sources, total, total
+    averageLength = sum(chunk["length"] for chunk in allChunks) / total or 1
+    documentFrequency = Counter(term for chunk in allChunks for term in chunk["counts"])
+    idf = {
+        term: math.log(1 + (total - count + 0.5) / (count + 0.5))
+        for term, count in documentFrequency.items()
+    }
+
+    selected = []
+    kept = 0
+    for source, chunks in zip(sources, pages):
+        if len(chunks) <= maxChunks:
+            selected.append(source)
+            kept += len(chunks)
+            continue
+        scores = []
+        for position, chunk in enumerate(chunks):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * chunk["length"] / averageLength)
+            score = sum(
+                idf[term] * count * (BM25_K1 + 1) / (count + norm)
+                for term, count in chunk["counts"].items()
+            )
+            scores.append((-score, position))
+        best = sorted(position for _, position in sorted(scores)[:maxChunks])
+        blocks = []
+        for n, position in enumerate(best):
+            chunk = chunks[position]
+            # A chunk cut off from its heading gets it back, unless the previous kept chunk already shows it
+            if chunk["heading"] and not chunk["lead"] and (
+                n == 0 or best[n - 1] != position - 1
+            ):
+                blocks.append(chunk["heading"])
+            blocks.extend(chunk["blocks"])
+        selected.append({**source, "markdown": BLOCK_SEPARATOR.join(blocks)})
+        kept += len(best)
+    return selected, kept, total
+
+def source_header(title: str, url: str) -> str:
+    return f"## Source: [{title}]({url})\n\n"
+
+def truncate_block(block: str, maxTokens: int) -> str:
+    # Last resort for a single block larger than its allocation: cut at the last line/sentence end
+    encoding = get_encoding()
+    text = encoding.decode(encoding.encode(block, disallowed_special=())[:maxTokens])
+    cut = max(text.rfind("\n"), text.rfind(". "))
+    if cut < len(text) // 2:
+        cut = text.rfind(" ")
+    return text[:cut + 1].rstrip() if cut > 0 else ""
+
+def pack_sources(sources: List[dict], maxTokens: int):
+    """
+    Packs scraped pages into a single string that fits in `maxTokens` (0 = no limit).
+    Each page is tokenized once (per block); the budget is split fairly between pages (short pages keep
+    everything, long pages share what is left) and pages are cut at paragraph/heading boundaries.
+    Returns the packed string and the tokens used by each source.
+    """
+    if maxTokens <= 0:
+        # Nothing to fit, so skip the tokenizer and report ~4 characters per token
+        sourceTokens, texts = [], []
+        for source in sources:
+            header = source_header(source["title"], source["url"])
+            texts.append(header + BLOCK_SEPARATOR.join(split_blocks(source["markdown"])))
+            sourceTokens.append((header, len(texts[-1]) // 4))
+        return SOURCE_SEPARATOR.join(texts), sourceTokens
+
+    encoding = get_encoding()
+
+    def count(text: str) -> int:
+        # Scraped pages can contain special-token text such as "<|endoftext|>"; count it as plain text
+        return len(encoding.encode(text, disallowed_special=()))
+
+    pages = []
+    for source in sources:
+        header = source_header(source["title"], source["url"])
+        blocks = split_blocks(source["markdown"])
+        blockTokens = [len(tokens) for tokens in encoding.encode_batch(blocks, disallowed_special=())] if blocks else []
+        pages.append({
+            "header": header,
+            "headerTokens": count(header),
+            "blocks": blocks,
+            "blockTokens": blockTokens,
+            # +1 per block for the blank line joining it to the next one
+            "demand": sum(blockTokens) + len(blocks),
+        })
+
+    separatorTokens = count(SOURCE_SEPARATOR)
+    # Drop the lowest ranked pages if even their headers don't fit
+    while pages and sum(page["headerTokens"] + separatorTokens for page in pages) > maxTokens:
+        pages.pop()
+    budget = maxTokens - sum(page["headerTokens"] + separatorTokens for page in pages)
+
+    # Water-filling: smallest demands are satisfied first, the rest split what remains
+    allocations = {}
+    remaining = budget
+    order = sorted(range(len(pages)), key=lambda i: pages[i]["demand"])
+    for position, i in enumerate(order):
+        share = remaining // (len(order) - position)
+        allocations[i] = min(pages[i]["demand"], share)
+        remaining -= allocations[i]
+
+    def fill(page: dict, allocation: int) -> int:
+        # Keep whole blocks, in order, while they fit; returns the tokens used
+        used = page["used"]
+        while page["kept"] < len(page["blocks"]):
+            tokens = page["blockTokens"][page["kept"]] + 1
+            if used + tokens > allocation:
+                break
+            used += tokens
+            page["kept"] += 1
+        return used
+
+    for i, page in enumerate(pages):
+        page["kept"], page["used"] = 0, 0
+        page["used"] = fill(page, allocations[i])
+        if page["kept"] == 0 and page["blocks"] and allocations[i] > 1:
+            # Not even the first block fits: cut it at a line/sentence boundary instead
+            partial = truncate_block(page["blocks"][0], allocations[i] - 1)
+            if partial:
+                page["blocks"][0] = partial
+                page["blockTokens"][0] = count(partial)
+                page["used"] = fill(page, allocations[i])
+
+    # Allocations rarely fill exactly at block boundaries; hand the slack to cut pages in rank order
+    slack = budget - sum(page["used"] for page in pages)
+    for page in pages:
+        if page["kept"] < len(page["blocks"]) and slack > 1:
+            before = page["used"]
+            page["used"] = fill(page, before + slack)
+            slack -= page["used"] - before
+
+    for page in pages:
+        page["blocks"] = page["blocks"][:page["kept"]]
+
+    def assemble():
+        return SOURCE_SEPARATOR.join(
+            page["header"] + BLOCK_SEPARATOR.join(page["blocks"]) for page in pages
+        )
+
+    content = assemble()
+    # Tokens don't always add up exactly across joins; trim until the whole string fits
+    while pages and count(content) > maxTokens:
+        longest = max(pages, key=lambda page: len(page["blocks"]))
+        if longest["blocks"]:
+            longest["blocks"].pop()
+        else:
+            pages.pop()
+        content = assemble()
+
+    sourceTokens = [
+        (page["header"], count(page["header"] + BLOCK_SEPARATOR.join(page["blocks"])))
+        for page in pages
+    ]
+    return content, sourceTokens
+
+class TTLCache:
+    """
+    LRU cache with a time-to-live per entry, bounded by total size in bytes.
+    Optionally write-through to a SQLite file so entries survive restarts.
+    """
+
+    def __init__(self, ttl: float, maxBytes: int, path: Optional[str] = None):
+        self.ttl = ttl
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()  # key -> (storedAt, size, value)
+        self.totalBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, stored_at REAL, size INTEGER, value TEXT)"
+            )
+            for key, storedAt, size, value in self.conn.execute(
+                "SELECT key, stored_at, size, value FROM entries ORDER BY stored_at"
+            ):
+                self.entries[key] = (storedAt, size, json.loads(value))
+                self.totalBytes += size
+            self._evict()
+
+    def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key: str, value, size: int):
+        if key in self.entries:
+            self._remove(key)
+        storedAt = time.time()
+        self.entries[key] = (storedAt, size, value)
+        self.totalBytes += size
+        if self.conn:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                    (key, storedAt, size, json.dumps(value)),
+                )
+        self._evict()
+
+    def _remove(self, key: str):
+        _, size, _ = self.entries.pop(key)
+        self.totalBytes -= size
+        if self.conn:
+            with self.conn:
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self):
+        # Least recently used first, until the size bound holds again
+        while self.entries and self.totalBytes > self.maxBytes:
+            self._remove(next(iter(self.entries)))
+
+_PAGE_CACHES = {}
+
+def get_page_cache(valves) -> Optional[TTLCache]:
+    if valves.PAGE_CACHE_TTL <= 0:
+        return None
+    path = os.path.join(str(CACHE_DIR), "firecrawl_page_cache.sqlite3") if valves.PAGE_CACHE_PERSIST else None
+    if path not in _PAGE_CACHES:
+        _PAGE_CACHES[path] = TTLCache(valves.PAGE_CACHE_TTL, valves.PAGE_CACHE_MAX_MB * 1024 * 1024, path)
+    cache = _PAGE_CACHES[path]
+    # Valves can change at any time; apply them to the existing cache
+    cache.ttl = valves.PAGE_CACHE_TTL
+    cache.maxBytes = valves.PAGE_CACHE_MAX_MB * 1024 * 1024
+    return cache
+
+_QUERY_CACHE = TTLCache(86400, 4 * 1024 * 1024)
+_SEARCH_CACHE = TTLCache(300, 16 * 1024 * 1024)
+
+def get_query_cache(valves) -> Optional[TTLCache]:
+    if valves.QUERY_CACHE_TTL <= 0:
+        return None
+    _QUERY_CACHE.ttl = valves.QUERY_CACHE_TTL
+    return _QUERY_CACHE
+
+def get_search_cache(valves) -> Optional[TTLCache]:
+    if valves.SEARCH_CACHE_TTL <= 0:
+        return None
+    _SEARCH_CACHE.ttl = valves.SEARCH_CACHE_TTL
+    return _SEARCH_CACHE
+
+def cache_stats() -> dict:
+    caches = {"query": _QUERY_CACHE, "search": _SEARCH_CACHE}
+    for path, cache in _PAGE_CACHES.items():
+        caches["page (disk)" if path else "page"] = cache
+    return {
+        name: {"hits": cache.hits, "misses": cache.misses, "entries": len(cache.entries), "bytes": cache.totalBytes}
+        for name, cache in caches.items()
+    }
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one in-flight call and its result (callers must not mutate it).
+    The call is cancelled once every caller waiting on it has been cancelled or timed out.
+    Keeps counts of upstream calls made and calls that were coalesced into one already running.
+    """
+
+    def __init__(self):
+        self.inflight = {}  # key -> asyncio.Future
+        self.waiters = {}  # asyncio.Future -> callers still waiting on it
+        self.calls = 0
+        self.coalesced = 0
+
+    async def run(self, key: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self.inflight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(call())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+        self.waiters[task] = self.waiters.get(task, 0) + 1
+        try:
+            # A cancelled or timed-out caller must not cancel the call for everyone else...
+            return await asyncio.shield(task)
+        finally:
+            self.waiters[task] -= 1
+            if not self.waiters[task]:
+                del self.waiters[task]
+                if not task.done():
+                    # ...but nobody is left to use the result; later callers start a fresh call
+                    if self.inflight.get(key) is task:
+                        del self.inflight[key]
+                    task.cancel()
+
+    def _finish(self, key: Any, task: asyncio.Future):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every caller has gone away
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced}
+
+# Shared work per kind of call; see `flight_stats` for what was coalesced
+_FLIGHTS = {
+    "query": SingleFlight(),
+    "search": SingleFlight(),
+    "scrape": SingleFlight(),
+}
+
+def flight_stats() -> dict:
+    return {name: flight.stats() for name, flight in _FLIGHTS.items()}
+
+def normalize_prompt(text: str) -> str:
+    # "What's the weather in SF?" and "what's the weather in sf" are the same question
+    return re.sub(r"\s+", " ", text.lower()).strip(" \t?!.,;:\"'")
+
+TRACKING_PARAMS = {"fbclid", "gclid", "msclkid", "ref", "ref_src"}
+
+def normalize_url(url: str) -> str:
+    # Same page, same key: lowercase scheme/host, no fragment, no trailing slash, no tracking params, sorted query
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+def content_hash(md: str) -> str:
+    # Ignore case, punctuation and whitespace so trivially different copies of a page hash the same
+    return hashlib.sha256(re.sub(r"\W+", " ", md.lower()).strip().encode("utf-8")).hexdigest()
+
+def cache_page(cache: Optional[TTLCache], url: str, title: str, md: str):
+    if cache is None or not md:
+        return
+    cache.set(
+        normalize_url(url),
+        {"title": title, "markdown": md, "fetched": time.time(), "hash": content_hash(md)},
+        len(md.encode("utf-8")),
+    )
 
 class EventEmitter:
 
@@ -41,6 +934,10 @@ class EventEmitter:
         err=None,
         debug="Off",
     ):
+        if status == "error":
+            trace = _TRACE.get()
+            if trace is not None:
+                trace.status = "error"
         if debug in {"Basic", "Full"}:
             debugMsg = f"[firecrawl_search_and_scrape] {status}: {description}"
             if not err == None:
@@ -59,6 +956,125 @@ class EventEmitter:
             )
 
 
+async def searxng_search(base_url: str, query: str, limit: int, timeout: float) -> List[dict]:
+    response = await asyncio.wait_for(
+        http_request(
+            "GET",
+            f"{base_url.rstrip('/')}/search",
+            params={"q": query, "format": "json"},
+            timeout=timeout
+        ),
+        timeout=timeout
+    )
+    response.raise_for_status()
+    hits = []
+    for result in response.json().get("results", []):
+        if result.get("url") and result.get("url") not in {hit["url"] for hit in hits}:
+            hits.append({"title": result.get("title"), "url": result.get("url")})
+        if len(hits) >= limit:
+            break
+    return hits
+
+async def firecrawl_scrape(base_url: str, headers: dict, pageUrl: str, timeout: float) -> dict:
+    response = await asyncio.wait_for(
+        http_request(
+            "POST",
+            f"{base_url}/scrape",
+            json={"url": pageUrl, "formats": ["markdown"], "timeout": int(timeout * 900)},
+            headers=headers,
+            timeout=timeout
+        ),
+        timeout=timeout
+    )
+    response.raise_for_status()
+    response_data = response.json()
+    if not response_data.get("success"):
+        raise RuntimeError(response_data.get("error", "Unknown error occurred"))
+    return response_data.get("data", {})
+
+async def firecrawl_search(base_url: str, headers: dict, payload: dict, timeout: float) -> tuple:
+    # httpx timeouts are per read/connect, so bound the whole request as well
+    response = await asyncio.wait_for(
+        http_request(
+            "POST",
+            f"{base_url}/search",
+            json=payload,
+            headers=headers,
+            timeout=timeout
+        ),
+        timeout=timeout
+    )
+    return response.status_code, response.json() if response.status_code == 200 else None
+
+async def scrape_concurrently(
+    hits: List[dict],
+    base_url: str,
+    headers: dict,
+    maxConcurrent: int,
+    pageTimeout: float,
+    deadline: Deadline,
+    emitter: EventEmitter,
+    debugState: str,
+) -> List[dict]:
+    """
+    Scrapes every hit through Firecrawl `/scrape` with bounded concurrency, emitting each page's status as it finishes.
+    Pages that fail or exceed `pageTimeout` are dropped; whatever finished before the overall deadline is returned in search rank order.
+    """
+    semaphore = asyncio.Semaphore(max(1, maxConcurrent))
+    results = {}
+
+    async def scrape_one(rank: int, hit: dict):
+        async with semaphore:
+            pageStart = time.monotonic()
+            timeout = min(pageTimeout, deadline.remaining())
+            try:
+                if timeout <= 0:
+                    raise asyncio.TimeoutError()
+                # Other chats scraping the same page right now share this request
+                data = await asyncio.wait_for(
+                    _FLIGHTS["scrape"].run(
+                        (base_url, normalize_url(hit["url"])),
+                        lambda: firecrawl_scrape(base_url, headers, hit["url"], timeout)
+                    ),
+                    timeout=timeout
+                )
+                return rank, data, time.monotonic() - pageStart, None
+            except (asyncio.TimeoutError, httpx.TimeoutException):
+                return rank, None, time.monotonic() - pageStart, "timed out"
+            except Exception as e:
+                return rank, None, time.monotonic() - pageStart, f"scrape failed ({e})"
+
+    tasks = [asyncio.create_task(scrape_one(rank, hit)) for rank, hit in enumerate(hits)]
+    try:
+        for finished in asyncio.as_completed(tasks, timeout=deadline.remaining()):
+            rank, data, spent, error = await finished
+            if error:
+                await emitter.emit(
+                    description=f"Dropped {hits[rank]['url']}: {error} after {spent:.1f}s",
+                    debug=debugState
+                )
+                continue
+            metadata = data.get("metadata", {})
+            results[rank] = {
+                "title": metadata.get("title") or hits[rank].get("title"),
+                "url": hits[rank]["url"],
+                "markdown": data.get("markdown") or "",
+            }
+            await emitter.emit(
+                description=f"Scraped {len(results)}/{len(hits)}: {results[rank]['title']} ({spent:.1f}s)",
+                debug=debugState
+            )
+    except asyncio.TimeoutError:
+        await emitter.emit(
+            description=f"Time budget reached, continuing with {len(results)}/{len(hits)} pages",
+            debug=debugState
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+    return [results[rank] for rank in sorted(results)]
+
+
 class Tools:
    
     class Valves(BaseModel):
@@ -99,7 +1115,73 @@ class Tools:
         )
         TIMEOUT: int = Field(
             default=30,
-            description="Request timeout in seconds",
+            description="Time budget in seconds for the whole tool call (query generation, search and scrape). Whatever is ready when it runs out is returned",
+            required=False
+        )
+        SEARCH_MODE: Literal["Firecrawl Search", "SearXNG + Firecrawl Scrape"] = Field(
+            default="Firecrawl Search",
+            title="Search Mode",
+            description="Firecrawl Search = one Firecrawl /search call that also scrapes every result. SearXNG + Firecrawl Scrape = search with SearXNG directly, then scrape each result in parallel so slow pages can be dropped",
+            required=False
+        )
+        MAX_CONCURRENT_SCRAPES: int = Field(
+            default=3,
+            title="Max Concurrent Scrapes",
+            description="(SearXNG + Firecrawl Scrape mode) Number of pages scraped at the same time",
+            required=False
+        )
+        PAGE_TIMEOUT: int = Field(
+            default=15,
+            title="Page Timeout",
+            description="(SearXNG + Firecrawl Scrape mode) Seconds allowed per page before it is dropped",
+            required=False
+        )
+        QUERY_CACHE_TTL: int = Field(
+            default=86400,
+            title="Query Cache TTL",
+            description="Seconds a generated search query is reused for the same prompt (and model), skipping the LLM call. 0 = always generate",
+            required=False
+        )
+        SEARCH_CACHE_TTL: int = Field(
+            default=300,
+            title="Search Cache TTL",
+            description="Seconds the results of a search are reused for the same search query, skipping the search call. 0 = always search",
+            required=False
+        )
+        PAGE_CACHE_TTL: int = Field(
+            default=3600,
+            title="Page Cache TTL",
+            description="Seconds a scraped page is reused before it is scraped again. 0 = no page cache",
+            required=False
+        )
+        PAGE_CACHE_MAX_MB: int = Field(
+            default=64,
+            title="Page Cache Max MB",
+            description="Size limit of the page cache; least recently used pages are evicted first",
+            required=False
+        )
+        PAGE_CACHE_PERSIST: bool = Field(
+            default=False,
+            title="Persist Page Cache",
+            description="Keep the page cache on disk (Open WebUI cache directory) so it survives restarts",
+            required=False
+        )
+        MAX_CONTEXT_TOKENS: int = Field(
+            default=8000,
+            title="Max Context Tokens",
+            description="Upper limit on tokens returned to the LLM, shared fairly between sources. Pages are cut at paragraph/heading boundaries. 0 = no limit",
+            required=False
+        )
+        MAX_CHUNKS_PER_SOURCE: int = Field(
+            default=6,
+            title="Max Chunks Per Source",
+            description="Keep only the passages of each page that best match the prompt and search query (BM25 ranking over heading-led chunks, shown in page order). 0 = keep whole pages",
+            required=False
+        )
+        METRICS_DIR: str = Field(
+            default="",
+            title="Metrics Directory",
+            description="(Optional) Directory where each call appends its per-stage timings and byte/row/token counts to 'firecrawl_search_and_scrape.jsonl' and rewrites 'firecrawl_search_and_scrape.prom' (Prometheus text format, e.g. for node_exporter's textfile collector)",
             required=False
         )
         pass
@@ -108,6 +1190,7 @@ class Tools:
         self.valves = self.Valves()
         self.citation = self.valves.CITATIONS
 
+    @traced
     async def _run(
         self,
         query: str,
@@ -124,6 +1207,7 @@ class Tools:
         """
         emitter = EventEmitter(__event_emitter__)
         debugState = self.valves.DEBUG
+        deadline = Deadline(self.valves.TIMEOUT)
 
         await emitter.emit(
             description="Generating search query...", debug=debugState
@@ -135,42 +1219,58 @@ class Tools:
             Example: "What's the weather in San Francisco right now?" -> "San Francisco weather"
             """
 
-        prompt = f"User's prompt: {query}"
-
-        queryPayload = {
-            "model": __model__.get("id") if isinstance(__model__, dict) else __model__,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            "stream": False,
-        }
-
-        try:
-            user = Users.get_user_by_id(__user__["id"])
-            response = await generate_chat_completion(
-                request=__request__, form_data=queryPayload, user=user
-            )
-            searchQuery = response["choices"][0]["message"]["content"]
-            searchQuery = searchQuery.replace("'", '"')
-        except Exception as e:
-            searchQueryError = (
-                "Error occurred while generating search query"
-            )
-            await emitter.emit(
-                status="error",
-                description=f"{searchQueryError} {e}",
-                done=True,
-                err=e,
-                debug=debugState,
-            )
-            return searchQueryError
-
-
-
+        modelId = __model__.get("id") if isinstance(__model__, dict) else __model__
+        queryCache = get_query_cache(self.valves)
+        queryKey = f"{modelId}\0{normalize_prompt(query)}"
+        searchQuery = queryCache.get(queryKey) if queryCache else None
 
+        if searchQuery is None:
+            prompt = f"User's prompt: {query}"
 
+            queryPayload = {
+                "model": modelId,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                "stream": False,
+            }
 
+            try:
+                user = Users.get_user_by_id(__user__["id"])
+                with deadline.stage("query"):
+                    response = await asyncio.wait_for(
+                        _FLIGHTS["query"].run(
+                            queryKey,
+                            lambda: generate_chat_completion(
+                                request=__request__, form_data=queryPayload, user=user
+                            )
+                        ),
+                        timeout=deadline.remaining() * QUERY_GENERATION_BUDGET
+                    )
+                searchQuery = response["choices"][0]["message"]["content"]
+                searchQuery = searchQuery.replace("'", '"')
+                if queryCache:
+                    queryCache.set(queryKey, searchQuery, len(searchQuery.encode("utf-8")))
+            except asyncio.TimeoutError:
+                # Don't let a slow model eat the whole budget; search with the prompt as-is
+                searchQuery = query
+                await emitter.emit(
+                    description="Search query generation timed out, using the original prompt",
+                    debug=debugState
+                )
+            except Exception as e:
+                searchQueryError = (
+                    "Error occurred while generating search query"
+                )
+                await emitter.emit(
+                    status="error",
+                    description=f"{searchQueryError} {e}",
+                    done=True,
+                    err=e,
+                    debug=debugState,
+                )
+                return searchQueryError
 
         try:
 
@@ -178,73 +1278,244 @@ class Tools:
                 description=f"Searching the web for \"{searchQuery}\"...", debug=debugState
             )
 
-            firecrawlPayload = {
-                "limit": self.valves.NUMBER_OF_RESULTS,
-                "scrapeOptions": {
-                    "formats": [
-                        "markdown"
-                    ]
-                },
-                "query": searchQuery,
-                "timeout": self.valves.TIMEOUT*1000
-            }
-
-            # Make the request
-            url = f"{self.valves.FIRECRAWL_BASE_URL}/search"
+            pageCache = get_page_cache(self.valves)
+            searchCache = get_search_cache(self.valves)
+            searchKey = f"{self.valves.SEARCH_MODE}\0{self.valves.NUMBER_OF_RESULTS}\0{normalize_prompt(searchQuery)}"
 
             headers = {"Content-Type": "application/json"}
             if self.valves.FIRECRAWL_API_KEY:
                 headers["Authorization"] = f"Bearer {self.valves.FIRECRAWL_API_KEY}"
 
-            response = requests.post(
-                url,
-                json=firecrawlPayload,
-                headers=headers,
-                timeout=self.valves.TIMEOUT*1000
-            )
+            if self.valves.SEARCH_MODE == "SearXNG + Firecrawl Scrape":
+                if not self.valves.SEARXNG_BASE_URL:
+                    configError = "Error: 'SearXNG Base URL' must be set to use the SearXNG + Firecrawl Scrape mode"
+                    await emitter.emit(
+                        status="error",
+                        description=configError,
+                        done=True,
+                        debug=debugState,
+                    )
+                    return configError
+                hits = searchCache.get(searchKey) if searchCache else None
+                if hits is None:
+                    try:
+                        with deadline.stage("search"):
+                            timeout = deadline.remaining()
+                            hits = await asyncio.wait_for(
+                                _FLIGHTS["search"].run(
+                                    (self.valves.SEARXNG_BASE_URL, searchKey),
+                                    lambda: searxng_search(
+                                        self.valves.SEARXNG_BASE_URL,
+                                        searchQuery,
+                                        self.valves.NUMBER_OF_RESULTS,
+                                        timeout
+                                    )
+                                ),
+                                timeout=timeout
+                            )
+                    except (asyncio.TimeoutError, httpx.TimeoutException):
+                        hits = []
+                    if searchCache and hits:
+                        searchCache.set(searchKey, hits, len(json.dumps(hits)))
+                if not hits:
+                    noResultsError = f"Error: No search results for \"{searchQuery}\" ({deadline.summary()})"
+                    await emitter.emit(
+                        status="error",
+                        description=noResultsError,
+                        done=True,
+                        debug=debugState,
+                    )
+                    return noResultsError
+
+                # Fresh cached pages skip Firecrawl entirely
+                cachedPages = {}
+                if pageCache:
+                    for rank, hit in enumerate(hits):
+                        cached = pageCache.get(normalize_url(hit["url"]))
+                        if cached:
+                            cachedPages[rank] = {**cached, "url": hit["url"], "cached": True}
+                toScrape = [hit for rank, hit in enumerate(hits) if rank not in cachedPages]
 
-            if response.status_code != 200:
-                scrapeError = f"Error: Failed to scrape URL. Status code: {response.status_code} - payload send: {firecrawlPayload}"
                 await emitter.emit(
-                    status="error",
-                    description=f"{scrapeError}",
-                    done=True,
-                    err=None,
-                    debug=debugState,
+                    description=f"Scraping {len(toScrape)} pages ({len(cachedPages)} cached)...", debug=debugState
                 )
-                return scrapeError
+                with deadline.stage("scrape"):
+                    scraped = await scrape_concurrently(
+                        toScrape,
+                        self.valves.FIRECRAWL_BASE_URL,
+                        headers,
+                        self.valves.MAX_CONCURRENT_SCRAPES,
+                        self.valves.PAGE_TIMEOUT,
+                        deadline,
+                        emitter,
+                        debugState
+                    ) if toScrape else []
+                scrapedByUrl = {page["url"]: page for page in scraped}
+                data = [
+                    cachedPages[rank] if rank in cachedPages else scrapedByUrl[hit["url"]]
+                    for rank, hit in enumerate(hits)
+                    if rank in cachedPages or hit["url"] in scrapedByUrl
+                ]
+                if not data:
+                    scrapeError = f"Error: None of the {len(hits)} search results could be scraped in time ({deadline.summary()})"
+                    await emitter.emit(
+                        status="error",
+                        description=scrapeError,
+                        done=True,
+                        debug=debugState,
+                    )
+                    return scrapeError
 
-            # Parse the response
-            response_data = response.json()
+            else:
+                # A recent identical search whose pages are all still cached needs no Firecrawl call
+                data = None
+                cachedData = []
+                cachedHits = searchCache.get(searchKey) if searchCache else None
+                if cachedHits and pageCache:
+                    cachedPages = [pageCache.get(normalize_url(hit["url"])) for hit in cachedHits]
+                    cachedData = [
+                        {**page, "url": hit["url"], "cached": True}
+                        for hit, page in zip(cachedHits, cachedPages)
+                        if page
+                    ]
+                    if all(cachedPages):
+                        data = cachedData
 
-            if not response_data.get("success"):
-                responseError = (
-                    f"Error: {response_data.get('error', 'Unknown error occurred')}"
-                )
-                await emitter.emit(
-                    status="error",
-                    description=f"{responseError}",
-                    done=True,
-                    err=None,
-                    debug=debugState,
-                )
-                return responseError
+                if data is None:
+                    # Firecrawl expects milliseconds; leave it a little headroom to answer before we give up
+                    firecrawlTimeout = deadline.remaining()
+                    firecrawlPayload = {
+                        "limit": self.valves.NUMBER_OF_RESULTS,
+                        "scrapeOptions": {
+                            "formats": [
+                                "markdown"
+                            ]
+                        },
+                        "query": searchQuery,
+                        "timeout": int(firecrawlTimeout * 900)
+                    }
+
+                    try:
+                        with deadline.stage("search+scrape"):
+                            statusCode, response_data = await asyncio.wait_for(
+                                _FLIGHTS["search"].run(
+                                    (self.valves.FIRECRAWL_BASE_URL, searchKey),
+                                    lambda: firecrawl_search(
+                                        self.valves.FIRECRAWL_BASE_URL,
+                                        headers,
+                                        firecrawlPayload,
+                                        firecrawlTimeout
+                                    )
+                                ),
+                                timeout=firecrawlTimeout
+                            )
+                    except (asyncio.TimeoutError, httpx.TimeoutException):
+                        if not cachedData:
+                            timeoutError = f"Error: Search timed out after {self.valves.TIMEOUT}s, no results to return ({deadline.summary()})"
+                            await emitter.emit(
+                                status="error",
+                                description=timeoutError,
+                                done=True,
+                                debug=debugState,
+                            )
+                            return timeoutError
+                        # As in SearXNG mode, answer with the pages that are already here
+                        await emitter.emit(
+                            description=f"Time budget reached, continuing with {len(cachedData)}/{len(cachedHits)} cached pages",
+                            debug=debugState
+                        )
+                        data = cachedData
+
+                if data is None:
+                    if statusCode != 200:
+                        scrapeError = f"Error: Failed to scrape URL. Status code: {statusCode} - payload send: {firecrawlPayload}"
+                        await emitter.emit(
+                            status="error",
+                            description=f"{scrapeError}",
+                            done=True,
+                            err=None,
+                            debug=debugState,
+                        )
+                        return scrapeError
+
+                    if not response_data.get("success"):
+                        responseError = (
+                            f"Error: {response_data.get('error', 'Unknown error occurred')}"
+                        )
+                        await emitter.emit(
+                            status="error",
+                            description=f"{responseError}",
+                            done=True,
+                            err=None,
+                            debug=debugState,
+                        )
+                        return responseError
+
+                    data = response_data.get("data")
+                    if searchCache:
+                        hits = [{"title": result.get("title"), "url": result.get("url")} for result in data]
+                        searchCache.set(searchKey, hits, len(json.dumps(hits)))
 
             # Return the content
-            # print("URL: " + str(url))
-            data = response_data.get("data")
-            content = []
-            for result in data:
-                resultTitle = result.get("title")
-                resultUrl = result.get("url")
-                resultMarkdown = clean_markdown(result.get("markdown"))
-                content.append(f"## Source: [{resultTitle}]({url})\n\n{resultMarkdown}")
+            sources = []
+            seenHashes = set()
+            # Bytes of freshly scraped Markdown before and after cleaning (cached pages are stored clean)
+            bytesIn = bytesOut = 0
+            with deadline.stage("clean") as record:
+                for result in data:
+                    if result.get("cached"):
+                        resultMarkdown, resultHash = result["markdown"], result["hash"]
+                    else:
+                        rawMarkdown = result.get("markdown") or ""
+                        resultMarkdown = clean_markdown(rawMarkdown)
+                        pageIn, pageOut = len(rawMarkdown.encode("utf-8")), len(resultMarkdown.encode("utf-8"))
+                        bytesIn += pageIn
+                        bytesOut += pageOut
+                        if debugState == "Full":
+                            print(f"[firecrawl_search_and_scrape] Cleaned {pageIn:,} -> {pageOut:,} bytes: {result.get('url')}")
+                        resultHash = content_hash(resultMarkdown)
+                        cache_page(pageCache, result.get("url"), result.get("title"), resultMarkdown)
+                    # The same page under a different URL (mirrors, redirects, tracking variants)
+                    if resultHash in seenHashes:
+                        continue
+                    seenHashes.add(resultHash)
+                    sources.append({
+                        "title": result.get("title"),
+                        "url": result.get("url"),
+                        "markdown": resultMarkdown,
+                    })
+                record["bytes"] = bytesIn
+                record["rows"] = len(data)
+
+            with deadline.stage("rank") as record:
+                sources, keptChunks, totalChunks = select_chunks(
+                    sources, [query, searchQuery], self.valves.MAX_CHUNKS_PER_SOURCE
+                )
+                record["rows"] = keptChunks
+
+            with deadline.stage("pack") as record:
+                content, sourceTokens = pack_sources(sources, self.valves.MAX_CONTEXT_TOKENS)
+                totalTokens = sum(tokens for _, tokens in sourceTokens)
+                record["rows"] = len(sourceTokens)
+                record["tokens"] = totalTokens
+
+            tokensPerSource = " + ".join(f"{tokens:,}" for _, tokens in sourceTokens)
+            details = ""
+            if bytesIn:
+                details += f", cleaned {bytesIn / 1024:,.0f} KB to {bytesOut / 1024:,.0f} KB ({1 - bytesOut / bytesIn:.0%} removed)"
+            if keptChunks < totalChunks:
+                details += f", {keptChunks}/{totalChunks} relevant chunks kept"
+            if debugState == "Full":
+                for header, tokens in sourceTokens:
+                    print(f"[firecrawl_search_and_scrape] {tokens} tokens: {header.strip()}")
 
-            content = "\n\n---\n\n".join(content)
+            if debugState in {"Basic", "Full"}:
+                print(f"[firecrawl_search_and_scrape] Cache stats: {cache_stats()}")
+                print(f"[firecrawl_search_and_scrape] Coalesced calls: {flight_stats()}")
 
             # Success message
             await emitter.emit(
-                description=f"Firecrawl successfully scraped content",
+                description=f"Firecrawl successfully scraped content: {len(sourceTokens)} sources, {totalTokens:,} tokens [{tokensPerSource}]{details} ({deadline.summary()})",
                 debug=debugState,
                 status="complete",
                 done=True
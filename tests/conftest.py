@@ -0,0 +1,35 @@
+"""
+Loads the tool files as modules. Open WebUI is optional: without it, the three names the tools
+import from it are provided the same way the benchmark runner does.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from run import install_open_webui, load_tool  # noqa: E402
+
+
+def load(name: str):
+    install_open_webui(tempfile.mkdtemp(prefix="owui_cache_"))
+    return load_tool(name)
+
+
+@pytest.fixture(scope="session")
+def ynab():
+    return load("ynab")
+
+
+@pytest.fixture(scope="session")
+def actual():
+    pytest.importorskip("actual")
+    return load("actual")
+
+
+@pytest.fixture(scope="session")
+def firecrawl():
+    return load("firecrawl")
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from synthetic import write_actual_budget, ynab_budget
+
+
+@pytest.fixture()
+def tools(actual, monkeypatch):
+    monkeypatch.setattr(actual, "_SESSION_POOL", {})
+    tools = actual.Tools()
+    tools.valves.PASSWORD = "password"
+    tools.valves.FILE_BUDGET_NAME = "Budget"
+    return tools
+
+
+@pytest.fixture()
+def pooled(actual, tools, tmp_path):
+    from sqlmodel import Session, create_engine
+
+    write_actual_budget(ynab_budget(300, 3, today=date.today()), str(tmp_path / "db.sqlite"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    with Session(engine) as session:
+        syncs = []
+
+        def sync():
+            syncs.append(1)
+            return []
+
+        entry = actual.ActualSession(SimpleNamespace(engine=engine, session=session, sync=sync))
+        entry.syncs = syncs
+        valves = tools.valves
+        key = actual.session_key(valves.BASE_URL, valves.PASSWORD, valves.ENCRYPTION_PASSWORD, valves.FILE_BUDGET_NAME)
+        actual._SESSION_POOL[key] = entry
+        yield entry
+    engine.dispose()
+
+
+def ask(tools, query: str) -> tuple:
+    events = []
+
+    async def emit(event):
+        events.append(event["data"])
+
+    return asyncio.run(tools._run(query, emit, None, {"id": "user"}, {"id": "model"})), events
+
+
+def test_open_failure_becomes_an_error_status(actual, tools, monkeypatch):
+    def refuse(*args):
+        raise RuntimeError("invalid password")
+
+    monkeypatch.setattr(actual, "open_actual", refuse)
+    result, events = ask(tools, "What's my checking balance?")
+    assert result == "Opening the Actual budget failed. Error: invalid password"
+    assert events[-1] == {"status": "error", "description": "Opening the Actual budget failed.", "done": True}
+
+
+def test_questions_share_the_session_concurrently(actual, tools, pooled):
+    tools.valves.SESSION_SYNC_INTERVAL = 0
+    inside = []
+
+    async def question():
+        async with actual.pooled_actual(tools.valves) as entry:
+            inside.append(entry)
+            await asyncio.sleep(0.05)
+            # The lock was only held for the sync, so the other question got in meanwhile
+            return len(inside)
+
+    async def main():
+        return await asyncio.gather(question(), question())
+
+    assert asyncio.run(main()) == [2, 2]
+    assert inside == [pooled, pooled]
+    # Each question synced a stale session in turn
+    assert len(pooled.syncs) == 2
+    assert not pooled.lock.locked() and pooled.users == 0
+
+
+def test_concurrent_questions_on_a_cold_session(actual, tools, pooled):
+    async def main():
+        async def emit(event):
+            pass
+
+        return await asyncio.gather(
+            *(
+                tools._run(query, emit, None, {"id": "user"}, {"id": "model"})
+                for query in [
+                    "What did I buy last week?",
+                    "How much did I spend by category last month?",
+                    "What's my checking balance?",
+                    "How has my net worth changed this month?",
+                ]
+            )
+        )
+
+    results = asyncio.run(main())
+    errors = ("failed", "Error occurred", "No matching")
+    assert not [result for result in results if any(error in str(result) for error in errors)]
+    # Dated questions were answered while the full index was built; the balances question waited for it
+    assert pooled.index is not None and len(pooled.index) > 0
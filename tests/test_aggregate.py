@@ -0,0 +1,103 @@
+import pytest
+
+
+# One month of a small budget: a paycheck, groceries with a refund, rent and a transfer to savings
+TRANSACTIONS = [
+    ("t1", "2026-05-02", 3000000, "Employer", "Inflow: Ready to Assign", "checking", None),
+    ("t2", "2026-05-03", -120000, "Grocer", "Groceries", "checking", None),
+    ("t3", "2026-05-10", -80500, "Grocer", "Groceries", "visa", None),
+    ("t4", "2026-05-12", 20000, "Grocer", "Groceries", "visa", None),
+    ("t5", "2026-05-15", -500000, "Transfer : Savings", None, "checking", "savings"),
+    ("t6", "2026-05-15", 500000, "Transfer : Checking", None, "savings", "checking"),
+    ("t7", "2026-05-20", -1500000, "Landlord", "Rent", "checking", None),
+    ("t8", "2026-06-01", -40000, "Grocer", "Groceries", "checking", None),
+]
+ACCOUNT_NAMES = {"checking": "Checking", "visa": "Visa", "savings": "Savings"}
+
+# Worked out by hand: outflows are positive, transfers appear nowhere
+BY_CATEGORY = [
+    {"group": "Rent", "outflow": 1500000, "inflow": 0, "net": -1500000, "count": 1},
+    {"group": "Groceries", "outflow": 240500, "inflow": 20000, "net": -220500, "count": 4},
+    {"group": "Inflow: Ready to Assign", "outflow": 0, "inflow": 3000000, "net": 3000000, "count": 1},
+    {"group": "Total", "outflow": 1740500, "inflow": 3020000, "net": 1279500, "count": 6},
+]
+BY_MONTH = [
+    {"group": "2026-05", "outflow": 1700500, "inflow": 3020000, "net": 1319500, "count": 5},
+    {"group": "2026-06", "outflow": 40000, "inflow": 0, "net": -40000, "count": 1},
+    {"group": "Total", "outflow": 1740500, "inflow": 3020000, "net": 1279500, "count": 6},
+]
+MAY_BY_ACCOUNT = [
+    {"group": "Checking", "outflow": 1620000, "inflow": 3000000, "net": 1380000, "count": 3},
+    {"group": "Visa", "outflow": 80500, "inflow": 20000, "net": -60500, "count": 2},
+    {"group": "Total", "outflow": 1700500, "inflow": 3020000, "net": 1319500, "count": 5},
+]
+
+
+def ynab_transactions() -> list:
+    return [
+        {
+            "id": txId,
+            "date": day,
+            "amount": amount,
+            "memo": None,
+            "account_id": account,
+            "account_name": ACCOUNT_NAMES[account],
+            "payee_name": payee,
+            "category_name": category,
+            "transfer_account_id": transfer,
+        }
+        for txId, day, amount, payee, category, account, transfer in TRANSACTIONS
+    ]
+
+
+def aggregate(ynab, groupBy: str, startDate=None, endDate=None) -> list:
+    # Rows the way the non-mirror path normalizes them
+    return ynab.aggregate_rows(
+        (
+            {
+                "date": tx["date"],
+                "amount": tx["amount"],
+                "payee": tx["payee_name"] or "Unknown",
+                "category": tx["category_name"] or "Uncategorized",
+                "account": tx["account_name"] or "Unknown Account",
+                "transfer": bool(tx["transfer_account_id"]),
+            }
+            for tx in ynab_transactions()
+            if (not startDate or startDate <= tx["date"]) and (not endDate or tx["date"] <= endDate)
+        ),
+        groupBy,
+    )
+
+
+@pytest.mark.parametrize(
+    "groupBy, startDate, endDate, expected",
+    [
+        ("category", None, None, BY_CATEGORY),
+        ("month", None, None, BY_MONTH),
+        ("account", "2026-05-01", "2026-05-31", MAY_BY_ACCOUNT),
+    ],
+)
+def test_aggregate_rows_split_outflow_and_inflow(ynab, groupBy, startDate, endDate, expected):
+    assert aggregate(ynab, groupBy, startDate, endDate) == expected
+
+
+@pytest.mark.parametrize(
+    "groupBy, startDate, endDate, expected",
+    [
+        ("category", None, None, BY_CATEGORY),
+        ("month", None, None, BY_MONTH),
+        ("account", "2026-05-01", "2026-05-31", MAY_BY_ACCOUNT),
+    ],
+)
+def test_index_group_matches_hand_totals(ynab, actual, groupBy, startDate, endDate, expected):
+    for tool in (ynab, actual):
+        index = tool.TransactionIndex()
+        index.merge(ynab_transactions())
+        assert index.group(index.select(startDate, endDate), groupBy) == expected
+
+
+def test_only_transfers_is_empty(ynab):
+    transfers = [tx for tx in ynab_transactions() if tx["transfer_account_id"]]
+    index = ynab.TransactionIndex()
+    index.merge(transfers)
+    assert index.group(index.select(), "category") == []
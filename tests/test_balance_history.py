@@ -0,0 +1,70 @@
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+
+def random_transactions(rng: random.Random, count: int, first: int, last: int, accounts: int) -> list:
+    return [(rng.randint(first, last), rng.randrange(accounts), rng.randint(-50000, 50000)) for _ in range(count)]
+
+
+def apply(history, transactions: list, sign: int = 1):
+    dates, accounts, amounts = (np.array(column, dtype=np.int64) for column in zip(*transactions))
+    history.apply(dates, accounts, sign * amounts)
+
+
+def brute_force(transactions: list, day: int, account: int) -> int:
+    return sum(amount for when, acc, amount in transactions if when <= day and acc == account)
+
+
+@pytest.mark.parametrize("tool", ["ynab", "actual"])
+def test_running_balances_match_brute_force(tool, request):
+    module = request.getfixturevalue(tool)
+    rng = random.Random(11)
+    start = date(2025, 1, 1).toordinal()
+    history = module.BalanceHistory()
+    first = random_transactions(rng, 300, start + 100, start + 200, 3)
+    # Later batches reach before and after the first one and add an account
+    second = random_transactions(rng, 300, start, start + 300, 5)
+    removed = first[:40]
+    apply(history, first)
+    apply(history, second)
+    apply(history, removed, sign=-1)
+    kept = first[40:] + second
+
+    days = np.arange(start - 5, start + 310, dtype=np.int64)
+    balances = history.at(days)
+    assert balances.shape == (len(days), 5)
+    for row, day in enumerate(days.tolist()):
+        for account in range(5):
+            assert balances[row, account] == brute_force(kept, day, account)
+
+
+def test_balances_walk_back_from_current(ynab):
+    today = date(2026, 8, 20)
+    transactions = [
+        {
+            "id": f"t{n}",
+            "date": (today - timedelta(days=n * 3)).isoformat(),
+            "amount": (n % 7 - 3) * 1000,
+            "account_id": "a" if n % 2 else "b",
+            "account_name": "A" if n % 2 else "B",
+        }
+        for n in range(100)
+    ]
+    accounts = [{"id": "a", "name": "A", "balance": 500000}, {"id": "b", "name": "B", "balance": 250000}]
+    index = ynab.TransactionIndex()
+    index.merge(transactions)
+    rows, netWorth = index.balances(accounts, "2026-06-01", "2026-08-20")
+
+    def balance(account: dict, day: str) -> int:
+        later = sum(tx["amount"] for tx in transactions if tx["account_id"] == account["id"] and tx["date"] > day)
+        return account["balance"] - later
+
+    for account, row in zip(accounts, rows):
+        assert row["opening"] == balance(account, "2026-05-31")
+        assert row["closing"] == balance(account, "2026-08-20")
+    assert rows[-1]["closing"] == 750000
+    for point in netWorth:
+        assert point["net_worth"] == sum(balance(account, point["date"]) for account in accounts)
@@ -0,0 +1,45 @@
+import csv
+import re
+
+import pytest
+
+
+NAMES = ["Rent; Utilities", "A=B Foods", 'Joe\'s "Diner", Downtown', "Groceries"]
+ENTRY = re.compile(r'(\w+)=("(?:[^"]|"")*"|[^;]*)(?:; |$)')
+
+
+@pytest.fixture(params=["ynab", "actual"])
+def tool(request):
+    return request.getfixturevalue(request.param)
+
+
+def dictionary(line: str) -> dict:
+    # Inverse of the "key: p1=Name; p2=Name" header line
+    entries = {}
+    body = line.split(": ", 1)[1]
+    position = 0
+    for match in ENTRY.finditer(body):
+        assert match.start() == position
+        position = match.end()
+        value = match.group(2)
+        entries[match.group(1)] = value[1:-1].replace('""', '"') if value.startswith('"') else value
+    assert position == len(body)
+    return entries
+
+
+def test_dictionary_names_survive_separators(tool):
+    rows = [
+        {"date": "2026-08-01", "payee": name, "amount": -1000, "category": name, "account": "Checking", "memo": "a, b", "notes": "a, b"}
+        for name in NAMES
+    ]
+    text, count = tool.render_compact("Transactions", tool.TRANSACTION_COLUMNS, rows)
+    lines = text.splitlines()
+    assert count == len(NAMES)
+    payees = dictionary(lines[1])
+    categories = dictionary(lines[2])
+    assert list(payees.values()) == NAMES
+    assert list(categories.values()) == NAMES
+    table = list(csv.DictReader(lines[5:], fieldnames=lines[4].split(",")))
+    assert [payees[row["payee"]] for row in table] == NAMES
+    # Plain cells are still CSV-quoted
+    assert {row[tool.TRANSACTION_COLUMNS[-1][0]] for row in table} == {"a, b"}
@@ -0,0 +1,40 @@
+from datetime import date
+
+import pytest
+
+
+TODAY = date(2026, 8, 20)
+
+CASES = [
+    # Current balances
+    ("What's my checking balance?", ["accounts"]),
+    ("What is my balance today?", ["accounts"]),
+    # Balances over a date range
+    ("How has my net worth changed over time?", ["balances"]),
+    ("balances last month", ["balances", "2026-07-01", "2026-07-31"]),
+    # Transactions
+    ("What did I buy last week?", ["transactions", "2026-08-13", "2026-08-19"]),
+    ("Who did I pay last month?", ["transactions", "2026-07-01", "2026-07-31"]),
+    ("Which payments did I make yesterday?", ["transactions", "2026-08-19", "2026-08-19"]),
+    ("transactions in may 2024", ["transactions", "2024-05-01", "2024-05-31"]),
+    ("spending over the past 3 months", ["transactions", "2026-05-20", "2026-08-20"]),
+    # Aggregates
+    ("How much did I spend in May?", ["aggregate", "category", "2026-05-01", "2026-05-31"]),
+    ("total income in 2025", ["aggregate", "category", "2025-01-01", "2025-12-31"]),
+    ("How much have I paid at Costco this year?", ["aggregate", "payee", "2026-01-01", "2026-08-20"]),
+    ("How much did I spend at Starbucks last month?", ["aggregate", "payee", "2026-07-01", "2026-07-31"]),
+    ("Spending by month this year", ["aggregate", "month", "2026-01-01", "2026-08-20"]),
+    ("monthly spending last year", ["aggregate", "month", "2025-01-01", "2025-12-31"]),
+    ("average spend per category in the last two weeks", ["aggregate", "category", "2026-08-06", "2026-08-20"]),
+    # Unsure: left to the LLM
+    ("hello", None),
+    ("Do I have more in savings than I spent?", None),
+    ("Show transactions between March and May", None),
+    ("transactions last month and this month", None),
+]
+
+
+@pytest.mark.parametrize("query, expected", CASES)
+def test_fast_route(ynab, actual, query, expected):
+    assert ynab.fast_route(query, TODAY) == expected
+    assert actual.fast_route(query, TODAY) == expected
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+
+
+NAME_MAP = {
+    "account": {"chase checking": ("acc-1", "Chase Checking"), "cash": ("acc-2", "Cash")},
+    "category": {"groceries": (None, "Groceries"), "home": (None, "Home"), "gas": (None, "Gas")},
+    "payee": {
+        "costco": (None, "Costco"),
+        "chase": (None, "Chase"),
+        "al": (None, "Al"),
+        "transfer": (None, "Transfer"),
+    },
+}
+
+CASES = [
+    ("How much did I spend at Costco last month?", {"payee": (None, "Costco")}),
+    ("How much did I spend at costco's gas station?", {"payee": (None, "Costco"), "category": (None, "Gas")}),
+    # Whole phrases only
+    ("Anything from Costcoland or gasoline?", {}),
+    ("What came out of Chase Checking?", {"account": ("acc-1", "Chase Checking")}),
+    # Too short, or words any question may use
+    ("What did Al and I spend at home?", {}),
+    ("Show my cash spending and transfers", {}),
+    ("Total groceries (all accounts)", {"category": (None, "Groceries")}),
+]
+
+
+@pytest.fixture(params=["ynab", "actual"])
+def tool(request):
+    return request.getfixturevalue(request.param)
+
+
+@pytest.mark.parametrize("query, expected", CASES)
+def test_find_scope(tool, query, expected):
+    assert tool.find_scope(query, NAME_MAP) == expected
+
+
+def test_mirror_name_map_has_no_placeholder_payee(ynab):
+    index = ynab.TransactionIndex()
+    index.merge([
+        {"id": "t1", "date": "2026-08-01", "amount": -1000, "payee_name": "Costco", "category_name": "Groceries", "account_id": "acc-1"},
+        {"id": "t2", "date": "2026-08-02", "amount": -2000, "payee_name": None, "category_name": None, "account_id": "acc-1"},
+    ])
+    store = SimpleNamespace(get_accounts=lambda budget_id: [{"id": "acc-1", "name": "Chase Checking"}])
+    nameMap = ynab.mirror_name_map(store, index, "budget")
+    assert nameMap["payee"] == {"costco": (None, "Costco")}
+    assert ynab.find_scope("Any unknown charges at Costco?", nameMap) == {"payee": (None, "Costco")}
@@ -0,0 +1,74 @@
+import pytest
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def clock(firecrawl, monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(firecrawl.time, "time", fake)
+    return fake
+
+
+def test_entries_expire_after_ttl(firecrawl, clock):
+    cache = firecrawl.TTLCache(ttl=60, maxBytes=1000)
+    cache.set("a", {"value": 1}, 10)
+    clock.now += 59
+    assert cache.get("a") == {"value": 1}
+    clock.now += 2
+    assert cache.get("a") is None
+    assert (cache.hits, cache.misses, cache.totalBytes, len(cache.entries)) == (1, 1, 0, 0)
+
+
+def test_least_recently_used_entries_are_evicted_by_size(firecrawl, clock):
+    cache = firecrawl.TTLCache(ttl=60, maxBytes=30)
+    for key in "abc":
+        cache.set(key, key, 10)
+    cache.get("a")
+    cache.set("d", "d", 10)
+    assert list(cache.entries) == ["c", "a", "d"]
+    assert cache.totalBytes == 30
+    # Replacing an entry does not count it twice
+    cache.set("a", "A", 10)
+    assert cache.totalBytes == 30 and cache.get("a") == "A"
+
+
+def test_entries_survive_a_restart_on_disk(firecrawl, clock, tmp_path):
+    path = str(tmp_path / "cache" / "pages.sqlite3")
+    cache = firecrawl.TTLCache(ttl=60, maxBytes=1000, path=path)
+    cache.set("kept", {"markdown": "text"}, 4)
+    cache.set("removed", {"markdown": "gone"}, 4)
+    clock.now += 61
+    cache.get("removed")
+    cache.conn.close()
+
+    reopened = firecrawl.TTLCache(ttl=120, maxBytes=1000, path=path)
+    assert list(reopened.entries) == ["kept"]
+    assert reopened.get("kept") == {"markdown": "text"}
+
+
+def test_urls_are_normalized_for_cache_keys(firecrawl):
+    assert firecrawl.normalize_url("HTTPS://Example.com/Path/?utm_source=x&b=2&a=1&fbclid=y#top") == (
+        "https://example.com/Path?a=1&b=2"
+    )
+    assert firecrawl.normalize_url("https://example.com") == firecrawl.normalize_url("https://example.com/")
+
+
+def test_trivially_different_copies_hash_the_same(firecrawl):
+    assert firecrawl.content_hash("Hello,   World!\n") == firecrawl.content_hash("hello world")
+    assert firecrawl.content_hash("hello world") != firecrawl.content_hash("hello there")
+
+
+def test_cache_page_stores_by_normalized_url(firecrawl, clock):
+    cache = firecrawl.TTLCache(ttl=60, maxBytes=1000)
+    firecrawl.cache_page(cache, "https://example.com/a/?utm_medium=email", "A", "Body")
+    firecrawl.cache_page(cache, "https://example.com/empty", "Empty", "")
+    entry = cache.get("https://example.com/a")
+    assert entry["title"] == "A" and entry["hash"] == firecrawl.content_hash("Body")
+    assert len(cache.entries) == 1
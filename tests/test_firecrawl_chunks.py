@@ -0,0 +1,55 @@
+def section(heading: str, topic: str, paragraphs: int = 3) -> str:
+    body = [f"This paragraph talks about {topic} and nothing else, at some length. " * 4 for _ in range(paragraphs)]
+    return "\n\n".join([heading] + body)
+
+
+def source(*sections: str, url: str = "https://example.com/page") -> dict:
+    return {"title": "Page", "url": url, "markdown": "\n\n".join(sections)}
+
+
+def test_best_chunks_are_kept_in_page_order(firecrawl):
+    page = source(
+        section("# Gardening", "tomatoes"),
+        section("## Watering", "watering schedules"),
+        section("## Battery life", "battery charging cycles"),
+        section("## Pruning", "pruning shears"),
+        section("## Charging tips", "battery charging speed"),
+    )
+    selected, kept, total = firecrawl.select_chunks([page], ["battery charging"], 2)
+    markdown = selected[0]["markdown"]
+    assert (kept, total) == (2, 5)
+    assert "## Battery life" in markdown and "## Charging tips" in markdown
+    assert "tomatoes" not in markdown and "pruning" not in markdown
+    assert markdown.index("## Battery life") < markdown.index("## Charging tips")
+
+
+def test_long_section_chunk_gets_its_heading_back(firecrawl):
+    long = section("## Background", "history", paragraphs=6) + "\n\n" + "The quantum detail is here. " * 10
+    page = source(section("# Intro", "welcome"), long, section("## Outro", "goodbye"))
+    selected, kept, _ = firecrawl.select_chunks([page], ["quantum"], 1)
+    assert kept == 1
+    assert selected[0]["markdown"].startswith("## Background")
+    assert "quantum detail" in selected[0]["markdown"]
+
+
+def test_plural_and_singular_match(firecrawl):
+    page = source(section("# A", "apples"), section("## B", "the latest releases"), section("## C", "oranges"))
+    selected, _, _ = firecrawl.select_chunks([page], ["release"], 1)
+    assert "releases" in selected[0]["markdown"]
+
+
+def test_no_matches_keep_leading_chunks(firecrawl):
+    page = source(section("# First", "alpha"), section("## Second", "beta"), section("## Third", "gamma"))
+    selected, _, _ = firecrawl.select_chunks([page], ["zebra"], 1)
+    assert selected[0]["markdown"].startswith("# First")
+    assert "beta" not in selected[0]["markdown"]
+
+
+def test_short_pages_and_no_limit_are_untouched(firecrawl):
+    short = source(section("# Only", "one thing"), url="https://example.com/short")
+    longer = source(*(section(f"## Part {n}", f"topic {n}") for n in range(6)), url="https://example.com/long")
+    selected, kept, total = firecrawl.select_chunks([short, longer], ["topic"], 0)
+    assert selected == [short, longer] and kept == total
+    selected, _, _ = firecrawl.select_chunks([short, longer], ["topic"], 2)
+    assert selected[0] is short
+    assert selected[1]["url"] == longer["url"]
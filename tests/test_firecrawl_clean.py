@@ -0,0 +1,92 @@
+from synthetic import web_page
+
+
+PARAGRAPH = "The new release improves throughput and lowers memory use across the board. " * 3
+
+
+def page(*blocks: str) -> str:
+    return "\n\n".join(blocks)
+
+
+def test_links_images_and_markup(firecrawl):
+    md = "Read the [release notes](https://example.com/notes) for <b>details</b> ![chart](https://example.com/c.png) \\*now\\*. " * 3
+    assert firecrawl.clean_markdown(md) == ("Read the release notes for details *now*. " * 3).rstrip()
+
+
+def test_boilerplate_at_the_edges_is_dropped(firecrawl):
+    md = page(
+        "We use cookies to improve your experience.",
+        "# Release notes",
+        PARAGRAPH,
+        "## Details",
+        PARAGRAPH.replace("release", "update"),
+        PARAGRAPH.replace("release", "version"),
+        "Subscribe to our newsletter",
+        "© 2026 Example Media. All rights reserved.",
+    )
+    cleaned = firecrawl.clean_markdown(md)
+    assert "cookies" not in cleaned
+    assert "Subscribe" not in cleaned and "©" not in cleaned
+    assert cleaned.startswith("# Release notes")
+
+
+def test_boilerplate_words_in_the_middle_are_kept(firecrawl):
+    mention = "The company revised its privacy policy in March, so users can now download their data."
+    md = page(
+        "# Data protection update",
+        PARAGRAPH,
+        "## What changed",
+        mention,
+        PARAGRAPH.replace("release", "update"),
+        PARAGRAPH.replace("release", "version"),
+        PARAGRAPH.replace("release", "patch"),
+        PARAGRAPH.replace("release", "build"),
+    )
+    assert mention in firecrawl.clean_markdown(md)
+
+
+def test_boilerplate_words_with_links_are_dropped_anywhere(firecrawl):
+    md = page(
+        "# Title",
+        PARAGRAPH,
+        PARAGRAPH.replace("release", "update"),
+        "Share this: [Twitter](https://twitter.com/share) | [Email](mailto:?)",
+        PARAGRAPH.replace("release", "version"),
+        PARAGRAPH.replace("release", "patch"),
+        PARAGRAPH.replace("release", "build"),
+        PARAGRAPH.replace("release", "fix"),
+    )
+    assert "Share this" not in firecrawl.clean_markdown(md)
+
+
+def test_navigation_repeats_and_empty_sections(firecrawl):
+    md = page(
+        "* [Home](https://example.com/)\n* [News](https://example.com/news)\n* [About](https://example.com/about)",
+        "# Title",
+        PARAGRAPH,
+        "## Related",
+        "* [Another story](https://example.com/a)\n* [More news](https://example.com/b)",
+        "## Summary",
+        PARAGRAPH,
+    )
+    # "Summary" only repeats a paragraph, so it goes along with "Related"
+    assert firecrawl.clean_markdown(md) == page("# Title", PARAGRAPH.rstrip())
+
+
+def test_table_alignment_is_kept(firecrawl):
+    md = page(PARAGRAPH, "|  Left  | Center |  Right |\n| :--- | :----: | ---: |\n| a   |  b |   c |", PARAGRAPH + "more")
+    assert "|Left|Center|Right|\n|:-|:-:|-:|\n|a|b|c|" in firecrawl.clean_markdown(md)
+
+
+def test_code_blocks_are_kept_as_is(firecrawl):
+    code = "```python\ndef f(x):\n    return  [x]  # [not a link](x)\n\n\nprint(f(1))\n```"
+    assert code in firecrawl.clean_markdown(page(PARAGRAPH, code))
+
+
+def test_synthetic_page_keeps_only_content(firecrawl):
+    md = web_page("https://example.com/a", 20000)["markdown"]
+    cleaned = firecrawl.clean_markdown(md)
+    for boilerplate in ["Skip to main", "cookies", "Subscribe", "©", "Privacy Policy", "Share this", "Related articles"]:
+        assert boilerplate not in cleaned
+    assert cleaned.startswith("# ")
+    assert len(cleaned) < len(md)
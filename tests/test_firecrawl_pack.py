@@ -0,0 +1,74 @@
+import pytest
+
+
+def source(n: int, paragraphs: int) -> dict:
+    blocks = [f"## Part {i}\n\nParagraph {i} of page {n} says something useful about topic {i}. " * 3 for i in range(paragraphs)]
+    return {"title": f"Page {n}", "url": f"https://example.com/{n}", "markdown": "\n\n".join(blocks)}
+
+
+def count(firecrawl, text: str) -> int:
+    return len(firecrawl.get_encoding().encode(text, disallowed_special=()))
+
+
+@pytest.mark.parametrize("maxTokens", [60, 200, 500, 1500])
+def test_packed_context_fits_the_budget(firecrawl, maxTokens):
+    sources = [source(0, 2), source(1, 30), source(2, 30)]
+    content, sourceTokens = firecrawl.pack_sources(sources, maxTokens)
+    assert count(firecrawl, content) <= maxTokens
+    assert len(sourceTokens) == content.count("## Source:")
+
+
+def test_short_pages_keep_everything_and_long_pages_share_the_rest(firecrawl):
+    short, first, second = source(0, 1), source(1, 40), source(2, 40)
+    content, sourceTokens = firecrawl.pack_sources([first, short, second], 800)
+    pages = content.split(firecrawl.SOURCE_SEPARATOR)
+    assert short["markdown"].replace("\n\n", "") in pages[1].replace("\n\n", "")
+    first, second = sourceTokens[0][1], sourceTokens[2][1]
+    assert abs(first - second) < max(first, second) * 0.3
+    # Long pages are cut at block boundaries
+    for block in firecrawl.split_blocks(pages[0])[1:]:
+        assert block in firecrawl.split_blocks(source(1, 40)["markdown"])
+
+
+def test_no_limit_keeps_everything_without_tokenizing(firecrawl, monkeypatch):
+    monkeypatch.setattr(firecrawl, "get_encoding", lambda: pytest.fail("tokenizer used without a limit"))
+    sources = [source(0, 5), source(1, 5)]
+    content, sourceTokens = firecrawl.pack_sources(sources, 0)
+    for item in sources:
+        assert item["markdown"] in content
+    assert [tokens for _, tokens in sourceTokens] == [len(page) // 4 for page in content.split(firecrawl.SOURCE_SEPARATOR)]
+
+
+def test_headers_that_do_not_fit_drop_the_lowest_ranked_pages(firecrawl):
+    sources = [source(n, 3) for n in range(10)]
+    content, sourceTokens = firecrawl.pack_sources(sources, 40)
+    assert count(firecrawl, content) <= 40
+    assert 0 < len(sourceTokens) < 10
+    assert content.startswith(firecrawl.source_header("Page 0", "https://example.com/0"))
+
+
+def test_oversized_first_block_is_cut_at_a_sentence(firecrawl):
+    sentence = "One long sentence keeps going about the same thing. "
+    sources = [{"title": "T", "url": "https://example.com/t", "markdown": sentence * 200}]
+    content, _ = firecrawl.pack_sources(sources, 120)
+    body = content.split("\n\n", 1)[1]
+    assert body and body.endswith(".")
+    assert count(firecrawl, content) <= 120
+
+
+def test_special_token_text_is_plain_text(firecrawl):
+    sources = [{"title": "T", "url": "https://example.com/t", "markdown": "Model output ends with <|endoftext|> here."}]
+    content, _ = firecrawl.pack_sources(sources, 100)
+    assert "<|endoftext|>" in content
+
+
+def test_tokenizer_falls_back_to_length_estimate(firecrawl, monkeypatch):
+    def unavailable(name):
+        raise OSError("no network")
+
+    monkeypatch.setattr(firecrawl, "_ENCODING", None)
+    monkeypatch.setattr(firecrawl.tiktoken, "get_encoding", unavailable)
+    encoding = firecrawl.get_encoding()
+    assert isinstance(encoding, firecrawl.ApproximateEncoding)
+    assert len(encoding.encode("x" * 41)) == 11
+    assert encoding.decode(encoding.encode("round trip")) == "round trip"
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+
+PAGE = "# Weather\n\n" + "Sunny in San Francisco with a light breeze from the west. " * 5
+
+
+@pytest.fixture()
+def tool(firecrawl, monkeypatch):
+    monkeypatch.setattr(firecrawl, "_QUERY_CACHE", firecrawl.TTLCache(86400, 1024 * 1024))
+    monkeypatch.setattr(firecrawl, "_SEARCH_CACHE", firecrawl.TTLCache(300, 1024 * 1024))
+    monkeypatch.setattr(firecrawl, "_PAGE_CACHES", {})
+    calls = {"llm": 0, "search": 0}
+
+    async def completion(request, form_data, user):
+        calls["llm"] += 1
+        return {"choices": [{"message": {"content": "San Francisco weather"}}]}
+
+    async def search(base_url, headers, payload, timeout):
+        calls["search"] += 1
+        return 200, {"success": True, "data": [{"title": "Weather", "url": "https://example.com/sf", "markdown": PAGE}]}
+
+    monkeypatch.setattr(firecrawl, "generate_chat_completion", completion)
+    monkeypatch.setattr(firecrawl, "firecrawl_search", search)
+    tools = firecrawl.Tools()
+    tools.calls = calls
+    return tools
+
+
+def ask(tool, query: str, model: str = "model-a") -> str:
+    async def emit(event):
+        pass
+
+    return asyncio.run(tool._run(query, emit, None, {"id": "user"}, {"id": model}))
+
+
+def test_same_prompt_reuses_the_generated_query(tool):
+    assert "Sunny in San Francisco" in ask(tool, "What's the weather in San Francisco?")
+    assert "Sunny in San Francisco" in ask(tool, "  what's the weather in san francisco ")
+    assert tool.calls["llm"] == 1
+    # Pages and search results were cached too, so nothing was searched again
+    assert tool.calls["search"] == 1
+
+
+def test_other_models_and_prompts_generate_again(tool):
+    ask(tool, "What's the weather in San Francisco?")
+    ask(tool, "What's the weather in San Francisco?", model="model-b")
+    ask(tool, "Will it rain in San Francisco tomorrow?")
+    assert tool.calls["llm"] == 3
+
+
+def test_ttl_zero_always_generates(tool):
+    tool.valves.QUERY_CACHE_TTL = 0
+    tool.valves.SEARCH_CACHE_TTL = 0
+    ask(tool, "What's the weather in San Francisco?")
+    ask(tool, "What's the weather in San Francisco?")
+    assert tool.calls == {"llm": 2, "search": 2}
+
+
+def test_prompts_are_normalized(firecrawl):
+    assert firecrawl.normalize_prompt("  What's the  weather in SF?! ") == "what's the weather in sf"
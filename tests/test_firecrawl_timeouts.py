@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+
+PAGES = {
+    "https://example.com/sf": "# Weather\n\n" + "Sunny in San Francisco with a light breeze from the west. " * 5,
+    "https://example.com/bay": "# Bay Area\n\n" + "Fog rolls over the Golden Gate Bridge in the early morning. " * 5,
+}
+
+
+def test_last_cancelled_caller_cancels_the_call(firecrawl):
+    flight = firecrawl.SingleFlight()
+    outcome = []
+
+    async def call():
+        try:
+            await asyncio.sleep(1)
+            outcome.append("finished")
+        except asyncio.CancelledError:
+            outcome.append("cancelled")
+            raise
+        return "done"
+
+    async def main():
+        callers = [asyncio.ensure_future(flight.run("key", call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert outcome == ["cancelled"]
+        assert not flight.inflight and not flight.waiters
+
+        async def quick():
+            return "fresh"
+
+        # The cancelled call is not handed to whoever asks next
+        return await flight.run("key", quick)
+
+    assert asyncio.run(main()) == "fresh"
+
+
+@pytest.fixture()
+def tool(firecrawl, monkeypatch):
+    monkeypatch.setattr(firecrawl, "_QUERY_CACHE", firecrawl.TTLCache(86400, 1024 * 1024))
+    monkeypatch.setattr(firecrawl, "_SEARCH_CACHE", firecrawl.TTLCache(300, 1024 * 1024))
+    monkeypatch.setattr(firecrawl, "_PAGE_CACHES", {})
+    searches = []
+
+    async def completion(request, form_data, user):
+        return {"choices": [{"message": {"content": "San Francisco weather"}}]}
+
+    async def search(base_url, headers, payload, timeout):
+        if searches and searches[-1] == "slow":
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                searches.append("cancelled")
+                raise
+        return 200, {
+            "success": True,
+            "data": [{"title": url, "url": url, "markdown": markdown} for url, markdown in PAGES.items()],
+        }
+
+    monkeypatch.setattr(firecrawl, "generate_chat_completion", completion)
+    monkeypatch.setattr(firecrawl, "firecrawl_search", search)
+    tools = firecrawl.Tools()
+    tools.valves.TIMEOUT = 1
+    tools.searches = searches
+    return tools
+
+
+def ask(tool, query: str) -> str:
+    async def emit(event):
+        pass
+
+    return asyncio.run(tool._run(query, emit, None, {"id": "user"}, {"id": "model"}))
+
+
+def test_search_timeout_returns_the_cached_pages(firecrawl, tool):
+    assert "Fog rolls" in ask(tool, "Weather in San Francisco?")
+    # One page of the cached search has expired, so Firecrawl is asked again and is too slow
+    firecrawl._PAGE_CACHES[None]._remove(firecrawl.normalize_url("https://example.com/bay"))
+    tool.searches.append("slow")
+
+    result = ask(tool, "Weather in San Francisco?")
+    assert "Sunny in San Francisco" in result
+    assert "Fog rolls" not in result
+    # Nobody else was waiting on the search, so it was not left running
+    assert tool.searches == ["slow", "cancelled"]
+
+
+def test_search_timeout_without_cached_pages_is_an_error(tool):
+    tool.searches.append("slow")
+    assert ask(tool, "Weather in San Francisco?").startswith("Error: Search timed out")
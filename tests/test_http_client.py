@@ -0,0 +1,36 @@
+import asyncio
+import weakref
+
+import pytest
+
+
+@pytest.fixture(params=["ynab", "firecrawl"])
+def tool(request, monkeypatch):
+    module = request.getfixturevalue(request.param)
+    monkeypatch.setattr(module, "_HTTP_CLIENTS", weakref.WeakKeyDictionary())
+    monkeypatch.setattr(module, "_HOST_SEMAPHORES", weakref.WeakKeyDictionary())
+    return module
+
+
+def test_one_client_per_event_loop(tool):
+    async def client():
+        return tool.get_http_client()
+
+    loop = asyncio.new_event_loop()
+    try:
+        first = loop.run_until_complete(client())
+        assert loop.run_until_complete(client()) is first
+        # Another loop (e.g. a worker thread) gets its own client and leaves this one alone
+        other = asyncio.run(client())
+        assert other is not first
+        assert tool._HTTP_CLIENTS[loop] is first
+    finally:
+        loop.close()
+
+    async def clients():
+        return tool.get_http_client(), list(tool._HTTP_CLIENTS.values()), len(tool._HOST_SEMAPHORES)
+
+    # Clients of closed loops are dropped when the next one is made
+    latest, live, semaphores = asyncio.run(clients())
+    assert live == [latest]
+    assert semaphores == 1
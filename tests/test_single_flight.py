@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+
+TOOLS = ["ynab", "actual", "firecrawl"]
+
+
+@pytest.fixture(params=TOOLS)
+def flight(request):
+    return request.getfixturevalue(request.param).SingleFlight()
+
+
+def test_concurrent_calls_share_one_result(flight):
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(0.02)
+        return {"rows": 3}
+
+    async def main():
+        return await asyncio.gather(*(flight.run("key", call) for _ in range(4)), flight.run("other", call))
+
+    results = asyncio.run(main())
+    assert len(started) == 2
+    assert all(result is results[0] for result in results[:4])
+    assert flight.stats() == {"calls": 2, "coalesced": 3}
+    assert not flight.inflight
+
+
+def test_errors_reach_every_caller(flight):
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("upstream failed")
+
+    async def main():
+        return await asyncio.gather(*(flight.run("key", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["calls"] == 1
+
+
+def test_finished_calls_are_not_reused(flight):
+    async def call():
+        return object()
+
+    async def main():
+        return await flight.run("key", call), await flight.run("key", call)
+
+    first, second = asyncio.run(main())
+    assert first is not second
+    assert flight.stats() == {"calls": 2, "coalesced": 0}
+
+
+def test_cancelled_caller_leaves_the_call_to_the_others(flight):
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        impatient = asyncio.ensure_future(flight.run("key", call))
+        patient = asyncio.ensure_future(flight.run("key", call))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(main()) == "done"
@@ -0,0 +1,200 @@
+import asyncio
+import random
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from synthetic import write_actual_budget, ynab_budget
+
+
+TODAY = date(2026, 8, 20)
+
+
+def normalized(tx: dict) -> dict:
+    # Same rows the YNAB tool builds without the mirror
+    return {
+        "date": tx["date"],
+        "amount": tx["amount"],
+        "payee": tx.get("payee_name") or "Unknown",
+        "category": tx.get("category_name") or "Uncategorized",
+        "account": tx.get("account_name") or "Unknown Account",
+        "transfer": bool(tx.get("transfer_account_id")),
+    }
+
+
+def row_key(row: dict) -> tuple:
+    return tuple(sorted(row.items()))
+
+
+@pytest.fixture()
+def transactions() -> list:
+    budget = ynab_budget(2000, 12, today=TODAY)
+    rows = budget["transactions"]
+    for tx in rows[::25]:
+        tx["transfer_account_id"] = budget["accounts"][0]["id"]
+    return rows
+
+
+def build(ynab, transactions: list):
+    shuffled = list(transactions)
+    random.Random(3).shuffle(shuffled)
+    index = ynab.TransactionIndex()
+    index.merge(shuffled)
+    return index
+
+
+def test_merge_sorts_by_date(ynab, transactions):
+    index = build(ynab, transactions)
+    assert len(index) == len(transactions)
+    assert (index.dates[1:] >= index.dates[:-1]).all()
+    expected = [
+        {**{key: value for key, value in normalized(tx).items() if key != "transfer"}, "memo": tx["memo"] or ""}
+        for tx in transactions
+    ]
+    assert sorted(map(row_key, index.rows(index.select()))) == sorted(map(row_key, expected))
+
+
+@pytest.mark.parametrize("groupBy", ["category", "payee", "account", "month"])
+@pytest.mark.parametrize("startDate, endDate", [(None, None), ("2026-02-10", "2026-05-20")])
+def test_group_matches_aggregate_rows(ynab, transactions, groupBy, startDate, endDate):
+    index = build(ynab, transactions)
+    inRange = [
+        normalized(tx)
+        for tx in transactions
+        if (not startDate or startDate <= tx["date"]) and (not endDate or tx["date"] <= endDate)
+    ]
+    assert index.group(index.select(startDate, endDate), groupBy) == ynab.aggregate_rows(inRange, groupBy)
+
+
+def test_delta_merge_matches_rebuild(ynab, transactions):
+    index = build(ynab, transactions)
+    index.balance_history()
+    changed = {**transactions[10], "amount": -123450, "date": "2026-08-01"}
+    deleted = {**transactions[20], "deleted": True}
+    added = {**transactions[30], "id": "new-transaction", "date": "2025-09-01"}
+    index.merge([changed, deleted, added])
+
+    expected = [tx for tx in transactions if tx["id"] not in {changed["id"], deleted["id"]}]
+    expected += [changed, added]
+    rebuilt = build(ynab, expected)
+    assert len(index) == len(rebuilt) == len(transactions)
+    assert (index.dates[1:] >= index.dates[:-1]).all()
+    assert sorted(map(row_key, index.rows(index.select()))) == sorted(
+        map(row_key, rebuilt.rows(rebuilt.select()))
+    )
+    assert index.group(index.select(), "category") == rebuilt.group(rebuilt.select(), "category")
+    # The running balances follow the delta as well
+    names = {tx["account_id"]: tx["account_name"] for tx in transactions}
+    accounts = [{"id": accountId, "name": name, "balance": 0} for accountId, name in names.items()]
+    assert index.balances(accounts, "2025-08-01", "2026-08-20") == rebuilt.balances(accounts, "2025-08-01", "2026-08-20")
+
+
+@pytest.fixture()
+def actual_budget(actual, tmp_path):
+    from sqlmodel import Session, create_engine
+
+    budget = ynab_budget(500, 6, today=TODAY)
+    path = tmp_path / "db.sqlite"
+    write_actual_budget(budget, str(path))
+    engine = create_engine(f"sqlite:///{path}")
+    with Session(engine) as session:
+        yield budget, session
+    engine.dispose()
+
+
+def test_update_transaction_index_applies_changesets(actual, actual_budget):
+    from actual import Changeset
+    from actual.database import Transactions
+
+    budget, session = actual_budget
+    index = actual.build_transaction_index(session)
+    rows = budget["transactions"]
+    changedId, deletedId = rows[5]["id"], rows[6]["id"]
+    session.get(Transactions, changedId).amount = -4242
+    session.get(Transactions, changedId).set_date(TODAY - timedelta(days=1))
+    session.get(Transactions, deletedId).tombstone = 1
+    session.add(
+        Transactions(
+            id="new-transaction",
+            acct=rows[0]["account_id"],
+            category_id=rows[0]["category_id"],
+            payee_id=rows[0]["payee_id"],
+            amount=-999,
+            date=int(TODAY.strftime("%Y%m%d")),
+            is_parent=0,
+            is_child=0,
+            tombstone=0,
+        )
+    )
+    session.commit()
+    changes = [
+        Changeset(Transactions, changedId, {}),
+        Changeset(Transactions, deletedId, {}),
+        Changeset(Transactions, "new-transaction", {}),
+    ]
+    assert actual.update_transaction_index(index, session, changes)
+
+    amounts = [row["amount"] for row in index.rows(index.select())]
+    assert -4242 in amounts and -999 in amounts
+    rebuilt = actual.build_transaction_index(session)
+    assert len(index) == len(rebuilt) == len(rows)
+    assert sorted(map(row_key, index.rows(index.select()))) == sorted(map(row_key, rebuilt.rows(rebuilt.select())))
+
+
+def test_name_changes_require_a_rebuild(actual, actual_budget):
+    from actual import Changeset
+    from actual.database import Payees
+
+    budget, session = actual_budget
+    index = actual.build_transaction_index(session)
+    assert not actual.update_transaction_index(index, session, [Changeset(Payees, budget["payees"][0]["id"], {})])
+    # Nothing that touches the index is a no-op
+    assert actual.update_transaction_index(index, session, [])
+
+
+def test_date_bounded_index_matches_full_index(actual, actual_budget):
+    _, session = actual_budget
+    full = actual.build_transaction_index(session)
+    window = actual.build_transaction_index(session, "2026-04-01", "2026-05-31")
+    assert 0 < len(window) < len(full)
+    assert sorted(map(row_key, window.rows(window.select()))) == sorted(
+        map(row_key, full.rows(full.select("2026-04-01", "2026-05-31")))
+    )
+    assert window.group(window.select(), "payee") == full.group(full.select("2026-04-01", "2026-05-31"), "payee")
+    # Scope names come from the whole budget, so a named account with nothing in the window selects nothing
+    nameMap = actual.budget_name_map(session)
+    for kind, names in actual.index_name_map(full).items():
+        defaults = {"no payee", "uncategorized", "unknown account"}
+        assert {name: entry for name, entry in names.items() if name not in defaults}.items() <= nameMap[kind].items()
+
+
+def test_background_build_installs_the_index(actual, actual_budget):
+    budget, session = actual_budget
+    entry = actual.ActualSession(SimpleNamespace(engine=session.get_bind()))
+
+    async def scenario():
+        task = actual.start_index_build(entry)
+        # Concurrent cold questions join the same build
+        assert actual.start_index_build(entry) is task
+        return await task
+
+    index = asyncio.run(scenario())
+    assert entry.index is index
+    assert len(index) == len(budget["transactions"])
+
+
+def test_background_build_is_dropped_after_a_sync(actual, actual_budget):
+    budget, session = actual_budget
+    entry = actual.ActualSession(SimpleNamespace(engine=session.get_bind()))
+
+    async def scenario():
+        task = actual.start_index_build(entry)
+        await asyncio.sleep(0)
+        # A sync changed the budget while the history was being read
+        entry.generation += 1
+        return await task
+
+    index = asyncio.run(scenario())
+    assert entry.index is None
+    assert len(index) == len(budget["transactions"])
@@ -0,0 +1,52 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+@pytest.fixture()
+def tool(ynab, monkeypatch):
+    monkeypatch.setattr(ynab, "YNAB_RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(ynab, "_MONTH_CACHE", ynab._MONTH_CACHE.__class__())
+    monkeypatch.setattr(ynab, "_RATE_LIMITERS", {})
+    tools = ynab.Tools()
+    tools.valves.LOCAL_MIRROR = False
+    tools.valves.YNAB_BUDGET_ID = "budget"
+    tools.valves.YNAB_ACCESS_TOKEN = "token"
+    return tools
+
+
+def ask(tool, query: str) -> tuple:
+    events = []
+
+    async def emit(event):
+        events.append(event["data"])
+
+    return asyncio.run(tool._run(query, emit, None, {"id": "user"}, {"id": "model"})), events
+
+
+QUERIES = ["What's my checking balance?", "What did I buy last week?", "balances last month"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_connection_errors_become_an_error_status(ynab, tool, monkeypatch, query):
+    async def unreachable(method, url, stream=False, **kwargs):
+        raise httpx.ConnectError("connection refused")
+
+    monkeypatch.setattr(ynab, "http_request", unreachable)
+    result, events = ask(tool, query)
+    assert result == "YNAB request failed. Error: connection refused"
+    assert events[-1] == {"status": "error", "description": "YNAB request failed.", "done": True}
+
+
+@pytest.mark.parametrize("query", QUERIES[1:])
+def test_truncated_bodies_become_an_error_status(ynab, tool, monkeypatch, query):
+    async def truncated(method, url, stream=False, **kwargs):
+        if url.endswith("/accounts"):
+            return httpx.Response(200, json={"data": {"accounts": [], "server_knowledge": 1}})
+        return httpx.Response(200, content=b'{"data": {"transactions": [{"id": "t1", "date": "2026-')
+
+    monkeypatch.setattr(ynab, "http_request", truncated)
+    result, events = ask(tool, query)
+    assert result.startswith("YNAB request failed. Error: ")
+    assert events[-1]["status"] == "error" and events[-1]["done"]
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import date
+
+import httpx
+
+
+TODAY = date(2026, 8, 20)
+
+
+def months_between(first: str, last: str) -> list:
+    year, month = int(first[:4]), int(first[5:7])
+    months = []
+    while f"{year:04d}-{month:02d}" <= last:
+        months.append(f"{year:04d}-{month:02d}-01")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def test_uncached_range_uses_since_date(ynab, monkeypatch):
+    monkeypatch.setattr(ynab, "_MONTH_CACHE", {})
+    assert ynab.plan_transaction_fetch("budget", "2024-01-05", "2026-08-20", TODAY) == ("since", "2024-01-05")
+
+
+def test_cached_months_change_the_plan(ynab, monkeypatch):
+    months = months_between("2024-01", "2026-08")
+    cache = {("budget", month): [] for month in months}
+    monkeypatch.setattr(ynab, "_MONTH_CACHE", cache)
+    assert ynab.plan_transaction_fetch("budget", "2024-01-05", "2026-08-20", TODAY) == ("months", months)
+    # Another budget's cached months are not free
+    assert ynab.plan_transaction_fetch("other", "2024-01-05", "2026-08-20", TODAY) == ("since", "2024-01-05")
+
+
+def test_month_cache_expires_and_stays_bounded(ynab, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ynab.time, "monotonic", lambda: now[0])
+    cache = ynab.MonthCache(ttl=60, maxRows=5)
+    cache[("budget", "2026-01-01")] = [{"id": "a"}, {"id": "b"}]
+    cache[("budget", "2026-02-01")] = [{"id": "c"}, {"id": "d"}]
+    assert ("budget", "2026-01-01") in cache
+    # Over the row bound: the least recently used month goes
+    cache[("budget", "2026-03-01")] = [{"id": "e"}, {"id": "f"}]
+    assert ("budget", "2026-02-01") not in cache
+    assert cache.get(("budget", "2026-01-01")) == [{"id": "a"}, {"id": "b"}]
+    assert cache.totalRows == 4
+    now[0] += 61
+    assert ("budget", "2026-01-01") not in cache
+    assert cache.get(("budget", "2026-03-01")) is None
+    assert cache.totalRows == 0
+
+
+def test_delta_sync_invalidates_changed_months(ynab, monkeypatch, tmp_path):
+    cache = ynab.MonthCache()
+    monkeypatch.setattr(ynab, "_MONTH_CACHE", cache)
+    monkeypatch.setattr(ynab, "_RATE_LIMITERS", {})
+    responses = [
+        {"transactions": [{"id": "t1", "date": "2026-01-10", "amount": -1000}], "server_knowledge": 1},
+        # t1 moved to May, t2 changed in March
+        {
+            "transactions": [
+                {"id": "t1", "date": "2026-05-02", "amount": -1000},
+                {"id": "t2", "date": "2026-03-15", "amount": -2000},
+            ],
+            "server_knowledge": 2,
+        },
+    ]
+
+    async def upstream(method, url, stream=False, **kwargs):
+        return httpx.Response(200, json={"data": responses.pop(0)})
+
+    monkeypatch.setattr(ynab, "http_request", upstream)
+    store = ynab.YNABLocalStore(str(tmp_path / "mirror.sqlite3"))
+    months = ["2026-01-01", "2026-02-01", "2026-03-01"]
+
+    def fill():
+        cache[("budget", "2026-01-01")] = [{"id": "t1", "date": "2026-01-10"}]
+        cache[("budget", "2026-02-01")] = [{"id": "t3", "date": "2026-02-10"}]
+        cache[("budget", "2026-03-01")] = []
+        cache[("other", "2026-03-01")] = []
+
+    def sync():
+        return asyncio.run(ynab.sync_local_store(store, "budget", {"Authorization": "Bearer token"}, ("transactions",)))
+
+    # A full download says nothing about what changed: every month of the budget goes
+    fill()
+    sync()
+    assert [month for month in months if ("budget", month) in cache] == []
+    assert ("other", "2026-03-01") in cache
+
+    fill()
+    assert sync() == {"transactions": 2}
+    assert [month for month in months if ("budget", month) in cache] == ["2026-02-01"]
+    assert ("other", "2026-03-01") in cache
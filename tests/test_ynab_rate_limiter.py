@@ -0,0 +1,115 @@
+import asyncio
+
+import httpx
+import pytest
+
+
+URL = "https://api.ynab.com/v1/budgets/budget/accounts"
+
+
+class FakeUpstream:
+    """Stands in for `http_request`: answers with queued responses (or raises queued errors) and counts calls."""
+
+    def __init__(self, *replies, delay: float = 0.0):
+        self.replies = list(replies)
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self, method: str, url: str, stream: bool = False, **kwargs) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        reply = self.replies.pop(0) if len(self.replies) > 1 else self.replies[0]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+def response(status: int, headers: dict = None) -> httpx.Response:
+    return httpx.Response(status, headers=headers, json={"data": {}}, request=httpx.Request("GET", URL))
+
+
+@pytest.fixture()
+def upstream(ynab, monkeypatch):
+    def install(*replies, delay: float = 0.0) -> FakeUpstream:
+        fake = FakeUpstream(*replies, delay=delay)
+        monkeypatch.setattr(ynab, "http_request", fake)
+        return fake
+
+    monkeypatch.setattr(ynab, "YNAB_RETRY_BACKOFF", 0.0)
+    return install
+
+
+def test_retries_429_then_succeeds(ynab, upstream):
+    fake = upstream(response(429, {"Retry-After": "0"}), response(200))
+    limiter = ynab.YNABRateLimiter()
+    result = asyncio.run(limiter.request("GET", URL, {}))
+    assert result.status_code == 200
+    assert (fake.calls, limiter.requests, limiter.retries) == (2, 2, 1)
+
+
+def test_gives_up_after_retries(ynab, upstream):
+    fake = upstream(response(503))
+    limiter = ynab.YNABRateLimiter()
+    assert asyncio.run(limiter.request("GET", URL, {})).status_code == 503
+    assert fake.calls == ynab.YNAB_RETRIES + 1
+
+
+def test_transport_errors_are_retried_then_raised(ynab, upstream):
+    fake = upstream(httpx.ConnectError("refused"))
+    limiter = ynab.YNABRateLimiter()
+    with pytest.raises(httpx.TransportError):
+        asyncio.run(limiter.request("GET", URL, {}))
+    assert fake.calls == ynab.YNAB_RETRIES + 1
+
+
+def test_long_retry_after_is_not_waited_for(ynab, upstream):
+    fake = upstream(response(429, {"Retry-After": "600"}))
+    limiter = ynab.YNABRateLimiter()
+    assert asyncio.run(limiter.request("GET", URL, {})).status_code == 429
+    assert fake.calls == 1
+
+
+def test_rate_limit_header_corrects_the_bucket(ynab, upstream):
+    upstream(response(200, {"X-Rate-Limit": "190/200"}))
+    limiter = ynab.YNABRateLimiter()
+    asyncio.run(limiter.request("GET", URL, {}))
+    assert limiter.remaining == 10
+    assert limiter.low
+
+
+def test_empty_bucket_raises_instead_of_waiting(ynab, upstream):
+    fake = upstream(response(200))
+    limiter = ynab.YNABRateLimiter(capacity=1, window=3600)
+    asyncio.run(limiter.request("GET", URL, {}))
+    with pytest.raises(ynab.YNABAPIError) as error:
+        asyncio.run(limiter.request("GET", URL, {}))
+    assert error.value.status_code == 429
+    assert fake.calls == 1
+
+
+def test_short_wait_for_a_token(ynab, upstream):
+    upstream(response(200))
+    # One token every 50 ms
+    limiter = ynab.YNABRateLimiter(capacity=1, window=0.05)
+
+    async def twice():
+        await limiter.request("GET", URL, {})
+        await limiter.request("GET", URL, {}, {"page": 2})
+
+    asyncio.run(twice())
+    assert limiter.requests == 2
+
+
+def test_identical_gets_share_one_request(ynab, upstream):
+    fake = upstream(response(200), delay=0.05)
+    limiter = ynab.YNABRateLimiter()
+
+    async def together():
+        return await asyncio.gather(*(limiter.request("GET", URL, {}) for _ in range(5)))
+
+    results = asyncio.run(together())
+    assert fake.calls == 1
+    assert all(result is results[0] for result in results)
+    # Streamed responses can only be read once and are never shared
+    asyncio.run(limiter.request("GET", URL, {}, stream=True))
+    assert fake.calls == 2
@@ -0,0 +1,30 @@
+import asyncio
+import json
+
+
+def parse(ynab, document: str, chunkSize: int) -> tuple:
+    async def chunks():
+        for start in range(0, len(document), chunkSize):
+            yield document[start:start + chunkSize]
+
+    async def collect():
+        meta = {}
+        items = [item async for item in ynab.stream_json_array(chunks(), "transactions", meta)]
+        return items, meta
+
+    return asyncio.run(collect())
+
+
+TRANSACTIONS = [{"id": str(n), "amount": -n * 1000, "memo": "a [bracket] and \"quote\""} for n in range(50)]
+
+
+def test_server_knowledge_after_the_array(ynab):
+    document = json.dumps({"data": {"transactions": TRANSACTIONS, "server_knowledge": 42}})
+    for chunkSize in (1, 7, 4096):
+        assert parse(ynab, document, chunkSize) == (TRANSACTIONS, {"server_knowledge": 42})
+
+
+def test_server_knowledge_before_the_array(ynab):
+    document = json.dumps({"data": {"server_knowledge": 42, "transactions": TRANSACTIONS}})
+    for chunkSize in (1, 7, 4096):
+        assert parse(ynab, document, chunkSize) == (TRANSACTIONS, {"server_knowledge": 42})